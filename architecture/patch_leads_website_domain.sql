@@ -0,0 +1,20 @@
+-- Canonical domain of each lead's website, used for deduplication:
+-- 'http://x.it', 'https://www.x.it/' and 'x.it/?utm=...' all become 'x.it'.
+-- Keep in sync with tools/url_utils.py normalize_domain().
+alter table public.leads
+  add column if not exists website_domain text
+  generated always as (
+    nullif(lower(regexp_replace(
+      regexp_replace(btrim(website), '^[a-z]+://', '', 'i'),
+      '^www\.|[:/?#].*$', '', 'gi'
+    )), '')
+  ) stored;
+
+-- Existing duplicates must be resolved before the index can be created:
+-- select website_domain, count(*) from public.leads
+--  where website_domain is not null group by website_domain having count(*) > 1;
+
+create unique index if not exists leads_website_domain_key on public.leads (website_domain);
+
+-- Superseded by the domain index (see patch_leads_website_unique.sql)
+drop index if exists public.leads_website_key;
@@ -0,0 +1,9 @@
+-- Unique website per lead: lets search_leads bulk-insert accepted leads with
+-- upsert(on_conflict="website", ignore_duplicates=True) in a single round trip,
+-- and makes the per-page `website in (...)` duplicate check an index lookup.
+
+-- Existing duplicates must be resolved before the index can be created:
+-- select website, count(*) from public.leads
+--  where website is not null group by website having count(*) > 1;
+
+create unique index if not exists leads_website_key on public.leads (website);
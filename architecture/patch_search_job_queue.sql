@@ -0,0 +1,65 @@
+-- Durable queue for lead searches, consumed by tools/worker.py
+-- Jobs survive deploys/crashes and can be spread over any number of worker dynos.
+create table if not exists public.search_job_queue (
+  id uuid primary key,
+  product_id uuid references public.products(id) on delete cascade,
+  params jsonb not null default '{}'::jsonb, -- location, limit, min_score, include_province
+  status text not null default 'queued', -- 'queued', 'running', 'completed', 'error'
+  progress text,
+  result jsonb, -- { accepted, discarded, below_threshold, stats, stopped_reason }
+  checkpoint jsonb, -- query offsets, visited websites, partial results (for resume)
+  stop_requested boolean not null default false,
+  attempts integer not null default 0,
+  worker_id text,
+  lease_expires_at timestamp with time zone,
+  created_at timestamp with time zone default timezone('utc'::text, now()),
+  updated_at timestamp with time zone default timezone('utc'::text, now()),
+  completed_at timestamp with time zone
+);
+
+create index if not exists search_job_queue_status_idx
+  on public.search_job_queue (status, created_at);
+
+alter table public.search_job_queue enable row level security;
+create policy "Enable all access" on public.search_job_queue
+  for all using (true) with check (true);
+
+-- Atomically claims the oldest runnable job for a worker (at-least-once delivery).
+-- A job is runnable when queued, or when its worker stopped renewing the lease
+-- (crash/redeploy). Jobs that keep dying are failed after p_max_attempts.
+create or replace function public.claim_search_job(
+  p_worker_id text,
+  p_lease_seconds integer default 60,
+  p_max_attempts integer default 3
+)
+returns setof public.search_job_queue
+language plpgsql
+as $$
+begin
+  update public.search_job_queue
+     set status = 'error',
+         progress = 'Ricerca interrotta: worker non disponibile',
+         completed_at = now(),
+         updated_at = now()
+   where status = 'running'
+     and lease_expires_at < now()
+     and attempts >= p_max_attempts;
+
+  return query
+  update public.search_job_queue q
+     set status = 'running',
+         worker_id = p_worker_id,
+         attempts = q.attempts + 1,
+         lease_expires_at = now() + make_interval(secs => p_lease_seconds),
+         updated_at = now()
+   where q.id = (
+         select id from public.search_job_queue
+          where status = 'queued'
+             or (status = 'running' and lease_expires_at < now())
+          order by created_at
+          for update skip locked
+          limit 1
+         )
+  returning q.*;
+end;
+$$;
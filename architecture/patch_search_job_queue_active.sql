@@ -0,0 +1,11 @@
+-- At most one queued/running search per product: concurrent /search requests
+-- cannot both enqueue a job. job_queue.enqueue_search catches the unique
+-- violation (23505) and returns the job that is already active.
+
+-- Existing duplicates must be resolved before the index can be created:
+-- select product_id, count(*) from public.search_job_queue
+--  where status in ('queued', 'running') group by product_id having count(*) > 1;
+
+create unique index if not exists search_job_queue_active_product_key
+  on public.search_job_queue (product_id)
+  where status in ('queued', 'running');
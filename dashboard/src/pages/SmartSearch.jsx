@@ -58,6 +58,8 @@ export default function SmartSearch() {
     const jobsRef = useRef([])
     const pollRef = useRef(null)
     const failCountRef = useRef({}) // { jobId: consecutiveFailCount }
+    const streamsRef = useRef({}) // { jobId: EventSource } — live progress via SSE
+    const pollFallbackRef = useRef(new Set()) // jobIds whose stream failed: polled instead
 
     // Close location dropdown on click outside
     useEffect(() => {
@@ -102,7 +104,11 @@ export default function SmartSearch() {
             })
         }
 
-        return () => { if (pollRef.current) clearInterval(pollRef.current) }
+        return () => {
+            if (pollRef.current) clearInterval(pollRef.current)
+            Object.values(streamsRef.current).forEach(es => es.close())
+            streamsRef.current = {}
+        }
     }, [])
 
     // Keep jobsRef in sync with jobs state
@@ -110,9 +116,22 @@ export default function SmartSearch() {
         jobsRef.current = jobs
     }, [jobs])
 
-    // Start/stop polling based on active jobs
+    // Open a progress stream for every running job (falls back to polling if SSE fails)
+    useEffect(() => {
+        jobs.forEach(job => {
+            if (job.status !== 'running' || job.id.startsWith('error-')) return
+            if (streamsRef.current[job.id] || pollFallbackRef.current.has(job.id)) return
+            if (typeof EventSource === 'undefined') {
+                pollFallbackRef.current.add(job.id)
+                return
+            }
+            openJobStream(job.id)
+        })
+    }, [jobs])
+
+    // Start/stop polling for jobs without a live stream
     useEffect(() => {
-        const hasRunning = jobs.some(j => j.status === 'running')
+        const hasRunning = jobs.some(j => j.status === 'running' && pollFallbackRef.current.has(j.id))
         if (hasRunning && !pollRef.current) {
             pollRef.current = setInterval(pollAllJobs, 2000)
         } else if (!hasRunning && pollRef.current) {
@@ -126,9 +145,70 @@ export default function SmartSearch() {
         if (data) setProducts(data)
     }
 
+    const openJobStream = (jobId) => {
+        const es = new EventSource(`${API_URL}/search-events/${jobId}`)
+        streamsRef.current[jobId] = es
+
+        const closeStream = () => {
+            es.close()
+            delete streamsRef.current[jobId]
+        }
+        const parse = (e) => {
+            try { return JSON.parse(e.data) } catch { return null }
+        }
+        const appendLead = (bucket) => (e) => {
+            const lead = parse(e)
+            if (!lead) return
+            setJobs(prev => prev.map(j => j.id !== jobId ? j : {
+                ...j,
+                results: {
+                    accepted: j.results?.accepted || [],
+                    discarded: j.results?.discarded || [],
+                    below_threshold: j.results?.below_threshold || [],
+                    stats: j.results?.stats || {},
+                    [bucket]: [...(j.results?.[bucket] || []), lead]
+                }
+            }))
+        }
+
+        es.addEventListener('snapshot', (e) => {
+            const data = parse(e)
+            if (data) applyJobUpdates([{ id: jobId, data }])
+            if (data && (data.status === 'completed' || data.status === 'error')) closeStream()
+        })
+        es.addEventListener('progress', (e) => {
+            const data = parse(e)
+            if (data?.progress) setJobs(prev => prev.map(j => j.id === jobId ? { ...j, progress: data.progress } : j))
+        })
+        es.addEventListener('stats', (e) => {
+            const stats = parse(e)
+            if (stats) setJobs(prev => prev.map(j => j.id !== jobId ? j : {
+                ...j,
+                stats,
+                results: { accepted: [], discarded: [], below_threshold: [], ...j.results, stats }
+            }))
+        })
+        es.addEventListener('lead_accepted', appendLead('accepted'))
+        es.addEventListener('lead_discarded', appendLead('discarded'))
+        es.addEventListener('lead_below_threshold', appendLead('below_threshold'))
+        es.addEventListener('status', (e) => {
+            const data = parse(e)
+            closeStream()
+            if (data) applyJobUpdates([{ id: jobId, data }])
+        })
+        es.onerror = () => {
+            // CONNECTING = browser retries with Last-Event-ID; CLOSED = give up and poll
+            if (es.readyState === EventSource.CLOSED) {
+                closeStream()
+                pollFallbackRef.current.add(jobId)
+                setJobs(prev => [...prev])
+            }
+        }
+    }
+
     const pollAllJobs = async () => {
         const currentJobs = jobsRef.current
-        const runningJobs = currentJobs.filter(j => j.status === 'running')
+        const runningJobs = currentJobs.filter(j => j.status === 'running' && pollFallbackRef.current.has(j.id))
         if (runningJobs.length === 0) return
 
         // Fetch all statuses outside of setState (no side-effects in updater)
@@ -154,6 +234,10 @@ export default function SmartSearch() {
             }
         }
 
+        applyJobUpdates(updates)
+    }
+
+    const applyJobUpdates = (updates) => {
         if (updates.length === 0) return
 
         // Perform localStorage cleanup for completed/error jobs
@@ -173,7 +257,10 @@ export default function SmartSearch() {
             window.dispatchEvent(new Event("storage"))
 
             // Clean up fail counters for finished jobs
-            finishedIds.forEach(id => delete failCountRef.current[id])
+            finishedIds.forEach(id => {
+                delete failCountRef.current[id]
+                pollFallbackRef.current.delete(id)
+            })
         }
 
         // Single setState call with all updates
@@ -277,6 +364,10 @@ export default function SmartSearch() {
     }
 
     const removeJob = (jobId) => {
+        if (streamsRef.current[jobId]) {
+            streamsRef.current[jobId].close()
+            delete streamsRef.current[jobId]
+        }
         setJobs(prev => prev.filter(j => j.id !== jobId))
     }
 
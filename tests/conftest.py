@@ -0,0 +1,17 @@
+import os
+import sys
+import tempfile
+
+# The tools are flat modules importing each other by name (as when run from tools/)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tools"))
+# On-disk caches of the imported modules go to a throwaway directory
+os.environ.setdefault("CACHE_DIR", tempfile.mkdtemp(prefix="blast-tests-"))
+# Modules create their API clients at import time; tests replace them before any call
+for name, value in {
+    "SUPABASE_URL": "http://localhost:54321",
+    "SUPABASE_KEY": "test-key",
+    "OPENAI_API_KEY": "sk-test",
+    "ANTHROPIC_API_KEY": "test-key",
+    "SERPAPI_KEY": "test-key",
+}.items():
+    os.environ.setdefault(name, value)
@@ -0,0 +1,74 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from fastapi.testclient import TestClient
+
+import api
+import job_queue
+
+
+@pytest.fixture
+def client():
+    # Not used as a context manager: the lifespan would shut the shared heavy executor down
+    return TestClient(api.app)
+
+
+def test_queued_job_stream_not_stalled_by_heavy_work(client, monkeypatch):
+    monkeypatch.setattr(job_queue, "SEARCH_QUEUE_ENABLED", True)
+    monkeypatch.setattr(job_queue, "load_job", lambda job_id: {"status": "completed", "progress": "ok", "accepted": []})
+    release = threading.Event()
+    busy = [api.heavy_executor.submit(release.wait, 10) for _ in range(api.API_HEAVY_WORKERS)]
+    try:
+        result = {}
+        reader = threading.Thread(target=lambda: result.update(body=client.get("/search-events/queued-1").text))
+        reader.start()
+        reader.join(5)
+        assert not reader.is_alive(), "SSE stream waited for the heavy executor"
+        assert "event: snapshot" in result["body"]
+    finally:
+        release.set()
+        for future in busy:
+            future.result()
+
+
+def test_unknown_job_stream_is_404(client, monkeypatch):
+    monkeypatch.setattr(job_queue, "SEARCH_QUEUE_ENABLED", False)
+    assert client.get("/search-events/does-not-exist").status_code == 404
+
+
+def test_lifespan_shuts_heavy_executor_down(monkeypatch):
+    executor = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(api, "heavy_executor", executor)
+    with TestClient(api.app):
+        assert executor.submit(lambda: 1).result() == 1
+    with pytest.raises(RuntimeError):
+        executor.submit(lambda: 1)
+
+
+def test_generation_does_not_block_the_event_loop(monkeypatch):
+    monkeypatch.setattr(api, "heavy_executor", ThreadPoolExecutor(max_workers=2))
+    started, release = threading.Event(), threading.Event()
+
+    def generate(lead_id):
+        started.set()
+        release.wait(10)
+        return {"subject": "Ciao", "body": lead_id}
+    monkeypatch.setattr(api, "generate_email_for_lead", generate)
+
+    # One event loop for every request, as under uvicorn
+    with TestClient(api.app) as client:
+        result = {}
+        writer = threading.Thread(target=lambda: result.update(
+            response=client.post("/generate-email", json={"lead_id": "lead-1"}).json()))
+        writer.start()
+        assert started.wait(5)
+        try:
+            pinger = threading.Thread(target=lambda: result.update(root=client.get("/").status_code))
+            pinger.start()
+            pinger.join(2)
+            assert result.get("root") == 200, "the event loop waited for email generation"
+        finally:
+            release.set()
+            writer.join(5)
+    assert result["response"] == {"status": "completed", "email": {"subject": "Ciao", "body": "lead-1"}}
@@ -0,0 +1,106 @@
+import threading
+import time
+
+import pytest
+
+import evaluate_lead
+from disk_cache import DiskCache
+from evaluate_lead import BATCH_SCORING_PROMPT_VERSION, SCORING_PROMPT_VERSION, LeadBatchScorer
+
+PRODUCT = {"id": "p1", "name": "Etichette per vino", "target_keywords": "cantine"}
+
+
+def snapshot(name):
+    return {"pages": [{"path": "/", "kind": "home", "text": f"Cantina {name}: vini rossi e bianchi della tenuta. " * 5}]}
+
+
+def evaluation(score, reason="ok"):
+    return {"score": score, "reason": reason, "sector_match": 0, "purchase_potential": 0,
+            "complementarity": 0, "web_quality": 0, "accepted": True}
+
+
+@pytest.fixture(autouse=True)
+def local_scoring(monkeypatch, tmp_path):
+    """No prescore/kNN shortcuts, a fresh score cache, and no real LLM."""
+    monkeypatch.setattr(evaluate_lead, "prescore", lambda *a: None)
+    monkeypatch.setattr(evaluate_lead, "LEAD_INDEX_ENABLED", False)
+    monkeypatch.setattr(evaluate_lead, "predict_score", lambda *a: None)
+    monkeypatch.setattr(evaluate_lead, "score_cache", DiskCache("scores_test", 3600, 10 * 1024 * 1024, path=tmp_path / "s.sqlite3"))
+
+    def no_llm(ctx, product):
+        raise AssertionError("unexpected single LLM call")
+    monkeypatch.setattr(evaluate_lead, "_score_with_llm", no_llm)
+
+
+def run_workers(scorer, names, timeout=5):
+    results = {}
+
+    def work(name):
+        results[name] = scorer.evaluate(name, f"https://{name}.it", "Cesena", snapshot(name))
+
+    threads = [threading.Thread(target=work, args=(name,)) for name in names]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(timeout)
+    assert not any(t.is_alive() for t in threads), "a worker is still waiting for its batch"
+    return results
+
+
+def test_full_batch_is_scored_in_one_request(monkeypatch):
+    batches = []
+
+    def score_batch(contexts, product):
+        batches.append([c["company_name"] for c in contexts])
+        return [dict(evaluation(60), source="batch") for _ in contexts]
+    monkeypatch.setattr(evaluate_lead, "score_batch", score_batch)
+
+    results = run_workers(LeadBatchScorer(PRODUCT, batch_size=3, max_wait=10), ["a", "b", "c"])
+    assert len(batches) == 1 and sorted(batches[0]) == ["a", "b", "c"]
+    assert {r["source"] for r in results.values()} == {"batch"}
+
+
+def test_partial_batch_is_sent_after_max_wait(monkeypatch):
+    batches = []
+
+    def score_batch(contexts, product):
+        batches.append(len(contexts))
+        return [dict(evaluation(60), source="batch") for _ in contexts]
+    monkeypatch.setattr(evaluate_lead, "score_batch", score_batch)
+
+    start = time.time()
+    results = run_workers(LeadBatchScorer(PRODUCT, batch_size=4, max_wait=0.3), ["a", "b"])
+    assert batches == [2]
+    assert 0.25 <= time.time() - start < 3
+    assert len(results) == 2
+
+
+def test_batch_failure_gives_every_lead_a_fallback(monkeypatch):
+    def score_batch(contexts, product):
+        raise ValueError("bad json")
+    monkeypatch.setattr(evaluate_lead, "score_batch", score_batch)
+
+    results = run_workers(LeadBatchScorer(PRODUCT, batch_size=3, max_wait=0.2), ["a", "b", "c", "d", "e"])
+    assert len(results) == 5
+    assert {r["source"] for r in results.values()} == {"fallback"}
+
+
+def test_short_batch_result_gives_missing_leads_a_fallback(monkeypatch):
+    monkeypatch.setattr(evaluate_lead, "score_batch", lambda contexts, product: [dict(evaluation(70), source="batch")])
+    results = run_workers(LeadBatchScorer(PRODUCT, batch_size=2, max_wait=5), ["a", "b"])
+    assert sorted(r["source"] for r in results.values()) == ["batch", "fallback"]
+
+
+def test_cached_score_of_the_other_prompt_is_reused(monkeypatch):
+    monkeypatch.setattr(evaluate_lead, "score_batch", lambda contexts, product: pytest.fail("LLM called"))
+    ctx = evaluate_lead.scoring_context("a", "https://a.it", "Cesena", PRODUCT,
+                                        evaluate_lead.snapshot_text(snapshot("a"), product=PRODUCT))
+    evaluate_lead._store(ctx, evaluation(42), SCORING_PROMPT_VERSION)
+
+    result = LeadBatchScorer(PRODUCT, batch_size=4).evaluate("a", "https://a.it", "Cesena", snapshot("a"))
+    assert (result["score"], result["source"]) == (42, "cache")
+
+
+def test_search_prompt_version():
+    assert evaluate_lead.search_prompt_version(4) == BATCH_SCORING_PROMPT_VERSION
+    assert evaluate_lead.search_prompt_version(1) == SCORING_PROMPT_VERSION
@@ -0,0 +1,73 @@
+import json
+import types
+
+import pytest
+
+import bulk_jobs
+
+PRODUCT = {"id": "p1", "name": "Etichette", "description": "etichette per vino", "target_keywords": "cantine"}
+
+
+def lead(i, product=PRODUCT):
+    return {"id": f"lead-{i}", "company_name": f"Cantina {i}", "website": f"https://cantina{i}.it",
+            "location": "Cesena", "products": product}
+
+
+@pytest.fixture
+def batch_dir(monkeypatch, tmp_path):
+    monkeypatch.setattr(bulk_jobs, "BATCH_DIR", tmp_path)
+    return tmp_path
+
+
+def test_rescore_requests_skip_leads_without_content_or_product(monkeypatch):
+    monkeypatch.setattr(bulk_jobs, "scrape_text_content",
+                        lambda website, product=None: "" if website.endswith("2.it") else f"{website} vini rossi " * 10)
+    requests = bulk_jobs.build_requests("rescore", [lead(1), lead(2), lead(3, product=None)])
+    assert [r["custom_id"] for r in requests] == ["lead-1"]
+    body = requests[0]["body"]
+    assert body["model"] == bulk_jobs.SCORING_MODEL
+    assert "Cantina 1" in body["messages"][0]["content"]
+
+
+def test_submit_splits_into_batches_with_manifests(monkeypatch, batch_dir):
+    monkeypatch.setattr(bulk_jobs, "BULK_MAX_REQUESTS_PER_BATCH", 2)
+    created = []
+    monkeypatch.setattr(bulk_jobs, "anthropic_client", types.SimpleNamespace(messages=types.SimpleNamespace(
+        batches=types.SimpleNamespace(create=lambda requests: created.append(requests) or
+                                      types.SimpleNamespace(id=f"batch-{len(created)}")))))
+    leads = [lead(i) for i in range(5)]
+    requests = [{"custom_id": l["id"], "params": {}} for l in leads]
+    manifests = bulk_jobs.submit("emails", requests, leads)
+    assert [len(chunk) for chunk in created] == [2, 2, 1]
+    assert bulk_jobs.load_manifest("batch-3")["leads"] == {"lead-4": "Cantina 4"}
+    assert len(list(batch_dir.glob("emails-*.jsonl"))) == 3
+    assert all(not m["collected"] for m in manifests)
+
+
+def test_write_back_skips_deleted_leads_and_counts_failures(monkeypatch, batch_dir):
+    results = [
+        ("lead-1", json.dumps({"score": 80, "reason": "affine"}), None),
+        ("lead-2", None, "expired"),
+        ("lead-3", "non è json", None),
+        ("lead-4", json.dumps({"score": 40, "reason": "poco affine"}), None),  # deleted meanwhile
+    ]
+    monkeypatch.setattr(bulk_jobs, "iter_results", lambda manifest: iter(results))
+    upserts = []
+
+    class Query:
+        def __getattr__(self, name):
+            return lambda *args, **kwargs: self
+
+        def upsert(self, rows, **kwargs):
+            upserts.extend(rows)
+            return self
+
+        def execute(self):
+            return types.SimpleNamespace(data=[{"id": "lead-1"}, {"id": "lead-2"}, {"id": "lead-3"}])
+
+    monkeypatch.setattr(bulk_jobs, "supabase", types.SimpleNamespace(table=lambda name: Query()))
+    manifest = {"batch_id": "b1", "kind": "rescore", "provider": "openai",
+                "leads": {f"lead-{i}": f"Cantina {i}" for i in range(1, 5)}}
+    assert bulk_jobs.write_back(manifest) == (1, 2)
+    assert upserts == [{"id": "lead-1", "company_name": "Cantina 1", "match_score": 80, "match_reason": "affine"}]
+    assert bulk_jobs.load_manifest("b1")["collected"]
@@ -0,0 +1,54 @@
+from candidate_frontier import CandidateFrontier, candidate_keys
+
+PRODUCT = {"name": "Etichette per vino", "target_keywords": "cantine, aziende vinicole"}
+
+
+def place(place_id, website, title="Azienda", rating=None, reviews=0, type_=""):
+    return {"place_id": place_id, "website": website, "title": title, "rating": rating, "reviews": reviews, "type": type_}
+
+
+def test_candidate_keys_use_place_id_and_domain():
+    assert candidate_keys(place("p1", "https://www.Cantina.it/chi-siamo")) == ["place:p1", "domain:cantina.it"]
+    assert candidate_keys({"title": "Senza sito"}) == []
+
+
+def test_pops_best_first():
+    frontier = CandidateFrontier(PRODUCT, n_keywords=2)
+    frontier.add(place("p1", "https://officina.it", "Officina Bianchi", 4.0, 20), "cantine")
+    frontier.add(place("p2", "https://rossi.it", "Cantina Rossi", 4.6, 300, "Cantina vinicola"), "cantine")
+    frontier.add(place("p3", "https://verdi.it", "Cantina Verdi"), "cantine")
+    order = [frontier.pop()[0]["place_id"] for _ in range(3)]
+    assert order == ["p2", "p3", "p1"]
+    assert frontier.pop() is None
+    assert len(frontier) == 0
+
+
+def test_same_place_from_another_keyword_is_merged_and_promoted():
+    frontier = CandidateFrontier(PRODUCT, n_keywords=2)
+    assert frontier.add(place("p1", "https://a.it", "Azienda A"), "cantine")
+    assert frontier.add(place("p2", "https://b.it", "Azienda B"), "cantine")
+    # Same site under another place id, found by the second keyword
+    assert not frontier.add(place("p9", "https://www.b.it/", "Azienda B"), "aziende vinicole")
+    assert len(frontier) == 2
+    assert frontier.stats() == {"queued": 2, "merged_duplicates": 1}
+    item, keyword = frontier.pop()
+    assert item["place_id"] == "p2" and keyword == "cantine"
+    assert frontier.seen(place("p2", None))
+
+
+def test_popped_candidate_is_not_requeued():
+    frontier = CandidateFrontier(PRODUCT)
+    frontier.add(place("p1", "https://a.it"), "cantine")
+    frontier.pop()
+    assert not frontier.add(place("p1", "https://a.it"), "aziende vinicole")
+    assert frontier.pop() is None
+
+
+def test_pending_lists_queued_entries_once():
+    frontier = CandidateFrontier(PRODUCT, n_keywords=2)
+    frontier.add(place("p1", "https://a.it"), "cantine")
+    frontier.add(place("p1", "https://a.it"), "aziende vinicole")
+    frontier.add(place("p2", "https://b.it"), "cantine")
+    frontier.pop()
+    pending = frontier.pending()
+    assert len(pending) == 1
@@ -0,0 +1,72 @@
+from candidate_pipeline import CHEAP_STAGES, STAGES, StagePipeline
+
+
+def _drop(predicate):
+    return lambda items, keyword: [item for item in items if not predicate(item)]
+
+
+def make_pipeline(calls=None, counts=None):
+    def recording(stage, predicate):
+        def run(items, keyword):
+            if calls is not None:
+                calls.append((stage, [i["id"] for i in items]))
+            return _drop(predicate)(items, keyword)
+        return run
+
+    return StagePipeline({
+        "website": recording("website", lambda i: not i.get("website")),
+        "duplicate": recording("duplicate", lambda i: i["id"] == 2),
+        "location": recording("location", lambda i: i.get("city") != "Cesena"),
+        "blacklist": recording("blacklist", lambda i: "facebook.com" in i["website"]),
+        "known": recording("known", lambda i: i["id"] == 5),
+    }, counts=counts)
+
+
+PAGE = [
+    {"id": 1, "website": "https://a.it", "city": "Cesena"},
+    {"id": 2, "website": "https://b.it", "city": "Cesena"},
+    {"id": 3, "website": "", "city": "Cesena"},
+    {"id": 4, "website": "https://c.it", "city": "Rimini"},
+    {"id": 5, "website": "https://d.it", "city": "Cesena"},
+    {"id": 6, "website": "https://facebook.com/e", "city": "Cesena"},
+]
+
+
+def test_stages_run_in_order_on_survivors_only():
+    calls = []
+    kept = make_pipeline(calls).screen(PAGE, "cantine")
+    assert [item["id"] for item in kept] == [1]
+    assert [stage for stage, _ in calls] == list(CHEAP_STAGES)
+    assert calls[-1] == ("known", [1, 5])
+
+
+def test_counters_per_stage():
+    pipeline = make_pipeline()
+    pipeline.screen(PAGE, "cantine")
+    pipeline.record("scrape")
+    pipeline.record("score", dropped=1)
+    stats = pipeline.stats()
+    assert list(stats)[:len(STAGES)] == list(STAGES)
+    assert stats["website"] == {"checked": 6, "dropped": 1}
+    assert stats["duplicate"] == {"checked": 5, "dropped": 1}
+    assert stats["location"] == {"checked": 4, "dropped": 1}
+    assert stats["blacklist"] == {"checked": 3, "dropped": 1}
+    assert stats["known"] == {"checked": 2, "dropped": 1}
+    assert stats["scrape"] == {"checked": 1, "dropped": 0}
+    assert stats["score"] == {"checked": 1, "dropped": 1}
+    assert stats["crawls_avoided"] == 5
+
+
+def test_empty_page_stops_early():
+    calls = []
+    assert make_pipeline(calls).screen([{"id": 3, "website": ""}], "cantine") == []
+    assert [stage for stage, _ in calls] == ["website"]
+
+
+def test_counts_restored_from_checkpoint():
+    first = make_pipeline()
+    first.screen(PAGE, "cantine")
+    resumed = make_pipeline(counts=first.stats())
+    resumed.screen(PAGE[:1], "cantine")
+    assert resumed.stats()["website"] == {"checked": 7, "dropped": 1}
+    assert resumed.stats()["crawls_avoided"] == 5
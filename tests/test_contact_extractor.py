@@ -0,0 +1,55 @@
+import pytest
+from contact_extractor import decode_cfemail, extract_contacts, normalize_phone, rank_emails
+
+
+def cfemail(address, key=0x42):
+    """Cloudflare data-cfemail payload of an address."""
+    return f"{key:02x}" + "".join(f"{ord(c) ^ key:02x}" for c in address)
+
+
+@pytest.mark.parametrize("raw, e164", [
+    ("+39 02 1234 5678", "+390212345678"),
+    ("0039 0543 123456", "+390543123456"),
+    ("02.12345678", "+390212345678"),
+    ("347 123 4567", "+393471234567"),
+    ("393471234567", "+393471234567"),
+    ("12345", None),
+    ("800 123", None),
+])
+def test_normalize_phone_e164(raw, e164):
+    assert normalize_phone(raw) == e164
+
+
+def test_cfemail_roundtrip():
+    assert decode_cfemail(cfemail("info@cantina.it")) == "info@cantina.it"
+
+
+def test_bad_cfemail_decode_is_rejected():
+    good = cfemail("info@cantina.it")
+    for bad in ("7f" + good[2:], cfemail("in\x05o@cantina.it"), cfemail("inf\xf8@cantina.it")):
+        html = f'<a class="__cf_email__" data-cfemail="{bad}">[email protected]</a>'
+        assert extract_contacts(html)[0] == []
+    html = f'<a class="__cf_email__" data-cfemail="{good}">[email protected]</a>'
+    assert extract_contacts(html)[0] == ["info@cantina.it"]
+
+
+def test_non_ascii_mailto_is_rejected():
+    html = '<a href="mailto:inf%C3%A9@cantina.it">scrivici</a> <a href="mailto:ordini@cantina.it">ordini</a>'
+    assert extract_contacts(html)[0] == ["ordini@cantina.it"]
+
+
+def test_footer_text_and_obfuscated_addresses():
+    html = """<html><head><script>var x = "tracker@sentry.io";</script></head><body>
+    <p>Scrivici: vendite [at] cantina [dot] it</p>
+    <footer>Cantina Rossi - Tel. 0543 123456 - P.IVA 01234567890 - info@cantina.it</footer>
+    </body></html>"""
+    emails, phones = extract_contacts(html, site_domain="cantina.it")
+    assert set(emails) == {"info@cantina.it", "vendite@cantina.it"}
+    assert phones == ["+390543123456"]
+
+
+def test_rank_emails_prefers_role_address_on_site_domain():
+    emails = ["mario.rossi@gmail.com", "amministrazione@pec.cantina.it", "mario@cantina.it", "info@cantina.it"]
+    assert rank_emails(emails, "www.cantina.it") == [
+        "info@cantina.it", "mario@cantina.it", "mario.rossi@gmail.com", "amministrazione@pec.cantina.it",
+    ]
@@ -0,0 +1,44 @@
+from content_distill import count_tokens, distill
+
+PRODUCT = {"name": "Etichette adesive", "description": "etichette adesive per bottiglie di vino",
+           "target_keywords": "cantine, etichette vino"}
+MENU = "Home\nChi siamo\nProdotti\nContatti"
+FOOTER = "P.IVA 01234567890 - Tutti i diritti riservati\nQuesto sito usa cookie tecnici. Accetta"
+
+
+def page(*paragraphs):
+    return "\n".join([MENU, *paragraphs, FOOTER])
+
+
+def test_repeated_lines_and_boilerplate_are_dropped():
+    text = distill([page("La cantina imbottiglia vino rosso dal 1950."),
+                    page("Le nostre bottiglie portano etichette disegnate a mano.")])
+    assert text.count("Chi siamo") == 1
+    assert "P.IVA" not in text and "cookie" not in text
+    assert "imbottiglia vino" in text and "etichette disegnate" in text
+
+
+def test_output_fits_the_token_budget():
+    filler = [f"Paragrafo {i}: raccontiamo la storia della nostra azienda e dei suoi valori." * 3 for i in range(60)]
+    text = distill([page(*filler)], PRODUCT, max_tokens=200)
+    assert 0 < count_tokens(text) <= 200
+
+
+def test_relevant_blocks_win_and_keep_reading_order():
+    filler = [f"Paragrafo {i}: " + "la nostra squadra di calcio ha vinto il torneo regionale. " * 4 for i in range(30)]
+    relevant = "Paragrafo 99: " + "imbottigliamo il vino e cerchiamo etichette adesive per le bottiglie della cantina. " * 3
+    text = distill([page(*filler[:15], relevant.strip(), *filler[15:])], PRODUCT, max_tokens=250)
+    blocks = text.split("\n")
+    assert relevant.strip() in blocks
+    assert 1 < len(blocks) < 31
+    # Reading order: the relevant paragraph sits between fillers 14 and 15
+    order = [int(block.split(":")[0].split()[-1]) for block in blocks]
+    order = [14.5 if n == 99 else n for n in order]
+    assert order == sorted(order)
+
+
+def test_pages_are_separated_homepage_first():
+    text = distill(["La cantina produce vino rosso e bianco da tre generazioni.",
+                    "Chi siamo: una famiglia di viticoltori romagnoli con passione."])
+    home, about = text.split("\n---\n")
+    assert "cantina produce" in home and "famiglia di viticoltori" in about
@@ -0,0 +1,126 @@
+import threading
+import time
+import types
+
+import pytest
+
+import crawl_scheduler
+from crawl_scheduler import CrawlScheduler, TokenBucket, retry_after_seconds
+from disk_cache import DiskCache
+
+
+def _response(status=200, text="", content_type="text/plain"):
+    return types.SimpleNamespace(status_code=status, text=text, headers={"Content-Type": content_type})
+
+
+@pytest.fixture
+def robots_get(monkeypatch):
+    """Serves robots.txt from a dict (domain -> text), counting and slowing down the fetches."""
+    calls = []
+    robots = {}
+
+    def get(url, timeout=None, **kwargs):
+        calls.append((url, timeout))
+        time.sleep(0.05)
+        domain = url.split("/")[2]
+        return _response(200, robots[domain]) if domain in robots else _response(404)
+
+    monkeypatch.setattr(crawl_scheduler.http_client, "get", get)
+    monkeypatch.setattr(crawl_scheduler, "robots_cache", DiskCache("robots_test", ttl_seconds=0, max_bytes=0))
+    monkeypatch.setattr(crawl_scheduler, "CRAWL_OBEY_ROBOTS", True)
+    return robots, calls
+
+
+def test_token_bucket_burst_then_rate():
+    bucket = TokenBucket(rate=10, burst=2)
+    now = time.monotonic()
+    assert bucket.reserve() <= now + 0.01
+    assert bucket.reserve() <= now + 0.01
+    assert bucket.reserve() >= now + 0.09  # Third token comes 1/rate later
+
+
+def test_token_bucket_refund_never_exceeds_burst():
+    bucket = TokenBucket(rate=1, burst=2)
+    bucket.refund()
+    bucket.refund()
+    assert bucket.tokens == 2
+
+
+def test_token_bucket_block():
+    bucket = TokenBucket(rate=100, burst=5)
+    bucket.block(0.5)
+    assert bucket.reserve() >= time.monotonic() + 0.4
+
+
+def test_disallowed_url_does_not_inflate_bucket(robots_get):
+    robots, _ = robots_get
+    robots["example.it"] = "User-agent: *\nDisallow: /private\n"
+    scheduler = CrawlScheduler()
+    for i in range(crawl_scheduler.CRAWL_PER_DOMAIN_BURST):
+        assert scheduler.acquire(f"https://example.it/p{i}") is True
+    bucket = scheduler.domains["example.it"]
+    for _ in range(5):
+        assert scheduler.acquire("https://example.it/private/page") is False
+    assert bucket.tokens < 1  # The burst is spent; refusals handed no tokens back
+    assert scheduler.get_stats()["robots_disallowed"] == 5
+
+
+def test_concurrent_first_hits_share_one_robots_fetch(robots_get):
+    _, calls = robots_get
+    scheduler = CrawlScheduler()
+    threads = [threading.Thread(target=scheduler.acquire, args=(f"https://shop.it/p{i}",)) for i in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert [url for url, _ in calls] == ["https://shop.it/robots.txt"]
+
+
+def test_robots_fetch_bounded_by_deadline(robots_get):
+    _, calls = robots_get
+    scheduler = CrawlScheduler()
+    scheduler.acquire("https://slow.it/", deadline=time.monotonic() + 1)
+    assert calls[0][1] <= 1
+
+    # Deadline already passed: robots.txt is not fetched at all
+    assert scheduler.acquire("https://late.it/", deadline=time.monotonic() - 1) is False
+    assert len(calls) == 1
+
+
+def test_crawl_delay_slows_domain_bucket(robots_get):
+    robots, _ = robots_get
+    robots["slow.it"] = "User-agent: *\nCrawl-delay: 5\n"
+    scheduler = CrawlScheduler()
+    scheduler.acquire("https://slow.it/")
+    assert scheduler.domains["slow.it"].rate == pytest.approx(0.2)
+
+
+def test_retry_after_seconds():
+    assert retry_after_seconds("7") == 7
+    assert retry_after_seconds(None) == crawl_scheduler.CRAWL_DEFAULT_BACKOFF
+    assert retry_after_seconds("99999") == crawl_scheduler.CRAWL_MAX_WAIT + 1
+
+
+def test_failed_robots_fetch_is_retried(robots_get, monkeypatch):
+    robots, calls = robots_get
+    monkeypatch.setattr(crawl_scheduler, "ROBOTS_RETRY_SECONDS", 0.2)
+    scheduler = CrawlScheduler()
+    # Deadline passed: robots.txt skipped, the domain has no rules for now
+    scheduler.acquire("https://shop.it/private/a", deadline=time.monotonic() - 1)
+    assert calls == []
+
+    robots["shop.it"] = "User-agent: *\nDisallow: /private\nCrawl-delay: 5\n"
+    assert scheduler.acquire("https://shop.it/private/b") is True  # Still within the retry delay
+    time.sleep(0.25)
+    assert scheduler.acquire("https://shop.it/private/c") is False
+    assert [url for url, _ in calls] == ["https://shop.it/robots.txt"]
+    assert scheduler.domains["shop.it"].rate == pytest.approx(0.2)
+
+
+def test_domain_state_is_bounded(robots_get, monkeypatch):
+    monkeypatch.setattr(crawl_scheduler, "CRAWL_MAX_DOMAINS", 3)
+    scheduler = CrawlScheduler()
+    for name in ("a", "b", "c", "a", "d"):
+        scheduler.acquire(f"https://{name}.it/")
+    assert list(scheduler.domains) == ["c.it", "a.it", "d.it"]
+    assert len(scheduler.robots) == 3
@@ -0,0 +1,65 @@
+import random
+import string
+import time
+
+from disk_cache import DiskCache
+
+
+def test_roundtrip_and_stats(tmp_path):
+    cache = DiskCache("t_roundtrip", ttl_seconds=60, max_bytes=1024 * 1024, path=tmp_path / "c.sqlite3")
+    assert cache.get("k") is None
+    cache.set("k", {"pages": ["città"]})
+    assert cache.get("k") == {"pages": ["città"]}
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 1, 1)
+
+
+def test_entries_expire_after_ttl(tmp_path):
+    cache = DiskCache("t_ttl", ttl_seconds=0.2, max_bytes=1024 * 1024, path=tmp_path / "c.sqlite3")
+    cache.set("k", 1)
+    assert cache.get("k") == 1
+    time.sleep(0.3)
+    assert cache.get("k") is None
+
+
+def test_zero_ttl_disables_cache(tmp_path):
+    cache = DiskCache("t_off", ttl_seconds=0, max_bytes=1024, path=tmp_path / "c.sqlite3")
+    cache.set("k", 1)
+    assert cache.get("k") is None
+    assert not tmp_path.joinpath("c.sqlite3").exists()
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = DiskCache("t_lru", ttl_seconds=60, max_bytes=3000, path=tmp_path / "c.sqlite3")
+    payload = "".join(random.Random(0).choices(string.ascii_letters, k=1500))  # ~1.1 KB compressed
+    for key in ("a", "b"):
+        cache.set(key, payload)
+        time.sleep(0.01)
+    assert cache.get("a") == payload  # "a" becomes the most recently used
+    time.sleep(0.01)
+    cache.set("c", payload)
+    assert cache.get("b") is None
+    assert cache.get("a") == payload and cache.get("c") == payload
+
+
+def test_replay_read_ignores_age_and_keeps_the_entry(tmp_path):
+    cache = DiskCache("t_replay", ttl_seconds=0.2, max_bytes=1024 * 1024, path=tmp_path / "c.sqlite3")
+    cache.set("k", [1, 2])
+    time.sleep(0.3)
+    assert cache.get("k", fresh=False) == [1, 2]
+    assert cache.get("k", fresh=False) == [1, 2]
+    assert cache.get("k") is None
+
+
+def test_replay_read_works_with_zero_ttl(tmp_path):
+    DiskCache("t_record", ttl_seconds=60, max_bytes=1024 * 1024, path=tmp_path / "c.sqlite3").set("k", 1)
+    replay = DiskCache("t_replay_off", ttl_seconds=0, max_bytes=1024 * 1024, path=tmp_path / "c.sqlite3")
+    assert replay.get("k") is None
+    assert replay.get("k", fresh=False) == 1
+    assert replay.get("missing", fresh=False) is None
+
+
+def test_replay_read_does_not_create_the_file(tmp_path):
+    cache = DiskCache("t_replay_none", ttl_seconds=0, max_bytes=1024, path=tmp_path / "c.sqlite3")
+    assert cache.get("k", fresh=False) is None
+    assert not tmp_path.joinpath("c.sqlite3").exists()
@@ -0,0 +1,64 @@
+import pytest
+
+import html_text
+from html_text import html_to_text
+
+PAGE = """<html><head><title>Cantina Rossi</title><style>body { color: red }</style>
+<script>var tracking = "segreto";</script></head>
+<body>
+<header>Menu principale</header>
+<nav><a href="/">Home</a><a href="/contatti">Contatti</a></nav>
+<main>
+<h1>Cantina Rossi</h1>
+<p>Produciamo vino   dal 1950.</p>
+<div>Bottiglie  Etichette</div>
+<p>Visita la <b>cantina</b> in collina.<script>evil()</script> Ti aspettiamo.</p>
+</main>
+<footer>P.IVA 01234567890</footer>
+</body></html>"""
+
+
+@pytest.fixture(params=list(html_text.BACKENDS))
+def backend(request):
+    return request.param
+
+
+def test_strips_scripts_styles_and_chrome(backend):
+    text = html_to_text(PAGE, backend=backend)
+    for hidden in ("segreto", "color: red", "Menu principale", "Contatti", "P.IVA", "evil"):
+        assert hidden not in text
+    assert "Cantina Rossi" in text
+
+
+def test_one_phrase_per_line(backend):
+    lines = html_to_text(PAGE, backend=backend).splitlines()
+    assert all(line and line == line.strip() for line in lines)
+    # Double spaces split phrases; tail text after a dropped tag survives
+    assert "Bottiglie" in lines and "Etichette" in lines
+    assert any("Ti aspettiamo." in line for line in lines)
+
+
+def test_backends_agree():
+    reference = set(html_to_text(PAGE, backend="html.parser").splitlines())
+    for name in html_text.BACKENDS:
+        assert set(html_to_text(PAGE, backend=name).splitlines()) == reference, name
+
+
+@pytest.mark.filterwarnings("ignore::bs4.XMLParsedAsHTMLWarning")
+@pytest.mark.parametrize("html", ["", "   ", "<?xml version='1.0' encoding='utf-8'?><p>Ciao</p>", "<p>Non chiuso <b>grassetto"])
+def test_empty_and_odd_documents(backend, html):
+    text = html_to_text(html, backend=backend)
+    assert text == html_to_text(html, backend="html.parser")
+
+
+def test_unknown_backend_falls_back(capsys):
+    assert html_text.resolve_backend("missing") == next(iter(html_text.BACKENDS))
+    assert "missing" in capsys.readouterr().out
+    assert html_text.resolve_backend("auto") == next(iter(html_text.BACKENDS))
+
+
+def test_parser_errors_fall_back_to_html_parser(monkeypatch):
+    def broken(html):
+        raise ValueError("markup rifiutato")
+    monkeypatch.setitem(html_text.BACKENDS, "broken", broken)
+    assert html_to_text("<p>Ciao</p>", backend="broken") == "Ciao"
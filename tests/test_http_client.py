@@ -0,0 +1,53 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import http_client
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+
+    def do_GET(self):
+        self.server.connections.add(self.client_address)
+        self.server.user_agents.add(self.headers.get("User-Agent"))
+        body = b"ok"
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    httpd.connections, httpd.user_agents = set(), set()
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_consecutive_requests_reuse_one_connection(server):
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    for path in ("/", "/chi-siamo", "/contatti", "/"):
+        assert http_client.get(url + path).text == "ok"
+    assert len(server.connections) == 1
+    assert server.user_agents == {http_client.USER_AGENT}
+
+
+def test_sessions_are_per_thread_over_shared_pools():
+    sessions = []
+    threads = [threading.Thread(target=lambda: sessions.append(http_client.get_session())) for _ in range(3)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len({id(s) for s in sessions}) == 3
+    assert {id(s.get_adapter("https://example.it")) for s in sessions} == {id(http_client._adapter)}
+    assert http_client.get_session() is http_client.get_session()
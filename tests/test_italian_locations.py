@@ -0,0 +1,85 @@
+import pytest
+from italian_locations import cap_provinces, location_matches, parse_address, resolve_location
+
+
+@pytest.mark.parametrize("location, code", [
+    ("Forlì-Cesena", "FC"),
+    ("Monza e della Brianza", "MB"),
+    ("Pesaro e Urbino", "PU"),
+    ("Massa-Carrara", "MS"),
+    ("provincia di Milano", "MI"),
+    ("MI", "MI"),
+])
+def test_province_names_resolve_to_province(location, code):
+    assert resolve_location(location) == {"level": "province", "province": code}
+
+
+def test_capoluogo_resolves_to_comune():
+    assert resolve_location("Milano") == {"level": "comune", "comune": "milano", "province": "MI"}
+    assert resolve_location("Lombardia") == {"level": "region", "region": "Lombardia"}
+    assert resolve_location("Italia") == {"level": "country"}
+
+
+def test_compound_province_matches_its_comuni():
+    assert location_matches("Via Emilia 10, 47521 Cesena FC", "Forlì-Cesena") == (True, "province")
+    assert location_matches("Corso Garibaldi 1, 47121 Forlì FC", "Forlì-Cesena")[0]
+    assert not location_matches("Via Roma 1, 47921 Rimini RN", "Forlì-Cesena")[0]
+    assert location_matches("Via Italia 5, 20900 Monza MB", "Monza e della Brianza")[0]
+
+
+def test_bilingual_comune_names():
+    assert parse_address("Via Museo 1, 39100 Bozen BZ")["comune"] == "bolzano"
+    assert location_matches("Via Museo 1, 39100 Bozen BZ", "Bolzano") == (True, "comune")
+    assert location_matches("Via Museo 1, 39100 Bolzano BZ", "Bozen")[0]
+    assert not location_matches("Via Roma 1, 38122 Trento TN", "Bolzano")[0]
+
+
+def test_comune_and_province_levels():
+    address = "Via Roma 1, 20099 Sesto San Giovanni MI"
+    assert location_matches(address, "Milano") == (False, "comune")
+    assert location_matches(address, "Milano", include_province=True) == (True, "province")
+
+
+def test_street_named_after_another_city_does_not_match():
+    assert not location_matches("Via Cesena 12, 47921 Rimini RN", "Cesena")[0]
+
+
+def test_country_part_is_ignored_when_a_specific_part_is_given():
+    assert location_matches("Via Toledo 1, 80134 Napoli NA", "Milano, Italia") == (False, "comune")
+    assert location_matches("Via Dante 1, 20121 Milano MI", "Milano, Italia") == (True, "comune")
+    assert location_matches("Via Toledo 1, 80134 Napoli NA", "Italia, Italy") == (True, "country")
+
+
+def test_unknown_part_matches_as_phrase():
+    address = "Via Vittorio Emanuele 1, 25030 Erbusco BS"
+    assert not location_matches(address, "Franciacorta, Brescia")[0]
+    assert location_matches(address, "Franciacorta, Brescia", include_province=True)[0]
+    assert location_matches("Strada Franciacorta 3, Località Franciacorta, 25030 Erbusco BS", "Franciacorta, Brescia")[0]
+
+
+@pytest.mark.parametrize("location, province", [
+    ("Avezzano", "AQ"), ("Lanciano", "CH"), ("Lamezia Terme", "CZ"), ("Torre del Greco", "NA"),
+])
+def test_comuni_from_istat_list(location, province):
+    assert resolve_location(location) == {"level": "comune", "comune": location.lower(), "province": province}
+
+
+def test_parsing_addresses_does_not_change_the_index():
+    assert resolve_location("Borgo Inventato")["level"] == "unknown"
+    parse_address("Via Roma 1, 47039 Borgo Inventato FC")
+    assert resolve_location("Borgo Inventato")["level"] == "unknown"
+
+
+@pytest.mark.parametrize("cap, provinces", [
+    ("47521", ["FC"]), ("47921", ["RN"]), ("23900", ["LC"]), ("23100", ["SO"]),
+    ("88046", ["CZ"]), ("89900", ["VV"]), ("00118", ["RM"]), ("99999", []),
+])
+def test_cap_provinces(cap, provinces):
+    assert cap_provinces(cap) == provinces
+
+
+def test_address_without_province_code_uses_cap_range():
+    assert location_matches("Via Roma 1, 47921 Rimini", "Rimini", include_province=True)[0]
+    assert not location_matches("Via Roma 1, 47921 Rimini", "Forlì-Cesena")[0]
+    assert location_matches("Via Roma 1, 23900 Lecco", "provincia di Lecco") == (True, "province")
+    assert not location_matches("Via Roma 1, 23100 Sondrio", "provincia di Lecco")[0]
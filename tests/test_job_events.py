@@ -0,0 +1,56 @@
+import threading
+
+import pytest
+
+import search_leads
+from search_leads import emit_event, get_events, get_job_snapshot, search_jobs, search_jobs_lock, job_events
+
+
+@pytest.fixture
+def job():
+    job_id = "job-events-test"
+    with search_jobs_lock:
+        search_jobs[job_id] = {"status": "running", "accepted": [], "discarded": [], "below_threshold": []}
+        job_events[job_id] = []
+    yield job_id
+    with search_jobs_lock:
+        search_jobs.pop(job_id, None)
+        job_events.pop(job_id, None)
+
+
+def test_snapshot_lists_match_event_cursor(job):
+    mismatches = []
+
+    def producer(n):
+        for i in range(200):
+            emit_event(job, "lead_accepted" if i % 3 else "lead_discarded", {"company_name": f"{n}-{i}"})
+            emit_event(job, "progress", {"progress": "..."})
+
+    def reader():
+        for _ in range(500):
+            snapshot, cursor = get_job_snapshot(job)
+            events, _ = get_events(job)
+            leads = [e for e in events[:cursor] if e["type"] in search_leads.LEAD_EVENT_LISTS]
+            if len(snapshot["accepted"]) + len(snapshot["discarded"]) != len(leads):
+                mismatches.append(cursor)
+
+    threads = [threading.Thread(target=producer, args=(n,)) for n in range(3)] + [threading.Thread(target=reader)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert mismatches == []
+    snapshot, cursor = get_job_snapshot(job)
+    assert cursor == 1200 and len(snapshot["accepted"]) == 399 and len(snapshot["discarded"]) == 201
+
+
+def test_earlier_snapshot_is_not_mutated(job):
+    emit_event(job, "lead_below_threshold", {"company_name": "a"})
+    snapshot, _ = get_job_snapshot(job)
+    emit_event(job, "lead_below_threshold", {"company_name": "b"})
+    assert [lead["company_name"] for lead in snapshot["below_threshold"]] == ["a"]
+
+
+def test_events_without_job_id_are_dropped():
+    emit_event(None, "lead_accepted", {})
+    assert None not in job_events
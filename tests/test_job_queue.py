@@ -0,0 +1,58 @@
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+from postgrest.exceptions import APIError
+
+import api
+import job_queue
+
+
+@pytest.fixture
+def active_jobs(monkeypatch):
+    """In-memory search_job_queue with the unique index on active jobs per product."""
+    jobs = {}
+    lock = threading.Lock()
+
+    def insert(job_id, product_id, *params):
+        with lock:
+            if product_id in jobs:
+                raise APIError({"code": "23505", "message": "duplicate key value violates unique constraint"})
+            jobs[product_id] = job_id
+
+    monkeypatch.setattr(job_queue, "_insert_job", insert)
+    monkeypatch.setattr(job_queue, "find_active_job", lambda product_id: jobs.get(product_id))
+    monkeypatch.setattr(job_queue, "SEARCH_QUEUE_ENABLED", True)
+    return jobs
+
+
+def test_enqueue_returns_the_active_job_on_conflict(active_jobs):
+    assert job_queue.enqueue_search("job-1", "p1", "Cesena", 10, 60, False) == "job-1"
+    assert job_queue.enqueue_search("job-2", "p1", "Rimini", 10, 60, False) == "job-1"
+    assert job_queue.enqueue_search("job-3", "p2", "Cesena", 10, 60, False) == "job-3"
+
+
+def test_other_insert_errors_are_raised(monkeypatch):
+    def insert(*args):
+        raise APIError({"code": "42501", "message": "permission denied"})
+    monkeypatch.setattr(job_queue, "_insert_job", insert)
+    with pytest.raises(APIError):
+        job_queue.enqueue_search("job-1", "p1", "Cesena", 10, 60, False)
+
+
+def test_concurrent_searches_queue_one_job(active_jobs):
+    client = TestClient(api.app)
+    barrier = threading.Barrier(8)
+    responses = []
+
+    def post():
+        barrier.wait()
+        responses.append(client.post("/search", json={"product_id": "p1", "location": "Cesena"}).json())
+
+    threads = [threading.Thread(target=post) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sorted(r["status"] for r in responses) == ["already_running"] * 7 + ["started"]
+    assert {r["job_id"] for r in responses} == {active_jobs["p1"]}
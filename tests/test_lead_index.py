@@ -0,0 +1,76 @@
+import types
+
+import numpy as np
+import pytest
+
+import evaluate_lead
+import lead_index
+from lead_index import LeadIndex, embed, predict_score
+
+BASE = "Cantina vinicola in Romagna: produzione di vini rossi e bianchi, degustazioni in tenuta, vendita bottiglie. "
+
+
+@pytest.fixture
+def index(monkeypatch, tmp_path):
+    monkeypatch.setattr(lead_index, "CACHE_DIR", tmp_path)
+    monkeypatch.setattr(lead_index, "LEAD_INDEX_ENABLED", True)
+    monkeypatch.setattr(lead_index, "LEAD_INDEX_K", 3)
+    fresh = LeadIndex("lead_index_test")
+    monkeypatch.setattr(lead_index, "lead_index", fresh)
+    return fresh
+
+
+def site_text(i):
+    return BASE * 3 + f"Cantina numero {i}."
+
+
+def test_embed_is_stable_and_normalized():
+    vec = embed(BASE)
+    assert np.allclose(vec, embed(BASE))
+    assert np.linalg.norm(vec) == pytest.approx(1.0)
+    assert not embed("").any()
+    assert float(embed(site_text(1)) @ embed(site_text(2))) > 0.9
+    assert float(embed(site_text(1)) @ embed("Officina meccanica, riparazione auto e gomme")) < 0.3
+
+
+def test_agreeing_neighbours_predict_the_score(index):
+    for i, score in enumerate((70, 74, 72)):
+        index.add("k1", f"https://cantina{i}.it", embed(site_text(i)), {"score": score, "reason": "vino"})
+    predicted = predict_score("k1", embed(site_text(9)), "https://nuova.it")
+    assert 70 <= predicted["score"] <= 74
+    assert sorted(predicted["neighbours"]) == ["cantina0.it", "cantina1.it", "cantina2.it"]
+    # Other products/prompts are a separate partition
+    assert predict_score("k2", embed(site_text(9)), "https://nuova.it") is None
+
+
+def test_no_prediction_without_agreement_or_enough_neighbours(index):
+    for i, score in enumerate((20, 80, 50)):
+        index.add("k1", f"https://cantina{i}.it", embed(site_text(i)), {"score": score, "reason": "vino"})
+    assert predict_score("k1", embed(site_text(9)), "https://nuova.it") is None
+    # A site is never its own neighbour: two left out of k=3
+    index.add("k3", "https://a.it", embed(site_text(1)), {"score": 70})
+    index.add("k3", "https://b.it", embed(site_text(2)), {"score": 70})
+    index.add("k3", "https://nuova.it", embed(site_text(3)), {"score": 70})
+    assert predict_score("k3", embed(site_text(9)), "https://www.nuova.it/") is None
+
+
+def test_backfill_writes_the_partition_searches_read(index, monkeypatch):
+    product = {"id": "p1", "name": "Etichette", "description": "etichette per vino", "target_keywords": "cantine"}
+    leads = [{"website": f"https://cantina{i}.it", "match_score": 75, "match_reason": "ok",
+              "interested_product_id": "p1"} for i in range(3)]
+
+    class Query:
+        def __init__(self, table):
+            self.table = table
+
+        def __getattr__(self, name):
+            return self if name == "not_" else lambda *args, **kwargs: self
+
+        def execute(self):
+            return types.SimpleNamespace(data=[product] if self.table == "products" else leads)
+
+    monkeypatch.setattr(evaluate_lead, "supabase", types.SimpleNamespace(table=Query))
+    monkeypatch.setattr(evaluate_lead, "scrape_text_content", lambda website, product=None: site_text(website[-4]))
+    assert lead_index.backfill() == 3
+    key = evaluate_lead.index_key(product, evaluate_lead.search_prompt_version())
+    assert predict_score(key, embed(site_text(9)), "https://nuova.it")["score"] == 75
@@ -0,0 +1,50 @@
+from prescore import prescore, relevance, tokenize
+
+PRODUCT = {
+    "name": "Etichette per vino",
+    "target_keywords": "cantine, aziende vinicole",
+    "description": (
+        "Stampiamo etichette adesive personalizzate in carta goffrata, con lamina oro, "
+        "rilievo serigrafico e verniciatura UV, per bottiglie di vino, olio, birra "
+        "artigianale e distillati; tirature brevi, consegna rapida, grafica inclusa. "
+        "Supportiamo il cliente dalla progettazione del marchio alla scelta dei materiali, "
+        "con campionature gratuite, controllo colore, finiture tattili, inchiostri "
+        "ecologici certificati FSC e spedizione in tutta Europa entro cinque giorni lavorativi."
+    ),
+    "ai_description": (
+        "Rotoli di etichette autoadesive eleganti su carte naturali martellate e vergate, "
+        "stampa digitale e a caldo, nobilitazioni in rilievo, fustellature sagomate, "
+        "palette cromatiche sobrie con dettagli metallici e tipografia classica con grazie."
+    ),
+}
+
+# Mentions one core keyword once, nothing from the long description
+ON_TOPIC = "Benvenuti nella nostra cantina in Franciacorta. " + (
+    "Visita la tenuta sulle colline, passeggia tra i filari e prenota una degustazione guidata. "
+) * 6
+
+OFF_TOPIC = (
+    "Officina meccanica specializzata in riparazione auto, cambio gomme, revisioni "
+    "e diagnosi elettronica. Prenota il tagliando online. "
+) * 8
+
+
+def test_tokenize_stems_plurals_and_drops_stopwords():
+    assert tokenize("Le cantine e la cantina") == [tokenize("cantina")[0]] * 2
+
+
+def test_single_core_keyword_passes():
+    assert relevance(ON_TOPIC, PRODUCT) >= 0.03
+    assert prescore(ON_TOPIC, PRODUCT) is None
+
+
+def test_off_topic_page_is_rejected():
+    rejected = prescore(OFF_TOPIC, PRODUCT)
+    assert rejected is not None
+    assert rejected["score"] > 0 and not rejected["accepted"]
+
+
+def test_relevance_is_bounded():
+    text = " ".join(tokenize(PRODUCT["description"] + " " + PRODUCT["target_keywords"])) * 5
+    assert 0 < relevance(text, PRODUCT) <= 1.0
+    assert relevance("qualsiasi testo", {"name": ""}) == 1.0
@@ -0,0 +1,67 @@
+import json
+import types
+
+import pytest
+
+import evaluate_lead
+from disk_cache import DiskCache
+from evaluate_lead import score_cache_key
+
+PRODUCT = {"id": "p1", "name": "Etichette", "description": "etichette per vino", "ai_description": "",
+           "target_keywords": "cantine"}
+SNAPSHOT = {"pages": [{"path": "/", "kind": "home", "text": "Cantina Rossi: vini rossi e bianchi della tenuta. " * 5}]}
+
+
+def key(**changes):
+    args = dict(company_name="Rossi", website="https://rossi.it", location="Cesena", product=PRODUCT,
+                website_content="Cantina Rossi, vini dal 1950")
+    args.update(changes)
+    return score_cache_key(**args)
+
+
+def test_key_changes_with_what_the_llm_sees(monkeypatch):
+    base = key()
+    assert key() == base
+    assert key(website_content="Cantina Rossi, vini dal 1951") != base
+    assert key(product=dict(PRODUCT, description="etichette adesive")) != base
+    assert key(prompt_version="batch-1") != base
+    monkeypatch.setattr(evaluate_lead, "SCORING_MODEL", "gpt-4o-mini")
+    assert key() != base
+
+
+def test_key_ignores_product_fields_outside_the_prompt():
+    assert key(product=dict(PRODUCT, id="p2", created_at="2026-01-01")) == key()
+
+
+@pytest.fixture
+def llm(monkeypatch, tmp_path):
+    calls = []
+
+    def create(**kwargs):
+        calls.append(kwargs)
+        content = json.dumps({"score": 72, "reason": "Cantina affine"})
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(message=types.SimpleNamespace(content=content))])
+
+    monkeypatch.setattr(evaluate_lead, "client", types.SimpleNamespace(
+        chat=types.SimpleNamespace(completions=types.SimpleNamespace(create=create))))
+    monkeypatch.setattr(evaluate_lead, "score_cache", DiskCache("scores_test", 3600, 10 * 1024 * 1024, path=tmp_path / "s.sqlite3"))
+    monkeypatch.setattr(evaluate_lead, "prescore", lambda *a: None)
+    monkeypatch.setattr(evaluate_lead, "LEAD_INDEX_ENABLED", False)
+    monkeypatch.setattr(evaluate_lead, "predict_score", lambda *a: None)
+    return calls
+
+
+def test_repeated_lead_is_scored_once(llm):
+    first = evaluate_lead.evaluate_lead_prefilter("Rossi", "https://rossi.it", "Cesena", PRODUCT, snapshot=SNAPSHOT)
+    second = evaluate_lead.evaluate_lead_prefilter("Rossi", "https://rossi.it", "Cesena", PRODUCT, snapshot=SNAPSHOT)
+    assert (first["source"], second["source"]) == ("llm", "cache")
+    assert second["score"] == first["score"] == 72
+    assert len(llm) == 1
+
+
+def test_changed_site_content_is_scored_again(llm):
+    evaluate_lead.evaluate_lead_prefilter("Rossi", "https://rossi.it", "Cesena", PRODUCT, snapshot=SNAPSHOT)
+    changed = {"pages": [{"path": "/", "kind": "home", "text": "Cantina Rossi: nuova linea di spumanti. " * 5}]}
+    result = evaluate_lead.evaluate_lead_prefilter("Rossi", "https://rossi.it", "Cesena", PRODUCT, snapshot=changed)
+    assert result["source"] == "llm"
+    assert len(llm) == 2
@@ -0,0 +1,185 @@
+import threading
+import time
+import types
+
+import pytest
+
+import search_leads
+from url_utils import normalize_domain
+
+PRODUCT = {"id": "p1", "name": "Etichette", "description": "etichette per vino", "target_keywords": "cantine, enoteche"}
+
+
+class FakeQuery:
+    def __init__(self, db, table):
+        self.db, self.table, self.op, self.rows, self.filters = db, table, "select", None, []
+
+    def select(self, *args):
+        return self
+
+    def eq(self, column, value):
+        self.filters.append((column, [value]))
+        return self
+
+    def in_(self, column, values):
+        self.filters.append((column, list(values)))
+        return self
+
+    def upsert(self, rows, **kwargs):
+        self.op, self.rows = "upsert", rows
+        return self
+
+    def insert(self, row):
+        self.op, self.rows = "insert", [row]
+        return self
+
+    def execute(self):
+        with self.db.lock:
+            if self.table == "products":
+                return types.SimpleNamespace(data=[PRODUCT])
+            if self.op == "select":
+                column, values = self.filters[0]
+                self.db.selects.append(len(values))
+                return types.SimpleNamespace(data=[{column: d} for d in self.db.leads if d in values])
+            if self.op == "upsert":
+                if self.db.fail_bulk:
+                    raise RuntimeError("bulk insert failed")
+                self.db.upserts.append(len(self.rows))
+            else:
+                self.db.inserts += 1
+            inserted = []
+            for row in self.rows:
+                domain = normalize_domain(row["website"])
+                if domain not in self.db.leads:
+                    self.db.leads[domain] = row
+                    inserted.append(dict(row, id=f"lead-{len(self.db.leads)}"))
+            return types.SimpleNamespace(data=inserted)
+
+
+class FakeSupabase:
+    """The leads/products tables search_leads touches, leads unique per website_domain."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.leads = {}
+        self.selects = []
+        self.upserts = []
+        self.inserts = 0
+        self.fail_bulk = False
+
+    def table(self, name):
+        return FakeQuery(self, name)
+
+
+def serp_page(query, offset=0):
+    if offset >= 100:
+        return []
+    keyword = query.split(" a ")[0]
+    return [{
+        "title": f"{keyword} {offset + i}",
+        "website": f"https://{keyword}-{offset + i}.it",
+        "address": "Via Roma 1, 47521 Cesena FC",
+        "place_id": f"{keyword}-{offset + i}",
+        "rating": 4.5,
+        "reviews": 20,
+    } for i in range(20)]
+
+
+@pytest.fixture
+def search(monkeypatch):
+    """search_leads against fakes: SerpAPI pages, crawl, scorer, contacts and the DB."""
+    db = FakeSupabase()
+    calls = {"enrich": 0, "enriching": 0, "max_enriching": 0, "scored": 0}
+    lock = threading.Lock()
+
+    class Scorer:
+        delay = 0.01
+
+        def __init__(self, product):
+            pass
+
+        def evaluate(self, company_name, website, location, snapshot):
+            time.sleep(Scorer.delay)
+            with lock:
+                calls["scored"] += 1
+            return {"score": 80, "reason": "ok", "source": "llm"}
+
+    def contacts(website, snapshot=None):
+        with lock:
+            calls["enrich"] += 1
+            calls["enriching"] += 1
+            calls["max_enriching"] = max(calls["max_enriching"], calls["enriching"])
+        time.sleep(0.05)
+        with lock:
+            calls["enriching"] -= 1
+        return {"emails": ["info@example.it"], "phones": []}
+
+    monkeypatch.setattr(search_leads, "supabase", db)
+    monkeypatch.setattr(search_leads, "fetch_serpapi_results", serp_page)
+    monkeypatch.setattr(search_leads, "crawl_site", lambda url: {"pages": [], "emails": [], "phones": []})
+    monkeypatch.setattr(search_leads, "LeadBatchScorer", Scorer)
+    monkeypatch.setattr(search_leads, "extract_contacts_from_url", contacts)
+    return types.SimpleNamespace(db=db, calls=calls, scorer=Scorer)
+
+
+@pytest.mark.parametrize("limit, concurrency", [(1, 8), (5, 8), (7, 3), (12, 16)])
+def test_exact_limit_under_concurrency(search, limit, concurrency):
+    result = search_leads.search_leads("p1", "Cesena", limit=limit, min_score=50, concurrency=concurrency)
+    assert len(result["accepted"]) == limit
+    assert len(search.db.leads) == limit
+    # A slot is reserved before enrichment: no contact scraping beyond the limit
+    assert search.calls["enrich"] == limit
+    assert search.calls["max_enriching"] <= limit
+
+
+def test_known_leads_are_checked_per_page_and_skipped(search):
+    for i in range(3):
+        search.db.leads[f"cantine-{i}.it"] = {}
+    result = search_leads.search_leads("p1", "Cesena", limit=4, min_score=50, concurrency=4)
+    assert len(result["accepted"]) == 4
+    assert not {lead["website"] for lead in result["accepted"]} & {f"https://cantine-{i}.it" for i in range(3)}
+    # One `in` query per SerpAPI page, never one per candidate
+    assert search.db.selects and all(n == 20 for n in search.db.selects)
+
+
+def test_accepted_leads_are_inserted_in_batches(search, monkeypatch):
+    monkeypatch.setattr(search_leads, "LEAD_INSERT_BATCH_SIZE", 5)
+    result = search_leads.search_leads("p1", "Cesena", limit=15, min_score=50, concurrency=8)
+    assert len(result["accepted"]) == 15
+    assert sum(search.db.upserts) == 15
+    assert len(search.db.upserts) < 15
+    assert search.db.inserts == 0
+
+
+def test_failed_bulk_insert_retries_one_by_one(search):
+    search.db.fail_bulk = True
+    result = search_leads.search_leads("p1", "Cesena", limit=3, min_score=50, concurrency=2)
+    assert len(result["accepted"]) == 3
+    assert search.db.inserts == 3
+    assert all(lead.get("id") for lead in result["accepted"])
+
+
+def test_stop_is_prompt(search):
+    search.scorer.delay = 0.2
+    job_id = "job-stop-test"
+    result = {}
+    runner = threading.Thread(daemon=True, target=lambda: result.update(
+        search_leads.search_leads("p1", "Cesena", limit=500, min_score=50, job_id=job_id, concurrency=4)))
+    runner.start()
+    time.sleep(0.6)
+    with search_leads.search_jobs_lock:
+        search_leads.search_jobs[job_id]["stop_requested"] = True
+    stopped_at = time.time()
+    runner.join(5)
+    try:
+        assert not runner.is_alive()
+        # One poll interval plus the evaluations already running
+        assert time.time() - stopped_at < search_leads.STOP_POLL_SECONDS + 0.5
+        job = search_leads.search_jobs[job_id]
+        assert (job["status"], job["stopped_reason"]) == ("completed", "manual")
+        assert 0 < len(result["accepted"]) < 500
+        assert len(search.db.leads) == len(result["accepted"])
+    finally:
+        with search_leads.search_jobs_lock:
+            search_leads.search_jobs.pop(job_id, None)
+            search_leads.job_events.pop(job_id, None)
@@ -0,0 +1,119 @@
+import threading
+import time
+
+import pytest
+
+import search_leads
+from crawl_scheduler import TokenBucket
+from disk_cache import DiskCache
+
+
+@pytest.fixture
+def serp(monkeypatch):
+    """fetch_serpapi_results replaced by a fake recording (query, offset) calls."""
+    calls = []
+    lock = threading.Lock()
+
+    def fetch(query, offset=0):
+        with lock:
+            calls.append((query, offset))
+        time.sleep(fetch.delay)
+        if query == "errore":
+            raise search_leads.SerpAPIError("SerpAPI returned error: quota", code="SERPAPI_ERROR")
+        return [{"title": f"{query} @ {offset}"}]
+
+    fetch.delay = 0
+    fetch.calls = calls
+    monkeypatch.setattr(search_leads, "fetch_serpapi_results", fetch)
+    return fetch
+
+
+def state(query, page=1, offset=20, exhausted=False):
+    return {"full_query": query, "page": page, "offset": offset, "exhausted": exhausted}
+
+
+def test_schedule_queues_upcoming_pages_of_live_keywords(serp):
+    prefetcher = search_leads.SerpPrefetcher(depth=2, max_pages=3)
+    try:
+        prefetcher.schedule([state("cantine"), state("frantoi", page=2, offset=40), state("birrifici", exhausted=True)])
+        prefetcher.schedule([state("cantine")])  # Already in flight: not queued twice
+        assert set(prefetcher.futures) == {("cantine", 20), ("cantine", 40), ("frantoi", 40)}
+        for future in prefetcher.futures.values():
+            future.result()
+        assert sorted(serp.calls) == [("cantine", 20), ("cantine", 40), ("frantoi", 40)]
+    finally:
+        prefetcher.close()
+
+
+def test_get_serves_the_prefetched_page_once(serp):
+    prefetcher = search_leads.SerpPrefetcher(depth=1)
+    try:
+        prefetcher.schedule([state("cantine")])
+        assert prefetcher.get("cantine", 20) == [{"title": "cantine @ 20"}]
+        assert serp.calls == [("cantine", 20)]
+        # Not prefetched: fetched on the spot
+        assert prefetcher.get("cantine", 20) == [{"title": "cantine @ 20"}]
+        assert serp.calls == [("cantine", 20)] * 2
+    finally:
+        prefetcher.close()
+
+
+def test_prefetched_errors_surface_on_get(serp):
+    prefetcher = search_leads.SerpPrefetcher(depth=1)
+    try:
+        prefetcher.schedule([state("errore")])
+        with pytest.raises(search_leads.SerpAPIError):
+            prefetcher.get("errore", 20)
+    finally:
+        prefetcher.close()
+
+
+def test_pages_of_different_keywords_load_in_parallel(serp):
+    serp.delay = 0.2
+    prefetcher = search_leads.SerpPrefetcher(depth=2)
+    try:
+        states = [state("cantine"), state("frantoi")]
+        started = time.monotonic()
+        prefetcher.schedule(states)
+        pages = [prefetcher.get(qs["full_query"], qs["offset"] + 20 * ahead) for qs in states for ahead in range(2)]
+        assert len(pages) == 4
+        assert time.monotonic() - started < 0.6  # Four pages of 0.2 s, not one after the other
+    finally:
+        prefetcher.close()
+
+
+def test_close_cancels_pending_pages(serp):
+    serp.delay = 0.2
+    prefetcher = search_leads.SerpPrefetcher(depth=1)
+    prefetcher.schedule([state(f"keyword {i}") for i in range(6)])
+    pending = list(prefetcher.futures.values())
+    prefetcher.close()
+    assert prefetcher.futures == {}
+    assert any(future.cancelled() for future in pending)
+
+
+def test_cache_key_ignores_the_api_key():
+    params = search_leads.serpapi_params("cantine Cesena", 20)
+    key = search_leads.serpapi_cache_key(params)
+    assert search_leads.serpapi_cache_key(dict(params, api_key="segreta")) == key
+    assert "segreta" not in key
+    assert search_leads.serpapi_cache_key(search_leads.serpapi_params("cantine Cesena", 40)) != key
+    assert search_leads.serpapi_cache_key(search_leads.serpapi_params("cantine Forlì", 20)) != key
+
+
+def test_api_calls_share_the_rate_limit(monkeypatch, tmp_path):
+    monkeypatch.setattr(search_leads, "SERPAPI_CACHE_MODE", "readwrite")
+    monkeypatch.setattr(search_leads, "serpapi_cache", DiskCache("serpapi_test", 3600, 1024 * 1024, path=tmp_path / "s.sqlite3"))
+    monkeypatch.setattr(search_leads, "serpapi_bucket", TokenBucket(10, burst=1))
+    calls = []
+    monkeypatch.setattr(search_leads, "_fetch_serpapi_page", lambda params: calls.append(time.monotonic()) or [])
+
+    threads = [threading.Thread(target=search_leads.fetch_serpapi_results, args=(f"keyword {i}",)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    calls.sort()
+    assert len(calls) == 4
+    # 10 calls/s with no burst: consecutive calls at least ~0.1 s apart
+    assert all(later - earlier >= 0.08 for earlier, later in zip(calls, calls[1:]))
@@ -0,0 +1,39 @@
+import time
+
+import pytest
+
+import search_leads
+from disk_cache import DiskCache
+
+
+@pytest.fixture
+def recorded(monkeypatch, tmp_path):
+    """A SerpAPI cache holding one page recorded long before the TTL."""
+    cache = DiskCache("serpapi_test", ttl_seconds=0.1, max_bytes=1024 * 1024, path=tmp_path / "s.sqlite3")
+    params = search_leads.serpapi_params("cantine Cesena", 0)
+    cache.set(search_leads.serpapi_cache_key(params), [{"title": "Cantina"}])
+    time.sleep(0.2)
+    monkeypatch.setattr(search_leads, "serpapi_cache", cache)
+
+    def no_api(params):
+        raise AssertionError("SerpAPI called")
+    monkeypatch.setattr(search_leads, "_fetch_serpapi_page", no_api)
+    return cache
+
+
+def test_cache_only_mode_replays_expired_pages(monkeypatch, recorded):
+    monkeypatch.setattr(search_leads, "SERPAPI_CACHE_MODE", "only")
+    assert search_leads.fetch_serpapi_results("cantine Cesena") == [{"title": "Cantina"}]
+    # the recorded page is still there for the next replay
+    assert search_leads.fetch_serpapi_results("cantine Cesena") == [{"title": "Cantina"}]
+
+
+def test_cache_only_mode_miss_is_an_empty_page(monkeypatch, recorded):
+    monkeypatch.setattr(search_leads, "SERPAPI_CACHE_MODE", "only")
+    assert search_leads.fetch_serpapi_results("cantine Cesena", offset=20) == []
+
+
+def test_readwrite_mode_does_not_serve_expired_pages(monkeypatch, recorded):
+    monkeypatch.setattr(search_leads, "_fetch_serpapi_page", lambda params: [{"title": "Nuova"}])
+    monkeypatch.setattr(search_leads.serpapi_bucket, "reserve", time.monotonic)
+    assert search_leads.fetch_serpapi_results("cantine Cesena") == [{"title": "Nuova"}]
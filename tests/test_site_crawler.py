@@ -0,0 +1,155 @@
+import threading
+import time
+import types
+
+import pytest
+
+import extract_emails
+import site_crawler
+from disk_cache import DiskCache
+
+HOME = """
+<nav><a href="/chi-siamo">Chi siamo</a> <a href="/contatti">Contatti</a></nav>
+<p>Cantina Rossi, vini dal 1950.</p>
+"""
+ABOUT = "<p>La nostra storia: tre generazioni di viticoltori.</p>"
+CONTACT = "<p>Scrivici a info@cantinarossi.it o chiama 0547 123456</p>"
+
+
+@pytest.fixture
+def site(monkeypatch, tmp_path):
+    """A fake website (url -> html) served through fetch_page, with fresh caches."""
+    pages = {
+        "https://cantinarossi.it": HOME,
+        "https://cantinarossi.it/chi-siamo": ABOUT,
+        "https://cantinarossi.it/contatti": CONTACT,
+    }
+    fetched = []
+    lock = threading.Lock()
+
+    def fetch_page(url, deadline=None, **kwargs):
+        with lock:
+            fetched.append(url)
+        time.sleep(site.delay)
+        html = pages.get(url)
+        return types.SimpleNamespace(status_code=200 if html else 404, text=html or "", url=url)
+
+    site = types.SimpleNamespace(pages=pages, fetched=fetched, delay=0)
+    monkeypatch.setattr(site_crawler, "fetch_page", fetch_page)
+    monkeypatch.setattr(site_crawler, "site_cache", DiskCache("site_test", 3600, 10 * 1024 * 1024, path=tmp_path / "s.sqlite3"))
+    monkeypatch.setattr(site_crawler, "contact_path_cache", DiskCache("paths_test", 3600, 1024 * 1024, path=tmp_path / "p.sqlite3"))
+    return site
+
+
+def test_one_crawl_feeds_scoring_and_contacts(site, monkeypatch):
+    snapshot = site_crawler.crawl_site("https://cantinarossi.it")
+    assert [(page["path"], page["kind"]) for page in snapshot["pages"]] == [
+        ("/", "home"), ("/contatti", "contact"), ("/chi-siamo", "about")]
+    assert len(site.fetched) == len(set(site.fetched)) == 3
+    assert "tre generazioni" in site_crawler.snapshot_text(snapshot)
+
+    monkeypatch.setattr(extract_emails, "crawl_site", lambda url: pytest.fail("site crawled twice"))
+    contacts = extract_emails.extract_contacts_from_url("https://cantinarossi.it", snapshot=snapshot)
+    assert contacts["emails"] == ["info@cantinarossi.it"]
+    assert contacts["phones"]
+
+
+def test_snapshot_is_served_from_cache(site):
+    first = site_crawler.crawl_site("https://cantinarossi.it")
+    fetched = len(site.fetched)
+    assert site_crawler.crawl_site("https://www.cantinarossi.it/") == first
+    assert len(site.fetched) == fetched
+
+
+def test_unreachable_site_is_not_cached(site):
+    snapshot = site_crawler.crawl_site("https://offline.it")
+    assert snapshot["pages"] == []
+    assert site_crawler.site_cache.get(site_crawler.normalize_url("https://offline.it")) is None
+
+
+def test_fetch_pages_caps_requests_in_flight(monkeypatch):
+    monkeypatch.setattr(site_crawler, "SITE_FETCH_CONCURRENCY", 2)
+    in_flight, peak = [0], [0]
+    lock = threading.Lock()
+
+    def fetch_page(url, deadline=None):
+        with lock:
+            in_flight[0] += 1
+            peak[0] = max(peak[0], in_flight[0])
+        time.sleep(0.05)
+        with lock:
+            in_flight[0] -= 1
+        return url
+
+    monkeypatch.setattr(site_crawler, "fetch_page", fetch_page)
+    urls = [f"https://cantinarossi.it/p{i}" for i in range(6)]
+    started = time.monotonic()
+    results = site_crawler.fetch_pages(urls, time.monotonic() + 5)
+    assert results == {url: url for url in urls}
+    assert peak[0] == 2
+    assert time.monotonic() - started < 0.25  # Three waves of 0.05 s, not six
+
+
+def test_fetch_pages_gives_up_on_slow_pages_at_the_deadline(monkeypatch):
+    release = threading.Event()
+
+    def fetch_page(url, deadline=None):
+        if url.endswith("/lenta"):
+            release.wait(10)
+        return url
+
+    monkeypatch.setattr(site_crawler, "fetch_page", fetch_page)
+    try:
+        started = time.monotonic()
+        results = site_crawler.fetch_pages(["https://a.it/veloce", "https://a.it/lenta"], time.monotonic() + 0.2)
+        elapsed = time.monotonic() - started
+    finally:
+        release.set()
+    assert results == {"https://a.it/veloce": "https://a.it/veloce", "https://a.it/lenta": None}
+    assert elapsed < 2  # Deadline plus the in-flight grace period, not the slow page
+
+
+def test_crawl_fetches_pages_of_a_wave_in_parallel(site):
+    site.delay = 0.3
+    started = time.monotonic()
+    snapshot = site_crawler.crawl_site("https://cantinarossi.it")
+    # Homepage, then contact + about together: two round trips, not three
+    assert len(snapshot["pages"]) == 3
+    assert time.monotonic() - started < 0.85
+
+
+def test_crawl_deadline_bounds_a_hanging_page(site, monkeypatch):
+    monkeypatch.setattr(site_crawler, "SITE_CRAWL_DEADLINE", 0.3)
+    release = threading.Event()
+    serve = site_crawler.fetch_page
+
+    def fetch_page(url, deadline=None, **kwargs):
+        if url.endswith("/contatti"):
+            release.wait(10)
+        return serve(url, deadline=deadline)
+
+    monkeypatch.setattr(site_crawler, "fetch_page", fetch_page)
+    try:
+        started = time.monotonic()
+        snapshot = site_crawler.crawl_site("https://cantinarossi.it")
+        elapsed = time.monotonic() - started
+    finally:
+        release.set()
+    assert [page["path"] for page in snapshot["pages"]] == ["/", "/chi-siamo"]
+    assert elapsed < 2
+
+
+def test_fetch_page_timeout_never_outlives_the_deadline(monkeypatch):
+    monkeypatch.setattr(site_crawler.scheduler, "acquire", lambda url, deadline=None: True)
+    monkeypatch.setattr(site_crawler.scheduler, "observe", lambda url, response: None)
+    timeouts = []
+
+    def get(url, headers=None, timeout=None):
+        timeouts.append(timeout)
+        return types.SimpleNamespace(status_code=200)
+
+    monkeypatch.setattr(site_crawler.http_client, "get", get)
+    assert site_crawler.fetch_page("https://a.it", deadline=time.monotonic() - 1) is None
+    assert timeouts == []
+    assert site_crawler.fetch_page("https://a.it", deadline=time.monotonic() + 0.5).status_code == 200
+    assert 0 < timeouts[0] <= 0.5
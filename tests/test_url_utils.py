@@ -0,0 +1,39 @@
+import re
+from pathlib import Path
+
+import pytest
+
+from url_utils import normalize_domain, normalize_url
+
+DOMAIN_CASES = [
+    ("http://x.it", "x.it"),
+    ("https://www.X.it/", "x.it"),
+    ("x.it/?utm_source=maps", "x.it"),
+    ("  HTTPS://WWW.Cantina-Rossi.IT:443/contatti#form ", "cantina-rossi.it"),
+    ("https://shop.x.it/prodotti", "shop.x.it"),
+    ("www.x.it", "x.it"),
+    ("", None),
+    (None, None),
+]
+
+
+@pytest.mark.parametrize("url, domain", DOMAIN_CASES)
+def test_normalize_domain(url, domain):
+    assert normalize_domain(url) == domain
+
+
+@pytest.mark.parametrize("url, domain", DOMAIN_CASES)
+def test_generated_column_matches_normalize_domain(url, domain):
+    """The leads.website_domain expression in the SQL patch, applied with the same regexes."""
+    sql = (Path(__file__).parents[1] / "architecture" / "patch_leads_website_domain.sql").read_text()
+    scheme, rest = re.findall(r"'(\^[^']+)', '', '(?:i|gi)'", sql)
+    value = (url or "").strip()
+    value = re.sub(scheme, "", value, count=1, flags=re.IGNORECASE)
+    value = re.sub(rest, "", value, flags=re.IGNORECASE).lower()
+    assert (value or None) == domain
+
+
+def test_normalize_url_drops_tracking_and_cosmetics():
+    assert normalize_url("https://WWW.Example.it/chi-siamo/?utm_source=x#top") == "https://example.it/chi-siamo"
+    assert normalize_url("http://example.it/?b=2&a=1&fbclid=z") == "https://example.it?a=1&b=2"
+    assert normalize_url("example.it:8080/") == "https://example.it:8080"
@@ -1,7 +1,7 @@
 import os
 import io
 import base64
-import requests as http_requests
+import http_client
 from pathlib import Path
 from dotenv import load_dotenv
 from openai import OpenAI
@@ -22,7 +22,7 @@ def pdf_to_base64_images(pdf_url, max_pages=5):
     try:
         from pdf2image import convert_from_bytes
 
-        response = http_requests.get(pdf_url, timeout=30)
+        response = http_client.get(pdf_url, timeout=30)
         response.raise_for_status()
 
         images = convert_from_bytes(
@@ -1,10 +1,17 @@
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Header
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from fastapi.middleware.cors import CORSMiddleware
 import sys
 import os
 import uuid
 import time
+import json
+import asyncio
+import functools
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -13,11 +20,30 @@ load_dotenv(os.path.join(os.path.dirname(os.path.abspath(__file__)), '.env'))
 # Add current directory to path so we can import tools
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from search_leads import search_leads, search_jobs, search_jobs_lock
+from search_leads import search_leads, search_jobs, search_jobs_lock, job_events, get_events, get_job_snapshot
 from analyze_product import analyze_product_file, synthesize_product_description
 from generate_email import generate_email_for_lead
+from disk_cache import cache_stats
+from evaluate_lead import get_scoring_stats
+from site_crawler import get_crawl_stats
+import job_queue
 
-app = FastAPI()
+# Blocking LLM/DB work (email generation, synthesis) runs on its own bounded pool,
+# so it never blocks the event loop nor starves the threadpool serving /search-status.
+API_HEAVY_WORKERS = int(os.environ.get("API_HEAVY_WORKERS", "4"))
+heavy_executor = ThreadPoolExecutor(max_workers=API_HEAVY_WORKERS, thread_name_prefix="api-heavy")
+
+@asynccontextmanager
+async def lifespan(app):
+    yield
+    heavy_executor.shutdown(wait=False, cancel_futures=True)
+
+app = FastAPI(lifespan=lifespan)
+
+async def run_heavy(func, *args, **kwargs):
+    """Awaits a blocking call on the heavy executor."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(heavy_executor, functools.partial(func, *args, **kwargs))
 
 # Configure CORS to allow requests from React (http://localhost:5173)
 origins = [
@@ -77,19 +103,40 @@ def run_search(request: SearchRequest, background_tasks: BackgroundTasks):
                     }
 
         job_id = str(uuid.uuid4())
+
+        if job_queue.SEARCH_QUEUE_ENABLED:
+            # Durable queue: a worker process (worker.py) picks the job up.
+            # The database keeps at most one queued/running job per product.
+            jid = job_queue.enqueue_search(
+                job_id,
+                request.product_id,
+                request.location,
+                request.limit,
+                request.min_score,
+                request.include_province
+            )
+            if jid != job_id:
+                print(f"⚠️ API: Search already queued for product {request.product_id} (job {jid})")
+                return {
+                    "status": "already_running",
+                    "job_id": jid,
+                    "message": "Una ricerca per questo prodotto è già in corso"
+                }
+
         print(f"🚀 API: Starting search job {job_id} for product {request.product_id}")
         print(f"   📍 Location: {request.location}, Limit: {request.limit}, Min Score: {request.min_score}")
 
-        # Run search in background with job tracking
-        background_tasks.add_task(
-            search_leads,
-            request.product_id,
-            request.location,
-            request.limit,
-            request.min_score,
-            job_id,
-            request.include_province
-        )
+        if not job_queue.SEARCH_QUEUE_ENABLED:
+            # Run search in background with job tracking
+            background_tasks.add_task(
+                search_leads,
+                request.product_id,
+                request.location,
+                request.limit,
+                request.min_score,
+                job_id,
+                request.include_province
+            )
 
         return {
             "status": "started",
@@ -102,10 +149,16 @@ def run_search(request: SearchRequest, background_tasks: BackgroundTasks):
 
 
 JOB_MAX_AGE_SECONDS = 1800  # 30 minutes
+JOB_CLEANUP_INTERVAL_SECONDS = 60
+_last_cleanup = 0
 
 def _cleanup_old_jobs():
-    """Remove completed/error jobs older than 30 minutes from memory."""
+    """Remove completed/error jobs older than 30 minutes from memory (at most once a minute)."""
+    global _last_cleanup
     now = time.time()
+    if now - _last_cleanup < JOB_CLEANUP_INTERVAL_SECONDS:
+        return
+    _last_cleanup = now
     to_delete = []
     with search_jobs_lock:
         for jid, job in search_jobs.items():
@@ -115,6 +168,7 @@ def _cleanup_old_jobs():
                     to_delete.append(jid)
         for jid in to_delete:
             del search_jobs[jid]
+            job_events.pop(jid, None)
     if to_delete:
         print(f"🧹 Cleaned up {len(to_delete)} old jobs")
 
@@ -126,17 +180,110 @@ def get_search_status(job_id: str):
     with search_jobs_lock:
         job = search_jobs.get(job_id)
 
+    if not job and job_queue.SEARCH_QUEUE_ENABLED:
+        job = job_queue.load_job(job_id)
+
     if not job:
         raise HTTPException(status_code=404, detail="Job non trovato")
 
     return job
 
+SSE_POLL_SECONDS = 0.25
+SSE_KEEPALIVE_SECONDS = 15
+SSE_QUEUE_POLL_SECONDS = 2
+
+# Last event of a stream whose job no longer exists (evicted, or the server restarted)
+JOB_GONE_STATUS = {"status": "error", "progress": "Ricerca non più disponibile sul server"}
+
+def _sse(event_type, data, event_id=None):
+    message = f"event: {event_type}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+    return f"id: {event_id}\n{message}" if event_id is not None else message
+
+async def _stream_job_events(job_id, last_event_id):
+    """
+    Pushes the job's incremental events (lead_accepted, lead_discarded,
+    lead_below_threshold, progress, stats, status) as they are recorded.
+    Without Last-Event-ID the stream opens with a full "snapshot" event.
+    A job evicted mid-stream ends it with a terminal "status" event.
+    """
+    cursor = last_event_id
+    if cursor is None:
+        job, cursor = get_job_snapshot(job_id)
+        if job is None:
+            yield _sse("status", JOB_GONE_STATUS)
+            return
+        yield _sse("snapshot", job, cursor)
+        if job.get("status") in ("completed", "error"):
+            return
+
+    idle = 0.0
+    last_type = None
+    while True:
+        events, finished = get_events(job_id, cursor)
+        for event in events:
+            cursor = event["id"]
+            last_type = event["type"]
+            yield _sse(event["type"], event["data"], cursor)
+        if finished:
+            if last_type != "status" and get_job_snapshot(job_id)[0] is None:
+                yield _sse("status", JOB_GONE_STATUS)
+            return
+        if events:
+            idle = 0.0
+        elif idle >= SSE_KEEPALIVE_SECONDS:
+            idle = 0.0
+            yield ": keep-alive\n\n"
+        await asyncio.sleep(SSE_POLL_SECONDS)
+        idle += SSE_POLL_SECONDS
+
+async def _stream_queued_job(job_id):
+    """Jobs running in a worker process: re-sends the stored job whenever it changes."""
+    last = None
+    while True:
+        # Light DB read: default threadpool, never queued behind email/product generation
+        job = await run_in_threadpool(job_queue.load_job, job_id)
+        if job is None:
+            yield _sse("status", JOB_GONE_STATUS)
+            return
+        state = (job.get("progress"), job.get("status"), len(job.get("accepted", [])), len(job.get("discarded", [])))
+        if state != last:
+            last = state
+            yield _sse("snapshot", job)
+        if job.get("status") in ("completed", "error"):
+            return
+        await asyncio.sleep(SSE_QUEUE_POLL_SECONDS)
+
+@app.get("/search-events/{job_id}")
+async def stream_search_events(job_id: str, last_event_id: str = Header(default=None)):
+    """Server-Sent Events stream of a search job's progress (replaces polling /search-status)."""
+    job, _ = get_job_snapshot(job_id)
+    if job:
+        cursor = int(last_event_id) if last_event_id and last_event_id.isdigit() else None
+        stream = _stream_job_events(job_id, cursor)
+    elif job_queue.SEARCH_QUEUE_ENABLED and await run_in_threadpool(job_queue.load_job, job_id):
+        stream = _stream_queued_job(job_id)
+    else:
+        raise HTTPException(status_code=404, detail="Job non trovato")
+
+    return StreamingResponse(
+        stream,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.post("/stop-search/{job_id}")
 def stop_search(job_id: str):
     """Request graceful stop of a running search job."""
     with search_jobs_lock:
         job = search_jobs.get(job_id)
 
+    if not job and job_queue.SEARCH_QUEUE_ENABLED:
+        # Job runs in a worker process: flag it in the queue, the worker relays it
+        if job_queue.request_stop(job_id):
+            print(f"🛑 API: Stop requested for queued job {job_id}")
+            return {"status": "stop_requested", "message": "Arresto ricerca in corso..."}
+        job = job_queue.load_job(job_id)
+
     if not job:
         raise HTTPException(status_code=404, detail="Job non trovato")
 
@@ -150,6 +297,24 @@ def stop_search(job_id: str):
     return {"status": "stop_requested", "message": "Arresto ricerca in corso..."}
 
 
+@app.get("/cache-stats")
+def get_cache_stats():
+    """Hit/miss counters and disk usage of the local content caches."""
+    return cache_stats()
+
+
+@app.get("/scoring-stats")
+def get_scoring_stats_endpoint():
+    """How lead scores were obtained since startup (llm, cache, prescore...) and LLM calls avoided."""
+    return get_scoring_stats()
+
+
+@app.get("/crawl-stats")
+def get_crawl_stats_endpoint():
+    """Pages fetched per site since startup, and how often the contact crawl stopped early."""
+    return get_crawl_stats()
+
+
 @app.post("/analyze-file")
 def run_analyze_file(request: AnalyzeFileRequest, background_tasks: BackgroundTasks):
     try:
@@ -169,7 +334,7 @@ def run_analyze_file(request: AnalyzeFileRequest, background_tasks: BackgroundTa
 async def run_synthesize(request: SynthesizeRequest):
     try:
         print(f"🧠 API Trigger: Synthesizing description for {request.product_id}")
-        result = synthesize_product_description(request.product_id)
+        result = await run_heavy(synthesize_product_description, request.product_id)
         if result:
             return {"status": "completed", "ai_description": result}
         else:
@@ -182,7 +347,7 @@ async def run_synthesize(request: SynthesizeRequest):
 async def run_generate_email(request: GenerateEmailRequest):
     try:
         print(f"📧 API Trigger: Generating email for lead {request.lead_id}")
-        result = generate_email_for_lead(request.lead_id)
+        result = await run_heavy(generate_email_for_lead, request.lead_id)
         if result and "error" not in result:
             return {"status": "completed", "email": result}
         elif result and "error" in result:
@@ -212,7 +377,7 @@ def _get_admin_client():
     return create_client(url, service_key)
 
 @app.post("/create-user")
-async def create_user(request: CreateUserRequest):
+def create_user(request: CreateUserRequest):
     try:
         admin = _get_admin_client()
         response = admin.auth.admin.create_user({
@@ -229,7 +394,7 @@ async def create_user(request: CreateUserRequest):
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.get("/list-users")
-async def list_users():
+def list_users():
     try:
         admin = _get_admin_client()
         response = admin.auth.admin.list_users()
@@ -242,7 +407,7 @@ async def list_users():
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.delete("/delete-user")
-async def delete_user(request: DeleteUserRequest):
+def delete_user(request: DeleteUserRequest):
     try:
         admin = _get_admin_client()
         admin.auth.admin.delete_user(request.user_id)
@@ -0,0 +1,60 @@
+import os
+import re
+import sys
+import time
+import argparse
+from pathlib import Path
+
+# Add current directory to path so we can import tools
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from contact_extractor import extract_contacts
+from bench_html_text import DEFAULT_CORPUS
+
+# Micro-benchmark of contact extraction over saved pages (same corpus as bench_html_text.py).
+#   python bench_contacts.py [corpus_dir] [--repeat 5]
+
+# The previous extractor: uncompiled findall over the whole raw HTML
+LEGACY_EMAIL = r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}'
+LEGACY_PHONE = r'(?:\+39[\s.-]?)?(?:0[0-9]{1,3}|3[0-9]{2})[\s.-]?[0-9]{3,4}[\s.-]?[0-9]{3,4}'
+LEGACY_JUNK = ('.png', '.jpg', '.jpeg', '.gif', '.js', '.css', '.svg', '.webp')
+
+
+def legacy_extract(html):
+    emails = [e for e in re.findall(LEGACY_EMAIL, html) if not e.endswith(LEGACY_JUNK)]
+    phones = [p.strip() for p in re.findall(LEGACY_PHONE, html) if len(re.sub(r'[\s.+-]', '', p)) >= 9]
+    return list(dict.fromkeys(emails)), list(dict.fromkeys(phones))
+
+
+def _measure(fn, docs, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        results = [fn(doc) for doc in docs]
+    return time.perf_counter() - start, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark contact extraction")
+    parser.add_argument("corpus", nargs="?", default=str(DEFAULT_CORPUS))
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    docs = [p.read_text(encoding="utf-8", errors="replace") for p in sorted(Path(args.corpus).glob("*.html"))]
+    if not docs:
+        raise SystemExit(f"❌ No *.html in {args.corpus} (see bench_html_text.py --export-cache)")
+    mb = sum(len(d) for d in docs) / (1024 * 1024) * args.repeat
+    runs = [
+        ("legacy (raw HTML findall)", legacy_extract),
+        ("contact_extractor", extract_contacts),
+    ]
+    print(f"🏁 {len(docs)} pages, {mb / args.repeat:.1f} MB × {args.repeat} runs\n")
+    print(f"{'variant':<28} {'MB/s':>8} {'pages/s':>9} {'emails':>7} {'phones':>7}")
+    for name, fn in runs:
+        elapsed, results = _measure(fn, docs, args.repeat)
+        emails = sum(len(r[0]) for r in results)
+        phones = sum(len(r[1]) for r in results)
+        print(f"{name:<28} {mb / elapsed:>8.1f} {len(docs) * args.repeat / elapsed:>9.1f} {emails:>7} {phones:>7}")
+
+
+if __name__ == "__main__":
+    main()
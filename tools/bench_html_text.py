@@ -0,0 +1,127 @@
+import os
+import sys
+import json
+import time
+import zlib
+import sqlite3
+import resource
+import argparse
+import subprocess
+from pathlib import Path
+
+# Add current directory to path so we can import tools
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from disk_cache import CACHE_DIR
+
+# Benchmark of the html_text backends over a corpus of saved homepages (*.html).
+#   python bench_html_text.py --export-cache 500   # dump pages already in the site cache
+#   python bench_html_text.py [corpus_dir] [--repeat 3]
+# Each backend runs in its own process so peak memory is not shared between them.
+DEFAULT_CORPUS = CACHE_DIR / "html_corpus"
+
+
+def export_from_site_cache(corpus, limit):
+    """Writes the HTML of cached site snapshots to corpus/*.html (real Italian SME sites)."""
+    db_path = CACHE_DIR / "site_snapshots.sqlite3"
+    if not db_path.exists():
+        raise SystemExit(f"❌ No site cache at {db_path}: run some searches first")
+    corpus.mkdir(parents=True, exist_ok=True)
+    written = 0
+    for key, value in sqlite3.connect(db_path).execute("SELECT key, value FROM entries"):
+        snapshot = json.loads(zlib.decompress(value))
+        for page in snapshot.get("pages", []):
+            if written >= limit:
+                break
+            name = f"{key.split('://', 1)[-1]}{page['path']}".strip("/").replace("/", "_") or "index"
+            (corpus / f"{name}.html").write_text(page["html"], encoding="utf-8")
+            written += 1
+    print(f"📦 Exported {written} pages to {corpus}")
+
+
+def _peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024  # bytes on macOS, KB on Linux
+
+
+def run_backend(backend, corpus, repeat):
+    """Measures one backend (called in a child process); prints a JSON result line."""
+    import html_text
+
+    docs = [p.read_text(encoding="utf-8", errors="replace") for p in sorted(corpus.glob("*.html"))]
+    total_mb = sum(len(d) for d in docs) / (1024 * 1024)
+    baseline = _peak_rss_mb()
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        texts = [html_text.html_to_text(d, backend=backend) for d in docs]
+    elapsed = time.perf_counter() - start
+    peak = _peak_rss_mb()
+
+    # Agreement with the reference parser: share of output lines both produce
+    agreement = None
+    if backend != "html.parser":
+        scores = []
+        for doc, text in zip(docs, texts):
+            ref = set(html_text.html_to_text(doc, backend="html.parser").splitlines())
+            got = set(text.splitlines())
+            if ref or got:
+                scores.append(len(ref & got) / len(ref | got))
+        agreement = round(sum(scores) / len(scores), 3) if scores else None
+
+    print(json.dumps({
+        "backend": backend,
+        "pages": len(docs) * repeat,
+        "seconds": round(elapsed, 3),
+        "pages_per_sec": round(len(docs) * repeat / elapsed, 1) if elapsed else None,
+        "mb_per_sec": round(total_mb * repeat / elapsed, 2) if elapsed else None,
+        "peak_rss_mb": round(peak, 1),
+        "parse_rss_mb": round(peak - baseline, 1),
+        "line_agreement": agreement,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark html_text backends")
+    parser.add_argument("corpus", nargs="?", default=str(DEFAULT_CORPUS))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--backends", help="comma separated (default: all installed)")
+    parser.add_argument("--export-cache", type=int, metavar="N", help="export N cached pages to the corpus and exit")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    corpus = Path(args.corpus)
+
+    if args.export_cache:
+        export_from_site_cache(corpus, args.export_cache)
+        return
+    if args.worker:
+        run_backend(args.worker, corpus, args.repeat)
+        return
+
+    import html_text
+    n_docs = len(list(corpus.glob("*.html")))
+    if not n_docs:
+        raise SystemExit(f"❌ No *.html in {corpus} (try --export-cache 500)")
+    backends = args.backends.split(",") if args.backends else list(html_text.BACKENDS)
+    print(f"🏁 {n_docs} pages × {args.repeat} runs, backends: {', '.join(backends)}\n")
+
+    results = []
+    for backend in backends:
+        out = subprocess.run(
+            [sys.executable, __file__, str(corpus), "--repeat", str(args.repeat), "--worker", backend],
+            capture_output=True, text=True
+        )
+        if out.returncode != 0:
+            print(f"❌ {backend}: {out.stderr.strip().splitlines()[-1] if out.stderr.strip() else 'failed'}")
+            continue
+        results.append(json.loads(out.stdout.strip().splitlines()[-1]))
+
+    print(f"{'backend':<12} {'pages/s':>9} {'MB/s':>7} {'peak RSS':>9} {'parse RSS':>10} {'agreement':>10}")
+    for r in results:
+        agreement = "ref" if r["line_agreement"] is None else f"{r['line_agreement']:.3f}"
+        print(f"{r['backend']:<12} {r['pages_per_sec']:>9} {r['mb_per_sec']:>7} "
+              f"{r['peak_rss_mb']:>7} MB {r['parse_rss_mb']:>7} MB {agreement:>10}")
+
+
+if __name__ == "__main__":
+    main()
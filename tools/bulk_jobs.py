@@ -0,0 +1,300 @@
+import os
+import sys
+import json
+import time
+import argparse
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+
+# Add current directory to path so we can import tools
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from disk_cache import CACHE_DIR
+from evaluate_lead import supabase, client as openai_client, SCORING_MODEL, scoring_prompt, parse_evaluation, scrape_text_content
+from generate_email import client as anthropic_client, EMAIL_MODEL, EMAIL_MAX_TOKENS, build_email_request, parse_email_response
+
+# Nightly bulk jobs through the provider batch APIs (half price, separate rate limits, results within 24h):
+#   rescore -> OpenAI Batch API (GPT-4o lead scoring)   -> leads.match_score / match_reason
+#   emails  -> Anthropic Message Batches (Claude email) -> leads.generated_email
+# Every submitted batch has a manifest in CACHE_DIR/batches, so `collect` can run later from any process.
+# Point OPENAI_BASE_URL / ANTHROPIC_BASE_URL at fake_batch_api.py to try it offline.
+BATCH_DIR = CACHE_DIR / "batches"
+BULK_MAX_REQUESTS_PER_BATCH = int(os.environ.get("BULK_MAX_REQUESTS_PER_BATCH", "10000"))
+BULK_PREP_WORKERS = int(os.environ.get("BULK_PREP_WORKERS", "8"))
+BULK_POLL_SECONDS = int(os.environ.get("BULK_POLL_SECONDS", "60"))
+BULK_WRITE_CHUNK = 500
+LEADS_PAGE_SIZE = 1000
+
+PROVIDERS = {"rescore": "openai", "emails": "anthropic"}
+
+
+def fetch_leads(kind, product_id=None, limit=None, only_missing=False):
+    """Leads to process, paged through PostgREST's 1000-row responses."""
+    leads = []
+    while limit is None or len(leads) < limit:
+        query = supabase.table("leads").select("*, products(*)").not_.is_("website", "null")
+        if kind == "rescore":
+            query = query.not_.is_("interested_product_id", "null")
+        if only_missing:
+            query = query.is_("generated_email" if kind == "emails" else "match_reason", "null")
+        if product_id:
+            query = query.eq("interested_product_id", product_id)
+        page = query.order("id").range(len(leads), len(leads) + LEADS_PAGE_SIZE - 1).execute().data or []
+        leads.extend(page)
+        if len(page) < LEADS_PAGE_SIZE:
+            break
+    return leads[:limit] if limit else leads
+
+
+def _rescore_request(lead):
+    product = lead.get("products")
+    if not product:
+        return None
+    content = scrape_text_content(lead["website"], product=product)
+    if not content or len(content) < 50:
+        print(f"   ⚠️ Not enough content for {lead['company_name']} — skipped")
+        return None
+    ctx = {
+        "company_name": lead["company_name"],
+        "website": lead["website"],
+        "location": lead.get("location") or "",
+        "website_content": content,
+    }
+    return {
+        "custom_id": lead["id"],
+        "method": "POST",
+        "url": "/v1/chat/completions",
+        "body": {
+            "model": SCORING_MODEL,
+            "messages": [{"role": "user", "content": scoring_prompt(ctx, product)}],
+            "response_format": {"type": "json_object"},
+        },
+    }
+
+
+def _email_request(lead):
+    system, prompt = build_email_request(lead)
+    if system is None:
+        return None
+    return {
+        "custom_id": lead["id"],
+        "params": {
+            "model": EMAIL_MODEL,
+            "max_tokens": EMAIL_MAX_TOKENS,
+            "system": system,
+            "messages": [{"role": "user", "content": prompt}],
+        },
+    }
+
+
+def build_requests(kind, leads):
+    """One batch request line per lead; sites are crawled in parallel (and served from the site cache)."""
+    build = _rescore_request if kind == "rescore" else _email_request
+    with ThreadPoolExecutor(max_workers=BULK_PREP_WORKERS) as pool:
+        requests = list(pool.map(build, leads))
+    return [r for r in requests if r]
+
+
+def _manifest_path(batch_id):
+    return BATCH_DIR / f"{batch_id}.json"
+
+
+def save_manifest(manifest):
+    BATCH_DIR.mkdir(parents=True, exist_ok=True)
+    _manifest_path(manifest["batch_id"]).write_text(json.dumps(manifest, indent=2, ensure_ascii=False))
+
+
+def load_manifest(batch_id):
+    path = _manifest_path(batch_id)
+    if not path.exists():
+        raise SystemExit(f"❌ Unknown batch {batch_id} (no manifest in {BATCH_DIR})")
+    return json.loads(path.read_text())
+
+
+def submit(kind, requests, leads):
+    """Writes the JSONL request file(s) and submits them. Returns the manifests."""
+    provider = PROVIDERS[kind]
+    names = {lead["id"]: lead["company_name"] for lead in leads}
+    BATCH_DIR.mkdir(parents=True, exist_ok=True)
+    manifests = []
+
+    for start in range(0, len(requests), BULK_MAX_REQUESTS_PER_BATCH):
+        chunk = requests[start:start + BULK_MAX_REQUESTS_PER_BATCH]
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+        input_file = BATCH_DIR / f"{kind}-{stamp}-{start // BULK_MAX_REQUESTS_PER_BATCH}.jsonl"
+        with open(input_file, "w", encoding="utf-8") as f:
+            for line in chunk:
+                f.write(json.dumps(line, ensure_ascii=False) + "\n")
+
+        if provider == "openai":
+            with open(input_file, "rb") as f:
+                uploaded = openai_client.files.create(file=f, purpose="batch")
+            batch = openai_client.batches.create(
+                input_file_id=uploaded.id,
+                endpoint="/v1/chat/completions",
+                completion_window="24h",
+                metadata={"job": f"blast-{kind}"},
+            )
+        else:
+            batch = anthropic_client.messages.batches.create(requests=chunk)
+
+        manifest = {
+            "batch_id": batch.id,
+            "kind": kind,
+            "provider": provider,
+            "input_file": str(input_file),
+            # company_name travels with the id: the bulk upsert must satisfy NOT NULL columns
+            "leads": {r["custom_id"]: names.get(r["custom_id"]) for r in chunk},
+            "submitted_at": time.time(),
+            "collected": False,
+        }
+        save_manifest(manifest)
+        manifests.append(manifest)
+        print(f"📤 Submitted {provider} batch {batch.id}: {len(chunk)} {kind} requests ({input_file.name})")
+    return manifests
+
+
+def batch_status(manifest):
+    """Returns 'running', 'ended' or 'failed'."""
+    if manifest["provider"] == "openai":
+        status = openai_client.batches.retrieve(manifest["batch_id"]).status
+        if status == "completed":
+            return "ended"
+        if status in ("failed", "expired", "cancelled"):
+            return "failed"
+        return "running"
+    status = anthropic_client.messages.batches.retrieve(manifest["batch_id"]).processing_status
+    return "ended" if status == "ended" else "running"
+
+
+def iter_results(manifest):
+    """Yields (lead_id, raw model text or None, error) for every request of an ended batch."""
+    if manifest["provider"] == "openai":
+        batch = openai_client.batches.retrieve(manifest["batch_id"])
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if not file_id:
+                continue
+            for line in openai_client.files.content(file_id).text.splitlines():
+                if not line.strip():
+                    continue
+                item = json.loads(line)
+                response = item.get("response") or {}
+                if response.get("status_code") == 200:
+                    yield item["custom_id"], response["body"]["choices"][0]["message"]["content"], None
+                else:
+                    yield item["custom_id"], None, item.get("error") or response.get("body")
+    else:
+        for item in anthropic_client.messages.batches.results(manifest["batch_id"]):
+            if item.result.type == "succeeded":
+                yield item.custom_id, item.result.message.content[0].text, None
+            else:
+                yield item.custom_id, None, item.result.type
+
+
+def _row_for(kind, lead_id, company_name, content):
+    if kind == "rescore":
+        evaluation = parse_evaluation(content)
+        return {"id": lead_id, "company_name": company_name,
+                "match_score": evaluation["score"], "match_reason": evaluation["reason"]}
+    email_data = parse_email_response(content)
+    return {"id": lead_id, "company_name": company_name,
+            "generated_email": json.dumps(email_data, ensure_ascii=False)}
+
+
+def write_back(manifest):
+    """Parses the batch output and bulk-writes it to leads. Returns (written, failed)."""
+    kind = manifest["kind"]
+    rows, failed = [], 0
+    for lead_id, content, error in iter_results(manifest):
+        if content is None:
+            print(f"   ⚠️ {lead_id}: request failed ({error})")
+            failed += 1
+            continue
+        try:
+            rows.append(_row_for(kind, lead_id, manifest["leads"].get(lead_id), content))
+        except Exception as e:
+            print(f"   ⚠️ {lead_id}: unparsable answer ({e})")
+            failed += 1
+
+    written = 0
+    for start in range(0, len(rows), BULK_WRITE_CHUNK):
+        chunk = rows[start:start + BULK_WRITE_CHUNK]
+        # Leads deleted while the batch ran must not be resurrected by the upsert
+        existing = supabase.table("leads").select("id").in_("id", [r["id"] for r in chunk]).execute()
+        alive = {r["id"] for r in existing.data or []}
+        chunk = [r for r in chunk if r["id"] in alive]
+        if chunk:
+            supabase.table("leads").upsert(chunk, on_conflict="id").execute()
+            written += len(chunk)
+
+    manifest["collected"] = True
+    manifest["collected_at"] = time.time()
+    manifest["written"] = written
+    manifest["failed"] = failed
+    save_manifest(manifest)
+    print(f"📥 Batch {manifest['batch_id']}: {written} leads updated, {failed} failed")
+    return written, failed
+
+
+def collect(batch_id, wait=False):
+    """Writes back a batch once it has ended. With wait=True, polls until it does."""
+    manifest = load_manifest(batch_id)
+    if manifest.get("collected"):
+        print(f"✅ Batch {batch_id} already collected ({manifest.get('written')} leads)")
+        return manifest
+    while True:
+        status = batch_status(manifest)
+        if status == "ended":
+            write_back(manifest)
+            return manifest
+        if status == "failed":
+            print(f"❌ Batch {batch_id} failed or expired")
+            return manifest
+        if not wait:
+            print(f"⏳ Batch {batch_id} still running")
+            return manifest
+        time.sleep(BULK_POLL_SECONDS)
+
+
+def run(kind, product_id=None, limit=None, only_missing=False, wait=False):
+    leads = fetch_leads(kind, product_id, limit, only_missing)
+    print(f"🗂️  {len(leads)} leads selected for {kind}")
+    requests = build_requests(kind, leads)
+    if not requests:
+        print("Nothing to submit.")
+        return []
+    manifests = submit(kind, requests, leads)
+    if wait:
+        for manifest in manifests:
+            collect(manifest["batch_id"], wait=True)
+    return manifests
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk lead re-scoring / email generation via provider batch APIs")
+    sub = parser.add_subparsers(dest="command", required=True)
+    for kind in PROVIDERS:
+        p = sub.add_parser(kind)
+        p.add_argument("--product", help="only leads of this product id")
+        p.add_argument("--limit", type=int)
+        p.add_argument("--only-missing", action="store_true", help="skip leads that already have a score/email")
+        p.add_argument("--wait", action="store_true", help="poll until done and write results back")
+    p = sub.add_parser("collect")
+    p.add_argument("batch_id")
+    p.add_argument("--wait", action="store_true")
+    sub.add_parser("list")
+    args = parser.parse_args()
+
+    if args.command in PROVIDERS:
+        run(args.command, args.product, args.limit, args.only_missing, args.wait)
+    elif args.command == "collect":
+        collect(args.batch_id, args.wait)
+    else:
+        for path in sorted(BATCH_DIR.glob("*.json")):
+            m = json.loads(path.read_text())
+            state = f"collected ({m.get('written')} written)" if m.get("collected") else "pending"
+            print(f"{m['batch_id']}  {m['kind']:8} {len(m['leads']):6} requests  {state}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+import math
+import heapq
+import itertools
+from prescore import tokenize, product_terms
+from url_utils import normalize_domain
+
+# Candidates of all keywords and pages, merged and evaluated best first.
+# Priority uses only what SerpAPI already returned (no fetch, no LLM):
+#   overlap  product terms in the place's title/category
+#   hits     how many keywords returned the same place
+#   rating   Google rating, shrunk towards a neutral prior when reviews are few
+#   reviews  review count (log scale): an active, real business
+PRIORITY_WEIGHTS = {"overlap": 0.4, "hits": 0.25, "rating": 0.2, "reviews": 0.15}
+RATING_PRIOR = 3.5
+RATING_PRIOR_REVIEWS = 10
+
+
+def candidate_keys(item):
+    """Identities of a SerpAPI place: Google place id and canonical website domain."""
+    keys = []
+    if item.get("place_id"):
+        keys.append("place:" + item["place_id"])
+    domain = normalize_domain(item.get("website"))
+    if domain:
+        keys.append("domain:" + domain)
+    return keys
+
+
+class CandidateFrontier:
+    """
+    Max-priority queue of SerpAPI places, deduplicated by place_id and domain.
+    A place seen again under another keyword is not queued twice: its hit count
+    (and priority) goes up instead. Not thread-safe: owned by the search loop.
+    """
+
+    def __init__(self, product, n_keywords=1):
+        self.terms = product_terms(product)
+        self.n_keywords = max(1, n_keywords)
+        self.entries = {}   # key -> entry, for queued and already popped candidates
+        self.heap = []      # (-priority, seq, entry); outdated tuples are skipped on pop
+        self.seq = itertools.count()
+        self.queued = 0
+        self.merged = 0
+
+    def __len__(self):
+        return self.queued
+
+    def priority(self, entry):
+        item = entry["item"]
+        text = " ".join([item.get("title") or "", item.get("type") or ""] + list(item.get("types") or []))
+        found = set(tokenize(text))
+        overlap = min(1.0, sum(w for t, w in self.terms.items() if t in found) / 3.0)
+
+        hits = min(1.0, (len(entry["keywords"]) - 1) / max(1, min(self.n_keywords - 1, 2)))
+
+        reviews = float(item.get("reviews") or 0)
+        rating = float(item.get("rating") or 0) if reviews else RATING_PRIOR
+        shrunk = (rating * reviews + RATING_PRIOR * RATING_PRIOR_REVIEWS) / (reviews + RATING_PRIOR_REVIEWS)
+        signals = {
+            "overlap": overlap,
+            "hits": hits,
+            "rating": max(0.0, (shrunk - 1) / 4),
+            "reviews": min(1.0, math.log10(1 + reviews) / 3),  # 1000 reviews = max
+        }
+        return round(sum(PRIORITY_WEIGHTS[k] * v for k, v in signals.items()), 4)
+
+    def seen(self, item):
+        return any(key in self.entries for key in candidate_keys(item))
+
+    def add(self, item, keyword):
+        """
+        Queues a place, or merges it into the entry already known under one of its keys.
+        Returns True if the place was new.
+        """
+        keys = candidate_keys(item)
+        entry = next((self.entries[k] for k in keys if k in self.entries), None)
+        if entry is not None:
+            self.merged += 1
+            if keyword not in entry["keywords"]:
+                entry["keywords"].append(keyword)
+            for key in keys:
+                self.entries.setdefault(key, entry)
+            if not entry["popped"]:
+                self._push(entry)  # Re-prioritized; the older heap tuple becomes stale
+            return False
+
+        entry = {"item": item, "keyword": keyword, "keywords": [keyword], "popped": False}
+        for key in keys:
+            self.entries[key] = entry
+        self.queued += 1
+        self._push(entry)
+        return True
+
+    def _push(self, entry):
+        entry["priority"] = self.priority(entry)
+        heapq.heappush(self.heap, (-entry["priority"], next(self.seq), entry))
+
+    def pop(self):
+        """Best queued candidate as (item, keyword), or None when empty."""
+        while self.heap:
+            neg_priority, _, entry = heapq.heappop(self.heap)
+            if entry["popped"] or -neg_priority != entry["priority"]:
+                continue
+            entry["popped"] = True
+            self.queued -= 1
+            return entry["item"], entry["keyword"]
+        return None
+
+    def pending(self):
+        """Queued candidates as [(item, keyword, keywords)] for a checkpoint."""
+        unique = {id(e): e for e in self.entries.values() if not e["popped"]}
+        return [(e["item"], e["keyword"], e["keywords"]) for e in unique.values()]
+
+    def stats(self):
+        return {"queued": self.queued, "merged_duplicates": self.merged}
@@ -0,0 +1,53 @@
+import threading
+
+# Stages a SerpAPI candidate goes through, cheapest first. A candidate dropped by a
+# stage never reaches the later ones, so every drop before "scrape" saves a crawl
+# and every drop before "score" saves a scoring (and possibly a GPT-4o call).
+#   website    the place has a website
+#   duplicate  not visited yet in this job, nor already queued (other keyword/page)
+#   location   address inside the requested location (italian_locations.py)
+#   blacklist  website is not a social network / directory (SEARCH_DOMAIN_BLACKLIST)
+#   known      not already a lead in the DB (one query per SerpAPI page)
+#   scrape     site reachable and not blocking the crawler
+#   score      score >= min_score
+CHEAP_STAGES = ("website", "duplicate", "location", "blacklist", "known")
+STAGES = CHEAP_STAGES + ("scrape", "score")
+
+
+class StagePipeline:
+    """
+    Runs the cheap stages over a SerpAPI page and counts, per stage, how many
+    candidates were checked and how many were dropped. The worker stages
+    (scrape, score) are counted with record(). Thread-safe.
+    """
+
+    def __init__(self, filters, counts=None):
+        # filters: {stage: fn(items, keyword) -> kept items} for every CHEAP_STAGES entry
+        self.filters = filters
+        self.counts = {stage: {"checked": 0, "dropped": 0} for stage in STAGES}
+        for stage, count in (counts or {}).items():
+            if stage in self.counts:
+                self.counts[stage].update(count)
+        self._lock = threading.Lock()
+
+    def record(self, stage, checked=1, dropped=0):
+        with self._lock:
+            self.counts[stage]["checked"] += checked
+            self.counts[stage]["dropped"] += dropped
+
+    def screen(self, items, keyword):
+        """Candidates of one page that pass every cheap stage, in order."""
+        for stage in CHEAP_STAGES:
+            if not items:
+                break
+            kept = self.filters[stage](items, keyword)
+            self.record(stage, len(items), len(items) - len(kept))
+            items = kept
+        return items
+
+    def stats(self):
+        """Per-stage counters in pipeline order, plus the paid work the cheap stages saved."""
+        with self._lock:
+            stats = {stage: dict(count) for stage, count in self.counts.items()}
+        stats["crawls_avoided"] = sum(stats[stage]["dropped"] for stage in CHEAP_STAGES)
+        return stats
@@ -0,0 +1,160 @@
+import re
+from html import unescape
+from urllib.parse import unquote
+
+# Contact extraction from a crawled page in one pass per source, with precompiled patterns:
+#   - visible text (header and footer included): plain and obfuscated emails, phones
+#   - href / data attributes of the raw HTML: mailto:, tel:, Cloudflare-protected emails
+# Emails come back ranked (best first), phones normalized to E.164.
+
+# Every scan starts from something literal (an "@", a digit, an attribute name): patterns that
+# start with a character class are tried at every position of the page and are several times slower.
+# Plain emails: anchor on "@" + domain, then walk back to the local part
+_LOCAL = r"[A-Za-z0-9._%+-]{1,64}"
+_DOMAIN = r"[A-Za-z0-9-]+(?:\.[A-Za-z0-9-]+)*\.[A-Za-z]{2,24}"
+EMAIL_DOMAIN_RE = re.compile(rf"@({_DOMAIN})\b")
+LOCAL_TAIL_RE = re.compile(rf"(?<![A-Za-z0-9._%+-])({_LOCAL})\s*$")
+# Whole address, for the ones that do not come from the text scan (mailto:, Cloudflare decode)
+EMAIL_RE = re.compile(rf"{_LOCAL}@{_DOMAIN}")
+
+# Obfuscated: info [at] azienda [dot] it, info(at)azienda.it, info chiocciola azienda punto it ...
+OBFUSCATION_HINTS = ("at]", "at)", "at}", " at ", "chiocciola")
+AT_TOKEN_RE = re.compile(r"[\[\(\{]\s*(?:at|chiocciola)\s*[\]\)\}]|\s(?:chiocciola|at)\s", re.IGNORECASE)
+_DOT = r"\s*(?:\.|\[\s*(?:dot|punto)\s*\]|\(\s*(?:dot|punto)\s*\)|\s(?:dot|punto)\s)\s*"
+DOT_RE = re.compile(_DOT, re.IGNORECASE)
+OBFUSCATED_DOMAIN_RE = re.compile(rf"\s*([A-Za-z0-9-]+(?:{_DOT}[A-Za-z0-9-]+)*{_DOT}[A-Za-z]{{2,24}})\b", re.IGNORECASE)
+
+# Italian numbers: +39/0039, then landline (0X...) or mobile (3XX...)
+PHONE_RE = re.compile(r"(?=[+03])(?<![\w/.-])(?:(?:\+|00)39[\s./-]?)?(?:0\d{1,3}|3\d{2})(?:[\s./-]?\d{2,4}){1,3}(?![\w/-])")
+
+# Raw HTML: mailto:/tel: targets and Cloudflare-protected emails, anchored on the ":", "=" or "#"
+ATTR_RE = re.compile(
+    r"""[:=#](?:(?<=mailto:)(?P<mailto>[^"'>\s?]+)|(?<=tel:)(?P<tel>[^"'>]+)|(?<=callto:)(?P<callto>[^"'>]+)"""
+    r"""|(?<=data-cfemail=)["'](?P<cf>[0-9a-fA-F]+)["']|(?<=email-protection#)(?P<cfurl>[0-9a-fA-F]+))""",
+    re.IGNORECASE
+)
+
+INVISIBLE_RE = re.compile(r"<(script|style|noscript|template)\b[^>]*>.*?</\1\s*>|<!--.*?-->", re.IGNORECASE | re.DOTALL)
+TAG_RE = re.compile(r"<[^>]+>")
+
+# Digits right after these are tax ids / registry numbers, not phones
+NOT_PHONE_CONTEXT = re.compile(r"\b(?:iva|p\.\s?i\.?|c\.\s?f\.?|cod(?:ice)?\.?\s*fisc\w*|rea|cap(?:itale)?)\W{0,6}$", re.IGNORECASE)
+
+JUNK_EMAIL_SUFFIXES = ('.png', '.jpg', '.jpeg', '.gif', '.js', '.css', '.svg', '.webp')
+JUNK_EMAIL_DOMAINS = ("sentry.io", "wixpress.com", "sentry-next.wixpress.com", "example.com", "example.it",
+                      "domain.com", "dominio.it", "email.com", "yourdomain.com", "mysite.com")
+NO_REPLY = re.compile(r"^(?:no-?reply|do-?not-?reply|mailer-daemon|postmaster|webmaster|wordpress)\b", re.IGNORECASE)
+
+# Ranking: where a B2B cold email is most likely to be read
+ROLE_LOCALS = ("info", "commerciale", "vendite", "sales", "ordini", "contatti", "contact", "hello", "ciao",
+               "segreteria", "ufficio", "amministrazione", "marketing", "acquisti", "booking", "prenotazioni", "direzione")
+FREE_MAIL_DOMAINS = ("gmail.com", "libero.it", "hotmail.com", "hotmail.it", "yahoo.com", "yahoo.it", "outlook.com",
+                     "outlook.it", "virgilio.it", "alice.it", "tiscali.it", "icloud.com", "live.it", "live.com", "tin.it", "fastwebnet.it")
+PEC_MARKERS = ("pec.", "legalmail.", "arubapec.", "postacert.", "cert.", "pecimprese.", "registerpec.", "sicurezzapostale.")
+
+
+def _valid_email(email):
+    email = email.strip(".-_").lower()
+    # Printable ASCII only: a wrong Cloudflare key or a broken mailto decodes to junk bytes
+    if not EMAIL_RE.fullmatch(email):
+        return None
+    local, _, domain = email.partition("@")
+    if not local or "." not in domain or domain.endswith(JUNK_EMAIL_SUFFIXES) or local.endswith(JUNK_EMAIL_SUFFIXES):
+        return None
+    if domain.endswith(JUNK_EMAIL_DOMAINS) or NO_REPLY.match(local):
+        return None
+    # Hashes used as local part by tracking/error-reporting snippets
+    if len(local) >= 24 and re.fullmatch(r"[0-9a-f]+", local):
+        return None
+    return email
+
+
+def decode_cfemail(hex_string):
+    """Cloudflare email obfuscation: first byte is the XOR key of the rest."""
+    try:
+        key = int(hex_string[:2], 16)
+        return "".join(chr(int(hex_string[i:i + 2], 16) ^ key) for i in range(2, len(hex_string), 2))
+    except ValueError:
+        return ""
+
+
+def normalize_phone(raw):
+    """Italian phone -> E.164 (+39...), or None if it cannot be a phone number."""
+    digits = re.sub(r"\D", "", raw)
+    if digits.startswith("0039"):
+        digits = digits[4:]
+    elif digits.startswith("39") and (raw.strip().startswith("+") or len(digits) > 11):
+        digits = digits[2:]
+    if digits.startswith("0") and 6 <= len(digits) <= 11:
+        return "+39" + digits  # Landline: the leading 0 is part of the number
+    if digits.startswith("3") and 9 <= len(digits) <= 10:
+        return "+39" + digits  # Mobile
+    return None
+
+
+def email_rank(email, site_domain=None):
+    """Lower is better: role address on the site's domain first, PEC (certified mail) last."""
+    local, _, domain = email.partition("@")
+    if any(domain.startswith(m) or f".{m}" in f".{domain}" for m in PEC_MARKERS) or local.startswith("pec"):
+        return 5
+    own = bool(site_domain) and (domain == site_domain or domain.endswith("." + site_domain) or site_domain.endswith("." + domain))
+    role = local.split(".")[0].split("-")[0] in ROLE_LOCALS
+    if own:
+        return 0 if role else 1
+    if domain in FREE_MAIL_DOMAINS:
+        return 2
+    return 3 if role else 4
+
+
+def rank_emails(emails, site_domain=None):
+    """Stable sort by email_rank: order of appearance breaks ties."""
+    site_domain = re.sub(r"^www\.", "", (site_domain or "").lower()) or None
+    return sorted(dict.fromkeys(emails), key=lambda e: email_rank(e, site_domain))
+
+
+def visible_text(html):
+    """
+    Cheap tag stripper for contact scanning. Unlike html_text.html_to_text it keeps
+    header/nav/footer, where most contacts live; only scripts, styles and comments go.
+    """
+    return unescape(TAG_RE.sub(" ", INVISIBLE_RE.sub(" ", html)))
+
+
+def extract_contacts(html, site_domain=None):
+    """
+    Contacts of one page: one scan of the raw HTML attributes, one of the visible text.
+    Returns (emails ranked best first, phones in E.164).
+    """
+    emails, phones = [], []
+
+    # Attributes: the only place mailto/tel targets and Cloudflare payloads live
+    for m in ATTR_RE.finditer(html):
+        if m.group("mailto"):
+            emails.append(unquote(unescape(m.group("mailto"))))
+        elif m.group("tel") or m.group("callto"):
+            phones.append(unquote(unescape(m.group("tel") or m.group("callto"))))
+        else:
+            emails.append(decode_cfemail(m.group("cf") or m.group("cfurl")))
+
+    # Visible text: plain and obfuscated addresses, written phone numbers
+    text = visible_text(html)
+    for m in EMAIL_DOMAIN_RE.finditer(text):
+        local = LOCAL_TAIL_RE.search(text, max(0, m.start() - 64), m.start())
+        if local:
+            emails.append(f"{local.group(1)}@{m.group(1)}")
+
+    lowered = text.lower()
+    if any(hint in lowered for hint in OBFUSCATION_HINTS):
+        for m in AT_TOKEN_RE.finditer(text):
+            local = LOCAL_TAIL_RE.search(text, max(0, m.start() - 64), m.start())
+            domain = OBFUSCATED_DOMAIN_RE.match(text, m.end())
+            if local and domain:
+                emails.append(f"{local.group(1)}@{DOT_RE.sub('.', domain.group(1))}")
+
+    for m in PHONE_RE.finditer(text):
+        if not NOT_PHONE_CONTEXT.search(text, max(0, m.start() - 24), m.start()):
+            phones.append(m.group())
+
+    valid_emails = [e for e in (_valid_email(e) for e in emails) if e]
+    valid_phones = [p for p in (normalize_phone(p) for p in phones) if p]
+    return rank_emails(valid_emails, site_domain), list(dict.fromkeys(valid_phones))
@@ -0,0 +1,116 @@
+import os
+import re
+from functools import lru_cache
+from prescore import tokenize, product_terms
+
+# Site text sent to the LLMs is distilled to this many tokens (scoring and email prompts)
+CONTENT_TOKEN_BUDGET = int(os.environ.get("CONTENT_TOKEN_BUDGET", "1000"))
+# Tokenizer of the scoring model (GPT-4o); Claude's is close enough for a budget
+TOKENIZER_ENCODING = "o200k_base"
+
+# Lines shorter than this are merged with their neighbours into one block
+BLOCK_MIN_CHARS = 200
+BLOCK_MAX_CHARS = 1200
+
+# Cookie banners, legal footers, shop/account chrome: never useful to judge a company
+BOILERPLATE_PATTERNS = re.compile(r"""
+    cookie | privacy | gdpr | consenso | \bconsent | accetta | rifiuta | preferenze |
+    p\.?\s?iva | partita\s+iva | c\.?f\.?\s*\d | codice\s+fiscale | cap\.?\s+soc | capitale\s+sociale | \brea\b |
+    tutti\s+i\s+diritti | all\s+rights\s+reserved | copyright | © |
+    newsletter | iscriviti | login | accedi | registrati | carrello | checkout | il\s+mio\s+account |
+    powered\s+by | realizzato\s+da | web\s+agency | credits
+""", re.IGNORECASE | re.VERBOSE)
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    try:
+        import tiktoken
+        return tiktoken.get_encoding(TOKENIZER_ENCODING)
+    except Exception as e:
+        # Not installed, or the BPE file cannot be downloaded (offline): approximate
+        print(f"   ⚠️ tiktoken unavailable ({type(e).__name__}) — estimating tokens as chars/4")
+        return None
+
+
+def count_tokens(text):
+    encoding = _encoding()
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def _norm_line(line):
+    return re.sub(r"\W+", " ", line.lower()).strip()
+
+
+def _is_boilerplate(line):
+    # Short lines dominated by legal/cookie words; long paragraphs that merely mention privacy stay
+    return len(line) < 300 and bool(BOILERPLATE_PATTERNS.search(line))
+
+
+def _blocks(lines):
+    """Merges consecutive short lines (menus are already gone) into paragraph-sized blocks."""
+    blocks, current = [], []
+    for line in lines:
+        current.append(line)
+        size = sum(len(l) for l in current)
+        if size >= BLOCK_MIN_CHARS or (line.endswith((".", "!", "?", ":")) and size >= BLOCK_MIN_CHARS // 2):
+            blocks.append(" ".join(current)[:BLOCK_MAX_CHARS])
+            current = []
+    if current:
+        blocks.append(" ".join(current)[:BLOCK_MAX_CHARS])
+    return blocks
+
+
+def _block_score(block, terms, page_rank, position):
+    """Keyword relevance, plus a prior for the top of the homepage and the about pages."""
+    tokens = tokenize(block)
+    if not tokens:
+        return 0.0
+    relevance = sum(terms.get(t, 0) for t in set(tokens)) / len(set(tokens)) ** 0.5 if terms else 0.0
+    prior = 1.0 / (1 + position) + (0.3 if page_rank > 0 else 0.0)
+    # Real sentences beat lists of product names / labels
+    prose = 0.2 if re.search(r"[a-z]{3,}[.,;] ", block) else 0.0
+    return relevance + prior + prose
+
+
+def distill(page_texts, product=None, max_tokens=CONTENT_TOKEN_BUDGET, separator="\n---\n"):
+    """
+    Turns the cleaned text of a site's pages (homepage first) into the most useful
+    excerpt that fits max_tokens:
+      1. lines repeated across pages (menus, footers, contact bars) are kept once
+      2. cookie / legal / shop boilerplate lines are dropped
+      3. lines are grouped into blocks, ranked by overlap with the product keywords
+         (plus a prior for the top of the homepage and the about pages)
+      4. the best blocks are packed into the budget and returned in reading order
+    """
+    terms = product_terms(product) if product else {}
+    seen = set()
+    candidates = []  # (score, page_rank, position, block, tokens)
+    for page_rank, text in enumerate(page_texts):
+        lines = []
+        for line in (text or "").splitlines():
+            line = line.strip()
+            key = _norm_line(line)
+            if not key or key in seen or _is_boilerplate(line):
+                continue
+            seen.add(key)
+            lines.append(line)
+        for position, block in enumerate(_blocks(lines)):
+            candidates.append((
+                _block_score(block, terms, page_rank, position),
+                page_rank, position, block, count_tokens(block),
+            ))
+
+    chosen, used = [], 0
+    for candidate in sorted(candidates, key=lambda c: -c[0]):
+        if used + candidate[4] > max_tokens:
+            continue
+        chosen.append(candidate)
+        used += candidate[4]
+
+    pages = {}
+    for _, page_rank, position, block, _ in sorted(chosen, key=lambda c: (c[1], c[2])):
+        pages.setdefault(page_rank, []).append(block)
+    return separator.join("\n".join(blocks) for blocks in pages.values())
@@ -0,0 +1,248 @@
+import os
+import time
+import threading
+from collections import Counter, OrderedDict
+from email.utils import parsedate_to_datetime
+from urllib.robotparser import RobotFileParser
+import requests
+import http_client
+from disk_cache import DiskCache
+from url_utils import normalize_domain
+
+# Politeness for website crawling: every page request first takes a token from its
+# domain's bucket and from the global one. 429/503 answers block the domain for
+# Retry-After, and robots.txt Crawl-delay slows the domain bucket down.
+CRAWL_PER_DOMAIN_RPS = float(os.environ.get("CRAWL_PER_DOMAIN_RPS", "2"))
+CRAWL_PER_DOMAIN_BURST = int(os.environ.get("CRAWL_PER_DOMAIN_BURST", "3"))
+CRAWL_GLOBAL_RPS = float(os.environ.get("CRAWL_GLOBAL_RPS", "20"))
+# Longest Retry-After / Crawl-delay honoured; longer ones make the domain unreachable for this crawl
+CRAWL_MAX_WAIT = float(os.environ.get("CRAWL_MAX_WAIT", "30"))
+# Block applied on 429/503 without a Retry-After header
+CRAWL_DEFAULT_BACKOFF = float(os.environ.get("CRAWL_DEFAULT_BACKOFF", "10"))
+CRAWL_OBEY_ROBOTS = os.environ.get("CRAWL_OBEY_ROBOTS", "true").lower() in ("1", "true", "yes")
+ROBOTS_TTL_HOURS = float(os.environ.get("ROBOTS_TTL_HOURS", "24"))
+# A robots.txt fetch that failed or was cut short by a deadline is retried after this long
+ROBOTS_RETRY_SECONDS = float(os.environ.get("ROBOTS_RETRY_SECONDS", "300"))
+# Domains whose bucket and robots rules are kept in memory (least recently crawled are dropped)
+CRAWL_MAX_DOMAINS = int(os.environ.get("CRAWL_MAX_DOMAINS", "5000"))
+
+THROTTLE_STATUSES = (429, 503)
+
+robots_cache = DiskCache("robots", ttl_seconds=ROBOTS_TTL_HOURS * 3600, max_bytes=20 * 1024 * 1024)
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, at most `burst` saved up."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """Takes a token (going into debt if needed). Returns the monotonic time it is usable at."""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            ready = now if self.tokens >= 0 else now - self.tokens / self.rate
+            return max(ready, self.blocked_until)
+
+    def refund(self):
+        with self._lock:
+            self.tokens = min(self.burst, self.tokens + 1)
+
+    def block(self, seconds):
+        with self._lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+
+class CrawlScheduler:
+    """Per-domain and global token buckets shared by every crawl thread of the process."""
+
+    def __init__(self):
+        self.global_bucket = TokenBucket(CRAWL_GLOBAL_RPS, max(1, int(CRAWL_GLOBAL_RPS)))
+        self.domains = OrderedDict()  # domain -> TokenBucket, least recently crawled first
+        self.robots = OrderedDict()  # domain -> (parser or None, monotonic expiry)
+        self._robots_loading = {}  # domain -> Event set once its robots.txt fetch ends
+        self.stats = Counter()
+        self._lock = threading.Lock()
+
+    def _count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def _fresh_robots(self, domain):
+        """(True, parser) while the domain's robots.txt entry is valid, else (False, None). Call with _lock held."""
+        entry = self.robots.get(domain)
+        if entry is None or entry[1] <= time.monotonic():
+            return False, None
+        self.robots.move_to_end(domain)
+        return True, entry[0]
+
+    def _robots(self, domain, scheme, deadline=None):
+        """
+        Parsed robots.txt of a domain (cached on disk and in memory), or None.
+        Concurrent first requests to a domain share one fetch, bounded by the deadline.
+        A failed or skipped fetch counts as "no rules" for ROBOTS_RETRY_SECONDS only.
+        """
+        with self._lock:
+            fresh, parser = self._fresh_robots(domain)
+            if fresh:
+                return parser
+            loading = self._robots_loading.get(domain)
+            if loading is None:
+                self._robots_loading[domain] = threading.Event()
+        if loading is not None:
+            loading.wait(_remaining(deadline, http_client.HTTP_TIMEOUT))
+            with self._lock:
+                entry = self.robots.get(domain)
+            return entry[0] if entry else None
+
+        parser = None
+        ttl = ROBOTS_RETRY_SECONDS
+        try:
+            text = robots_cache.get(domain)
+            if text is None:
+                text = self._fetch_robots(domain, scheme, deadline)
+            if text is not None:
+                ttl = max(ROBOTS_TTL_HOURS * 3600, ROBOTS_RETRY_SECONDS)
+            if text:
+                parser = RobotFileParser()
+                parser.parse(text.splitlines())
+        finally:
+            with self._lock:
+                self.robots[domain] = (parser, time.monotonic() + ttl)
+                self.robots.move_to_end(domain)
+                _trim(self.robots)
+                self._robots_loading.pop(domain).set()
+        return parser
+
+    def _fetch_robots(self, domain, scheme, deadline):
+        """robots.txt text ("" when missing), None when the fetch failed or was skipped (not cached on disk)."""
+        timeout = _remaining(deadline, http_client.HTTP_TIMEOUT)
+        if timeout <= 0:
+            self._count("robots_skipped")
+            return None
+        try:
+            response = http_client.get(f"{scheme}://{domain}/robots.txt", timeout=timeout)
+        except requests.RequestException:
+            self._count("robots_failed")
+            return None
+        text = ""
+        if response.status_code == 200 and "text/html" not in response.headers.get("Content-Type", ""):
+            text = response.text
+        robots_cache.set(domain, text)
+        return text
+
+    def _domain(self, domain, scheme, deadline=None):
+        """
+        (bucket, robots parser or None) of a domain. The bucket is rebuilt when the
+        robots.txt entry expires and its Crawl-delay changed.
+        """
+        with self._lock:
+            bucket = self.domains.get(domain)
+            if bucket is not None:
+                self.domains.move_to_end(domain)
+                fresh, robots = self._fresh_robots(domain) if CRAWL_OBEY_ROBOTS else (True, None)
+                if fresh:
+                    return bucket, robots
+        rate = CRAWL_PER_DOMAIN_RPS
+        robots = self._robots(domain, scheme, deadline) if CRAWL_OBEY_ROBOTS else None
+        delay = robots.crawl_delay(http_client.USER_AGENT) if robots else None
+        if delay:
+            rate = min(rate, 1.0 / min(float(delay), CRAWL_MAX_WAIT))
+        burst = 1 if delay else CRAWL_PER_DOMAIN_BURST
+        with self._lock:
+            bucket = self.domains.get(domain)
+            if bucket is None or (bucket.rate, bucket.burst) != (rate, burst):
+                blocked_until = bucket.blocked_until if bucket else 0.0
+                bucket = self.domains[domain] = TokenBucket(rate, burst)
+                bucket.blocked_until = blocked_until
+            self.domains.move_to_end(domain)
+            _trim(self.domains)
+        return bucket, robots
+
+    def acquire(self, url, deadline=None):
+        """
+        Waits for this URL's turn. Returns False if robots.txt disallows it or the wait
+        would end past the deadline (time.monotonic()) or beyond CRAWL_MAX_WAIT.
+        """
+        domain = normalize_domain(url)
+        if not domain:
+            return True
+        scheme = "http" if url.startswith("http://") else "https"
+        bucket, robots = self._domain(domain, scheme, deadline)
+        if robots and not robots.can_fetch(http_client.USER_AGENT, url):
+            self._count("robots_disallowed")  # Before reserve(): no token was taken
+            return False
+
+        ready = max(bucket.reserve(), self.global_bucket.reserve())
+        limit = time.monotonic() + CRAWL_MAX_WAIT
+        if deadline is not None:
+            limit = min(limit, deadline)
+        if ready > limit:
+            bucket.refund()
+            self.global_bucket.refund()
+            self._count("gave_up")
+            return False
+        wait = ready - time.monotonic()
+        if wait > 0:
+            self._count("waited")
+            time.sleep(wait)
+        self._count("requests")
+        return True
+
+    def observe(self, url, response):
+        """Applies Retry-After (or the default backoff) to the domain on 429/503 answers."""
+        if response is None or response.status_code not in THROTTLE_STATUSES:
+            return
+        self._count(f"http_{response.status_code}")
+        domain = normalize_domain(url)
+        with self._lock:
+            bucket = self.domains.get(domain)
+        if bucket is not None:
+            bucket.block(retry_after_seconds(response.headers.get("Retry-After")))
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats["domains"] = len(self.domains)
+            stats["robots_entries"] = len(self.robots)
+            stats["domains_with_crawl_delay"] = sum(1 for b in self.domains.values() if b.rate < CRAWL_PER_DOMAIN_RPS)
+        return stats
+
+
+def _trim(entries):
+    """Drops the least recently used entries of an OrderedDict past CRAWL_MAX_DOMAINS."""
+    while len(entries) > CRAWL_MAX_DOMAINS:
+        entries.popitem(last=False)
+
+
+def _remaining(deadline, cap):
+    """Seconds left before deadline (time.monotonic()), at most cap."""
+    if deadline is None:
+        return cap
+    return max(0.0, min(cap, deadline - time.monotonic()))
+
+
+def retry_after_seconds(value):
+    """Retry-After header (seconds or HTTP date) -> seconds, capped at CRAWL_MAX_WAIT + 1."""
+    seconds = CRAWL_DEFAULT_BACKOFF
+    if value:
+        try:
+            seconds = float(value)
+        except ValueError:
+            try:
+                seconds = parsedate_to_datetime(value).timestamp() - time.time()
+            except (TypeError, ValueError):
+                pass
+    # Anything past CRAWL_MAX_WAIT makes later acquire() calls give up right away
+    return max(0.0, min(seconds, CRAWL_MAX_WAIT + 1))
+
+
+scheduler = CrawlScheduler()
@@ -0,0 +1,150 @@
+import os
+import json
+import time
+import zlib
+import sqlite3
+import threading
+from pathlib import Path
+
+CACHE_DIR = Path(os.environ.get("CACHE_DIR", Path(__file__).parent / ".cache"))
+
+# All caches created in this process, for /cache-stats
+_caches = {}
+
+
+class DiskCache:
+    """
+    Persistent key/value cache backed by a local SQLite file.
+    Values are JSON, stored zlib-compressed. Entries expire after ttl_seconds,
+    and the least recently used ones are evicted when the file grows past max_bytes.
+    ttl_seconds=0 disables the cache (every get is a miss, set is a no-op).
+    """
+
+    def __init__(self, name, ttl_seconds, max_bytes, path=None):
+        self.name = name
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.path = Path(path) if path else CACHE_DIR / f"{name}.sqlite3"
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = None
+        _caches[name] = self
+
+    @property
+    def enabled(self):
+        return self.ttl_seconds > 0
+
+    def _db(self):
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS entries (
+                    key TEXT PRIMARY KEY,
+                    value BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS entries_accessed_at ON entries (accessed_at)")
+            self._conn = conn
+        return self._conn
+
+    def get(self, key, fresh=True):
+        """
+        Returns the cached value, or None on miss/expiry.
+        fresh=False replays whatever is stored: expired entries are returned (and
+        kept), even when ttl_seconds=0 disables the cache for normal reads.
+        """
+        if fresh and not self.enabled:
+            return None
+        if not fresh and self._conn is None and not self.path.exists():
+            self.misses += 1
+            return None
+        now = time.time()
+        try:
+            with self._lock:
+                db = self._db()
+                row = db.execute("SELECT value, created_at FROM entries WHERE key = ?", (key,)).fetchone()
+                if row is None or (fresh and now - row[1] > self.ttl_seconds):
+                    if row is not None:
+                        db.execute("DELETE FROM entries WHERE key = ?", (key,))
+                        db.commit()
+                    self.misses += 1
+                    return None
+                db.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key))
+                db.commit()
+                self.hits += 1
+            return json.loads(zlib.decompress(row[0]))
+        except Exception as e:
+            # A broken cache must never break the pipeline
+            print(f"   ⚠️ Cache '{self.name}' read error: {e}")
+            self.misses += 1
+            return None
+
+    def set(self, key, value):
+        """Stores a JSON-serializable value, evicting LRU entries past max_bytes."""
+        if not self.enabled:
+            return
+        blob = zlib.compress(json.dumps(value, ensure_ascii=False).encode("utf-8"))
+        now = time.time()
+        try:
+            with self._lock:
+                db = self._db()
+                db.execute(
+                    "INSERT OR REPLACE INTO entries (key, value, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                    (key, blob, len(blob), now, now)
+                )
+                self._evict(db)
+                db.commit()
+        except Exception as e:
+            print(f"   ⚠️ Cache '{self.name}' write error: {e}")
+
+    def delete(self, key):
+        if not self.enabled:
+            return
+        with self._lock:
+            db = self._db()
+            db.execute("DELETE FROM entries WHERE key = ?", (key,))
+            db.commit()
+
+    def _evict(self, db):
+        """Drops expired entries, then least recently used ones down to 90% of max_bytes."""
+        db.execute("DELETE FROM entries WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+        total = db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        target = int(self.max_bytes * 0.9)
+        evicted = 0
+        for key, size in db.execute("SELECT key, size FROM entries ORDER BY accessed_at").fetchall():
+            if total <= target:
+                break
+            db.execute("DELETE FROM entries WHERE key = ?", (key,))
+            total -= size
+            evicted += 1
+        print(f"   🧹 Cache '{self.name}': evicted {evicted} LRU entries")
+
+    def stats(self):
+        entries, size = 0, 0
+        if self.enabled:
+            with self._lock:
+                entries, size = self._db().execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0,
+            "entries": entries,
+            "bytes": size,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl_seconds,
+        }
+
+
+def cache_stats():
+    """Hit/miss counters and size of every cache in this process."""
+    return {name: cache.stats() for name, cache in _caches.items()}
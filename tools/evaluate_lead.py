@@ -1,12 +1,19 @@
 import os
-import requests
 import json
 import time
+import hashlib
+import itertools
+import threading
+from collections import Counter
 from pathlib import Path
 from dotenv import load_dotenv
 from supabase import create_client, Client
-from bs4 import BeautifulSoup
 from openai import OpenAI
+from site_crawler import crawl_site, snapshot_text
+from disk_cache import DiskCache
+from prescore import prescore
+from content_distill import count_tokens
+from lead_index import lead_index, embed, product_key, predict_score, LEAD_INDEX_ENABLED
 
 load_dotenv(Path(__file__).parent / '.env')
 
@@ -18,102 +25,95 @@ OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
 supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
 client = OpenAI(api_key=OPENAI_API_KEY)
 
-def scrape_text_content(url, max_chars=5000):
+SCORING_MODEL = "gpt-4o"
+# Bump whenever the scoring prompt changes: cached scores of the old prompt stop matching
+SCORING_PROMPT_VERSION = "1"
+# The multi-lead prompt of score_batch(): its scores are cached and indexed apart,
+# and lookups fall back to the other prompt's labels (see _versions_for)
+BATCH_SCORING_PROMPT_VERSION = "batch-1"
+PROMPT_VERSIONS = (SCORING_PROMPT_VERSION, BATCH_SCORING_PROMPT_VERSION)
+
+# LLM scores keyed by hash(product, company, site content, model, prompt version)
+SCORE_CACHE_TTL_DAYS = float(os.environ.get("SCORE_CACHE_TTL_DAYS", "30"))  # 0 = disabled
+score_cache = DiskCache(
+    "lead_scores",
+    ttl_seconds=SCORE_CACHE_TTL_DAYS * 86400,
+    max_bytes=int(float(os.environ.get("SCORE_CACHE_MAX_MB", "50")) * 1024 * 1024),
+)
+
+# Batch scoring (LeadBatchScorer): leads per GPT-4o request, prompt size cap, and how long
+# a partial batch waits for more leads. LLM_BATCH_SIZE=1 disables batching.
+LLM_BATCH_SIZE = int(os.environ.get("LLM_BATCH_SIZE", "4"))
+LLM_BATCH_TOKEN_BUDGET = int(os.environ.get("LLM_BATCH_TOKEN_BUDGET", "12000"))
+LLM_BATCH_MAX_WAIT = float(os.environ.get("LLM_BATCH_MAX_WAIT", "2"))
+LLM_BATCH_PROMPT_TOKENS = 1200  # Rubric + product description, sent once per batch
+
+def scrape_text_content(url, max_chars=5000, snapshot=None, product=None):
     """
-    Fetches URL and returns stripped text content.
-    Visits homepage + key pages for deeper context.
+    Returns stripped text content of homepage + key pages for deeper context,
+    distilled towards the product's keywords when given.
+    Reuses an existing site snapshot when given, otherwise crawls the site.
     """
-    if not url.startswith("http"):
-        url = "https://" + url
+    if snapshot is None:
+        snapshot = crawl_site(url)
+    return snapshot_text(snapshot, max_chars, product)
 
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
-    }
 
-    all_text = []
-    visited = set()
-    from urllib.parse import urljoin, urlparse
+# How evaluations were resolved in this process: llm / batch / cache / prescore / knn / unreachable / blocked / fallback,
+# plus llm_requests (OpenAI calls actually made)
+scoring_stats = Counter()
+scoring_stats_lock = threading.Lock()
 
-    base_domain = urlparse(url).netloc
-    pages = [url]
+# Sources that did not need a paid LLM call
+LLM_FREE_SOURCES = ("cache", "prescore", "knn")
 
-    # Add key pages for deeper context
-    for path in ["/chi-siamo", "/about", "/about-us", "/servizi", "/services", "/prodotti", "/products"]:
-        pages.append(urljoin(url, path))
 
-    for page_url in pages:
-        if page_url in visited or len(visited) >= 4:
-            break
-        visited.add(page_url)
+def _count(source):
+    with scoring_stats_lock:
+        scoring_stats[source] += 1
 
-        # Retry each page fetch (max 2 attempts, 1s backoff)
-        for attempt in range(2):
-            try:
-                resp = requests.get(page_url, headers=headers, timeout=5)
-                if resp.status_code != 200:
-                    break
-                if urlparse(resp.url).netloc != base_domain:
-                    break
-
-                soup = BeautifulSoup(resp.text, 'html.parser')
-                for tag in soup(["script", "style", "nav", "footer", "header"]):
-                    tag.decompose()
-
-                text = soup.get_text()
-                lines = (line.strip() for line in text.splitlines())
-                chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-                clean = '\n'.join(chunk for chunk in chunks if chunk)
-                all_text.append(clean)
-                break  # Success, no need to retry
-            except requests.RequestException:
-                if attempt < 1:
-                    time.sleep(1)
-                    continue
-            except Exception:
-                break  # Non-network error, don't retry
-
-    combined = '\n---\n'.join(all_text)
-    return combined[:max_chars]
-
-
-def evaluate_lead_prefilter(company_name, website, location, product):
-    """
-    PRE-FILTER: Evaluates a lead BEFORE inserting into DB.
-    Returns dict: { score: int, reason: str, accepted: bool }
-    Does NOT require a lead ID — works on raw data.
-    """
-    print(f"🧠 Pre-filtering: {company_name} vs {product['name']}...")
 
-    website_content = scrape_text_content(website)
+def get_scoring_stats():
+    with scoring_stats_lock:
+        stats = dict(scoring_stats)
+    stats["llm_calls_avoided"] = sum(stats.get(s, 0) for s in LLM_FREE_SOURCES)
+    stats["lead_index"] = lead_index.stats()
+    return stats
 
-    if not website_content or len(website_content) < 50:
-        print(f"   ⚠️ Not enough content for {company_name}.")
-        return {
-            "score": 0,
-            "reason": "Sito web non raggiungibile o contenuto insufficiente per l'analisi.",
-            "accepted": False
-        }
 
-    prompt = f"""
-    Sei un esperto Lead Scorer B2B. Il tuo compito è valutare con ESTREMA PRECISIONE
-    quanto un potenziale cliente è affine al nostro prodotto.
+def search_prompt_version(batch_size=None):
+    """Prompt lead searches score with: the batch one unless LLM_BATCH_SIZE <= 1."""
+    size = LLM_BATCH_SIZE if batch_size is None else batch_size
+    return BATCH_SCORING_PROMPT_VERSION if size > 1 else SCORING_PROMPT_VERSION
 
-    ══════ IL NOSTRO PRODOTTO ══════
-    Nome: {product['name']}
-    Descrizione: {product.get('description', 'N/A')}
-    Descrizione AI (da analisi visiva cataloghi/immagini): {product.get('ai_description', 'Non disponibile')}
-    Target Keywords: {product.get('target_keywords', 'N/A')}
 
-    ══════ IL POTENZIALE CLIENTE ══════
-    Azienda: {company_name}
-    Sito Web: {website}
-    Localizzazione: {location}
-    Contenuto del sito (estratto):
-    ---
-    {website_content}
-    ---
+def _versions_for(prompt_version):
+    """Label spaces consulted for a lead about to be scored with prompt_version, its own first."""
+    return (prompt_version,) + tuple(v for v in PROMPT_VERSIONS if v != prompt_version)
+
+
+def index_key(product, prompt_version=SCORING_PROMPT_VERSION):
+    """Lead index partition: same product content, model and prompt as the stored labels."""
+    return product_key(product, f"{SCORING_MODEL}:{prompt_version}")
 
-    ══════ CRITERI DI VALUTAZIONE ══════
+
+def score_cache_key(company_name, website, location, product, website_content, prompt_version=SCORING_PROMPT_VERSION):
+    """
+    Changes whenever anything the LLM sees changes: product name/description/
+    ai_description/keywords, the scraped site text, the model or the prompt version.
+    """
+    payload = json.dumps({
+        "product": [product.get(k) for k in ("name", "description", "ai_description", "target_keywords")],
+        "company": [company_name, website, location],
+        "content": website_content,
+        "model": SCORING_MODEL,
+        "prompt_version": prompt_version,
+    }, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+# Shared by the single and the batch scoring prompts
+SCORING_CRITERIA = """══════ CRITERI DI VALUTAZIONE ══════
     Valuta ciascun criterio e poi dai uno score finale composito:
 
     1. AFFINITÀ SETTORIALE (peso 40%):
@@ -130,7 +130,146 @@ def evaluate_lead_prefilter(company_name, website, location, product):
 
     4. QUALITÀ PRESENZA WEB (peso 15%):
        - Il sito è professionale e aggiornato?
-       - L'azienda è strutturata?
+       - L'azienda è strutturata?"""
+
+SCORING_RULES = """══════ REGOLE ══════
+    - Sii MOLTO SEVERO. Score 80+ solo per match eccellenti.
+    - Se l'azienda è completamente off-topic rispetto al prodotto → score 0-15
+    - Se c'è affinità vaga ma non diretta → score 20-40
+    - Se c'è buona affinità ma non perfetta → score 40-65
+    - Se c'è forte affinità settoriale e potenziale reale → score 65-85
+    - Score 85+ solo per match quasi perfetti"""
+
+
+def _product_block(product):
+    return f"""══════ IL NOSTRO PRODOTTO ══════
+    Nome: {product['name']}
+    Descrizione: {product.get('description', 'N/A')}
+    Descrizione AI (da analisi visiva cataloghi/immagini): {product.get('ai_description', 'Non disponibile')}
+    Target Keywords: {product.get('target_keywords', 'N/A')}"""
+
+
+def _prepare_prefilter(company_name, website, location, product, snapshot=None, prompt_version=SCORING_PROMPT_VERSION):
+    """
+    Every scoring stage that runs locally (scrape, cache, prescore, kNN).
+    Cache and kNN look up the labels of the prompt that is going to be used (prompt_version)
+    first, then those of the other prompt.
+    Returns (evaluation, None) when the lead is resolved without the LLM,
+    otherwise (None, context) with what the LLM scoring needs.
+    """
+    print(f"🧠 Pre-filtering: {company_name} vs {product['name']}...")
+
+    website_content = scrape_text_content(website, snapshot=snapshot, product=product)
+
+    blocked = (snapshot or {}).get("blocked")
+    if blocked:
+        # Refused or rate-limited: not evidence the lead is bad, worth retrying later
+        print(f"   ⛔ {company_name}: site answered HTTP {blocked}.")
+        _count("blocked")
+        return {
+            "score": 0,
+            "reason": f"Il sito ha rifiutato o limitato l'accesso (HTTP {blocked}): da rivalutare più tardi.",
+            "accepted": False,
+            "source": "blocked"
+        }, None
+
+    if not website_content or len(website_content) < 50:
+        print(f"   ⚠️ Not enough content for {company_name}.")
+        _count("unreachable")
+        return {
+            "score": 0,
+            "reason": "Sito web non raggiungibile o contenuto insufficiente per l'analisi.",
+            "accepted": False,
+            "source": "unreachable"
+        }, None
+
+    versions = _versions_for(prompt_version)
+    for version in versions:
+        cached = score_cache.get(score_cache_key(company_name, website, location, product, website_content, version))
+        if cached:
+            print(f"   💾 Cached score: {cached['score']}/100 - {cached['reason']}")
+            _count("cache")
+            return dict(cached, source="cache"), None
+
+    # Cheap local relevance check: obvious off-topic sites never reach the LLM
+    rejected = prescore(website_content, product)
+    if rejected:
+        print(f"   🚫 Pre-filter: {company_name} off-topic (relevance {rejected['relevance']}) — LLM skipped")
+        _count("prescore")
+        return dict(rejected, source="prescore"), None
+
+    # Sites very similar to ones already scored for this product get their neighbours' score
+    vector = embed(website_content)
+    for version in versions:
+        predicted = predict_score(index_key(product, version), vector, website)
+        if predicted:
+            print(f"   📇 Predicted score: {predicted['score']}/100 from {len(predicted['neighbours'])} similar leads — LLM skipped")
+            _count("knn")
+            return dict(predicted, source="knn"), None
+
+    return None, scoring_context(company_name, website, location, product, website_content, vector)
+
+
+def scoring_context(company_name, website, location, product, website_content, vector=None):
+    """
+    Everything the LLM scoring of one lead needs, and where to remember its result
+    for each prompt version (single or batch) it may end up scored with.
+    """
+    versions = (SCORING_PROMPT_VERSION, BATCH_SCORING_PROMPT_VERSION)
+    return {
+        "company_name": company_name,
+        "website": website,
+        "location": location,
+        "website_content": website_content,
+        "cache_keys": {v: score_cache_key(company_name, website, location, product, website_content, v) for v in versions},
+        "index_keys": {v: index_key(product, v) for v in versions},
+        "vector": embed(website_content) if vector is None else vector,
+    }
+
+
+def _evaluation_of(result):
+    """Normalizes one LLM JSON answer."""
+    return {
+        "score": result.get("score", 0),
+        "reason": result.get("reason", "Analisi completata."),
+        "sector_match": result.get("sector_match", 0),
+        "purchase_potential": result.get("purchase_potential", 0),
+        "complementarity": result.get("complementarity", 0),
+        "web_quality": result.get("web_quality", 0),
+        "accepted": True  # Caller decides based on threshold
+    }
+
+
+def parse_evaluation(content):
+    """Single-lead JSON answer of the scoring prompt -> evaluation dict."""
+    return _evaluation_of(json.loads(content))
+
+
+def _store(ctx, evaluation, prompt_version=SCORING_PROMPT_VERSION):
+    """Remembers an LLM evaluation: exact-content cache + nearest-neighbour index."""
+    score_cache.set(ctx["cache_keys"][prompt_version], evaluation)
+    if LEAD_INDEX_ENABLED:
+        lead_index.add(ctx["index_keys"][prompt_version], ctx["website"], ctx["vector"], evaluation)
+
+
+def scoring_prompt(ctx, product):
+    """Single-lead scoring prompt (also sent through the Batch API by bulk_jobs.py)."""
+    return f"""
+    Sei un esperto Lead Scorer B2B. Il tuo compito è valutare con ESTREMA PRECISIONE
+    quanto un potenziale cliente è affine al nostro prodotto.
+
+    {_product_block(product)}
+
+    ══════ IL POTENZIALE CLIENTE ══════
+    Azienda: {ctx['company_name']}
+    Sito Web: {ctx['website']}
+    Localizzazione: {ctx['location']}
+    Contenuto del sito (estratto):
+    ---
+    {ctx['website_content']}
+    ---
+
+    {SCORING_CRITERIA}
 
     ══════ OUTPUT JSON ══════
     {{
@@ -142,40 +281,32 @@ def evaluate_lead_prefilter(company_name, website, location, product):
         "reason": "<spiegazione in italiano, max 2 frasi, stile diretto>"
     }}
 
-    ══════ REGOLE ══════
-    - Sii MOLTO SEVERO. Score 80+ solo per match eccellenti.
-    - Se l'azienda è completamente off-topic rispetto al prodotto → score 0-15
-    - Se c'è affinità vaga ma non diretta → score 20-40
-    - Se c'è buona affinità ma non perfetta → score 40-65
-    - Se c'è forte affinità settoriale e potenziale reale → score 65-85
-    - Score 85+ solo per match quasi perfetti
+    {SCORING_RULES}
     """
 
+
+def _score_with_llm(ctx, product):
+    """Scores one prepared lead with its own GPT-4o request."""
+    prompt = scoring_prompt(ctx, product)
+
     # Retry OpenAI call (max 2 attempts, 2s backoff)
     last_error = None
     for attempt in range(2):
         try:
+            _count("llm_requests")
             response = client.chat.completions.create(
-                model="gpt-4o",
+                model=SCORING_MODEL,
                 messages=[{"role": "user", "content": prompt}],
                 response_format={"type": "json_object"}
             )
 
-            result = json.loads(response.choices[0].message.content)
-            score = result.get("score", 0)
-            reason = result.get("reason", "Analisi completata.")
-
-            print(f"   {'✅' if score >= 50 else '❌'} Score: {score}/100 - {reason}")
+            evaluation = parse_evaluation(response.choices[0].message.content)
+            score = evaluation["score"]
+            print(f"   {'✅' if score >= 50 else '❌'} Score: {score}/100 - {evaluation['reason']}")
 
-            return {
-                "score": score,
-                "reason": reason,
-                "sector_match": result.get("sector_match", 0),
-                "purchase_potential": result.get("purchase_potential", 0),
-                "complementarity": result.get("complementarity", 0),
-                "web_quality": result.get("web_quality", 0),
-                "accepted": True  # Caller decides based on threshold
-            }
+            _store(ctx, evaluation)
+            _count("llm")
+            return dict(evaluation, source="llm")
 
         except Exception as e:
             last_error = e
@@ -186,17 +317,211 @@ def evaluate_lead_prefilter(company_name, website, location, product):
 
     # Graceful degradation: return conservative score instead of 0
     print(f"   ⚠️ AI failed after retries: {last_error} — assigning conservative score")
+    return _fallback_evaluation(last_error)
+
+
+def _fallback_evaluation(error):
+    """Conservative score given when the LLM could not score a lead."""
+    _count("fallback")
     return {
         "score": 25,
-        "reason": f"Score conservativo: analisi AI non disponibile ({str(last_error)[:80]})",
+        "reason": f"Score conservativo: analisi AI non disponibile ({str(error)[:80]})",
         "sector_match": 0,
         "purchase_potential": 0,
         "complementarity": 0,
         "web_quality": 0,
-        "accepted": False
+        "accepted": False,
+        "source": "fallback"
     }
 
 
+def evaluate_lead_prefilter(company_name, website, location, product, snapshot=None):
+    """
+    PRE-FILTER: Evaluates a lead BEFORE inserting into DB.
+    Returns dict: { score: int, reason: str, accepted: bool, source: str }
+    Does NOT require a lead ID — works on raw data.
+    Pass the site snapshot from crawl_site() to avoid downloading the site again.
+    source tells how the score was obtained: llm, batch, cache, prescore, knn, unreachable, blocked or fallback.
+    """
+    evaluation, ctx = _prepare_prefilter(company_name, website, location, product, snapshot)
+    if evaluation:
+        return evaluation
+    return _score_with_llm(ctx, product)
+
+
+def _estimate_tokens(text):
+    return count_tokens(text)
+
+
+def score_batch(contexts, product):
+    """
+    Scores several prepared leads of the same product in ONE GPT-4o request:
+    the rubric and the product description are sent once, the answer is a JSON
+    array with one entry per company. Entries that are missing or malformed
+    (and the whole batch, if the request fails) fall back to single scoring.
+    Returns the evaluations in the order of contexts.
+    """
+    if len(contexts) == 1:
+        return [_score_with_llm(contexts[0], product)]
+
+    companies = "\n\n".join(f"""    [{i}] Azienda: {ctx['company_name']}
+    Sito Web: {ctx['website']}
+    Localizzazione: {ctx['location']}
+    Contenuto del sito (estratto):
+    ---
+    {ctx['website_content']}
+    ---""" for i, ctx in enumerate(contexts, 1))
+
+    prompt = f"""
+    Sei un esperto Lead Scorer B2B. Il tuo compito è valutare con ESTREMA PRECISIONE
+    quanto ciascuno dei {len(contexts)} potenziali clienti seguenti è affine al nostro prodotto.
+    Valuta ogni azienda in modo indipendente, senza confrontarla con le altre.
+
+    {_product_block(product)}
+
+    ══════ I POTENZIALI CLIENTI ══════
+{companies}
+
+    {SCORING_CRITERIA}
+
+    ══════ OUTPUT JSON ══════
+    {{
+        "results": [
+            {{
+                "id": <numero dell'azienda tra parentesi quadre>,
+                "score": <int 0-100>,
+                "sector_match": <int 0-100>,
+                "purchase_potential": <int 0-100>,
+                "complementarity": <int 0-100>,
+                "web_quality": <int 0-100>,
+                "reason": "<spiegazione in italiano, max 2 frasi, stile diretto>"
+            }}
+        ]
+    }}
+    Restituisci esattamente un elemento per ciascuna delle {len(contexts)} aziende.
+
+    {SCORING_RULES}
+    """
+
+    print(f"   📦 Batch scoring {len(contexts)} leads in one request (~{_estimate_tokens(prompt)} tokens)...")
+    by_id = {}
+    try:
+        _count("llm_requests")
+        response = client.chat.completions.create(
+            model=SCORING_MODEL,
+            messages=[{"role": "user", "content": prompt}],
+            response_format={"type": "json_object"}
+        )
+        results = json.loads(response.choices[0].message.content).get("results")
+        for result in results if isinstance(results, list) else []:
+            try:
+                idx = int(result["id"])
+                score = int(result["score"])
+            except (KeyError, TypeError, ValueError):
+                continue
+            if 1 <= idx <= len(contexts) and 0 <= score <= 100 and idx not in by_id:
+                by_id[idx] = dict(result, score=score)
+    except Exception as e:
+        print(f"   ⚠️ Batch scoring failed: {e} — scoring one by one")
+
+    evaluations = []
+    for i, ctx in enumerate(contexts, 1):
+        result = by_id.get(i)
+        if result is None:
+            evaluations.append(_score_with_llm(ctx, product))
+            continue
+        evaluation = _evaluation_of(result)
+        print(f"   {'✅' if evaluation['score'] >= 50 else '❌'} {ctx['company_name']}: {evaluation['score']}/100 - {evaluation['reason']}")
+        _store(ctx, evaluation, BATCH_SCORING_PROMPT_VERSION)
+        _count("batch")
+        evaluations.append(dict(evaluation, source="batch"))
+    return evaluations
+
+
+class LeadBatchScorer:
+    """
+    Collects the leads that need the LLM from the concurrent search workers of a
+    job and scores them together with score_batch(). A batch is sent as soon as it
+    holds batch_size leads or token_budget prompt tokens, or max_wait seconds after
+    its first lead arrived; the worker that completes a batch sends it and the
+    others wait for their result. batch_size <= 1 keeps one request per lead.
+    """
+
+    def __init__(self, product, batch_size=None, token_budget=None, max_wait=None):
+        self.product = product
+        self.batch_size = LLM_BATCH_SIZE if batch_size is None else batch_size
+        self.token_budget = LLM_BATCH_TOKEN_BUDGET if token_budget is None else token_budget
+        self.max_wait = LLM_BATCH_MAX_WAIT if max_wait is None else max_wait
+        self._cond = threading.Condition()
+        self._queue = []  # entries waiting for a batch: {"ctx", "tokens", "result"}
+        self._opened_at = None
+
+    def evaluate(self, company_name, website, location, snapshot=None):
+        """Same contract as evaluate_lead_prefilter; blocks until the lead's batch is scored."""
+        version = search_prompt_version(self.batch_size)
+        evaluation, ctx = _prepare_prefilter(company_name, website, location, self.product, snapshot, version)
+        if evaluation:
+            return evaluation
+        if self.batch_size <= 1:
+            return _score_with_llm(ctx, self.product)
+
+        entry = {"ctx": ctx, "tokens": _estimate_tokens(ctx["website_content"]) + 100, "result": None}
+        with self._cond:
+            if not self._queue:
+                self._opened_at = time.time()
+            self._queue.append(entry)
+            self._cond.notify_all()
+            while entry["result"] is None:
+                batch = self._take_batch()
+                if batch:
+                    self._score(batch)
+                elif self._queue:
+                    self._cond.wait(max(0.0, self._opened_at + self.max_wait - time.time()))
+                else:
+                    self._cond.wait(self.max_wait)  # Our batch is being scored by another worker
+        return entry["result"]
+
+    def _score(self, batch):
+        """
+        Scores a batch outside the lock. Caller holds _cond. Every entry gets a result,
+        a fallback one if scoring failed, so the workers waiting on it never hang.
+        """
+        results, error = [], None
+        self._cond.release()
+        try:
+            results = score_batch([e["ctx"] for e in batch], self.product)
+        except Exception as e:
+            error = e
+            print(f"   ⚠️ Batch scoring error: {e} — assigning conservative scores")
+        finally:
+            self._cond.acquire()
+            for e, result in itertools.zip_longest(batch, results[:len(batch)]):
+                e["result"] = result or _fallback_evaluation(error or "risultato mancante")
+            self._cond.notify_all()
+
+    def _take_batch(self):
+        """Pops the next batch if it is ready (full, over budget or timed out). Caller holds _cond."""
+        if not self._queue:
+            return None
+        total = sum(e["tokens"] for e in self._queue) + LLM_BATCH_PROMPT_TOKENS
+        ready = (
+            len(self._queue) >= self.batch_size
+            or total >= self.token_budget
+            or time.time() - self._opened_at >= self.max_wait
+        )
+        if not ready:
+            return None
+        batch, tokens = [], LLM_BATCH_PROMPT_TOKENS
+        for e in self._queue:
+            if batch and (len(batch) >= self.batch_size or tokens + e["tokens"] > self.token_budget):
+                break
+            batch.append(e)
+            tokens += e["tokens"]
+        del self._queue[:len(batch)]
+        self._opened_at = time.time() if self._queue else None
+        return batch
+
+
 def evaluate_lead(lead, product):
     """
     POST-INSERT evaluation: Analyzes matching between Lead Website Content and Product.
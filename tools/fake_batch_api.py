@@ -0,0 +1,176 @@
+import os
+import json
+import time
+import uuid
+import zlib
+import threading
+from email import message_from_bytes
+from email.policy import default as email_policy
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Local stand-in for the OpenAI Batch / Files API and the Anthropic Message Batches API,
+# for trying bulk_jobs.py without spending tokens:
+#   python fake_batch_api.py
+#   OPENAI_BASE_URL=http://localhost:8787/v1 ANTHROPIC_BASE_URL=http://localhost:8787 python bulk_jobs.py rescore --limit 20 --wait
+# Batches complete FAKE_BATCH_DELAY seconds after submission, with deterministic fake answers.
+FAKE_BATCH_PORT = int(os.environ.get("FAKE_BATCH_PORT", "8787"))
+FAKE_BATCH_DELAY = float(os.environ.get("FAKE_BATCH_DELAY", "2"))
+
+files = {}    # file id -> bytes
+batches = {}  # batch id -> object (OpenAI or Anthropic shape)
+lock = threading.Lock()
+
+
+def _fake_score(custom_id):
+    return zlib.crc32(custom_id.encode()) % 101
+
+
+def _openai_answer(line):
+    score = _fake_score(line["custom_id"])
+    content = json.dumps({
+        "score": score, "sector_match": score, "purchase_potential": score,
+        "complementarity": score, "web_quality": score,
+        "reason": "Valutazione di prova (fake batch API).",
+    })
+    return {
+        "id": f"batch_req_{uuid.uuid4().hex[:12]}",
+        "custom_id": line["custom_id"],
+        "response": {
+            "status_code": 200,
+            "request_id": uuid.uuid4().hex,
+            "body": {
+                "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": line["body"]["model"],
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": content}}],
+            },
+        },
+        "error": None,
+    }
+
+
+def _anthropic_answer(request):
+    text = json.dumps({
+        "subject": "Proposta di collaborazione",
+        "body": "Email di prova generata dalla fake batch API.",
+        "hook": f"Lead {request['custom_id']}",
+    }, ensure_ascii=False)
+    return {
+        "custom_id": request["custom_id"],
+        "result": {
+            "type": "succeeded",
+            "message": {
+                "id": f"msg_{uuid.uuid4().hex[:12]}",
+                "type": "message",
+                "role": "assistant",
+                "model": request["params"]["model"],
+                "content": [{"type": "text", "text": text}],
+                "stop_reason": "end_turn",
+                "stop_sequence": None,
+                "usage": {"input_tokens": 0, "output_tokens": 0},
+            },
+        },
+    }
+
+
+def _iso(ts):
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(ts))
+
+
+class Handler(BaseHTTPRequestHandler):
+    def _send(self, status, payload, content_type="application/json"):
+        body = payload if isinstance(payload, bytes) else json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _body(self):
+        return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+    def _refresh(self, batch):
+        """Completes a batch once its delay has elapsed."""
+        if time.time() - batch["_submitted"] < FAKE_BATCH_DELAY:
+            return
+        if batch["_provider"] == "openai" and batch["status"] != "completed":
+            lines = [json.loads(l) for l in files[batch["input_file_id"]].decode().splitlines() if l.strip()]
+            out_id = f"file-{uuid.uuid4().hex[:12]}"
+            files[out_id] = "".join(json.dumps(_openai_answer(l)) + "\n" for l in lines).encode()
+            batch.update(status="completed", output_file_id=out_id, completed_at=int(time.time()),
+                         request_counts={"total": len(lines), "completed": len(lines), "failed": 0})
+        elif batch["_provider"] == "anthropic" and batch["processing_status"] != "ended":
+            n = len(batch["_requests"])
+            batch.update(processing_status="ended", ended_at=_iso(time.time()),
+                         results_url=f"http://localhost:{FAKE_BATCH_PORT}/v1/messages/batches/{batch['id']}/results",
+                         request_counts={"processing": 0, "succeeded": n, "errored": 0, "canceled": 0, "expired": 0})
+
+    @staticmethod
+    def _public(batch):
+        return {k: v for k, v in batch.items() if not k.startswith("_")}
+
+    def do_POST(self):
+        path = self.path.split("?")[0]
+        with lock:
+            if path == "/v1/files":
+                msg = message_from_bytes(
+                    f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode() + self._body(),
+                    policy=email_policy,
+                )
+                part = next(p for p in msg.iter_parts() if p.get_param("name", header="content-disposition") == "file")
+                file_id = f"file-{uuid.uuid4().hex[:12]}"
+                files[file_id] = part.get_payload(decode=True)
+                return self._send(200, {"id": file_id, "object": "file", "bytes": len(files[file_id]),
+                                        "created_at": int(time.time()), "filename": part.get_filename() or "input.jsonl",
+                                        "purpose": "batch", "status": "processed"})
+            if path == "/v1/batches":
+                req = json.loads(self._body())
+                batch_id = f"batch_{uuid.uuid4().hex[:12]}"
+                batches[batch_id] = {
+                    "id": batch_id, "object": "batch", "endpoint": req["endpoint"],
+                    "input_file_id": req["input_file_id"], "completion_window": req["completion_window"],
+                    "status": "in_progress", "created_at": int(time.time()), "output_file_id": None,
+                    "error_file_id": None, "metadata": req.get("metadata"),
+                    "_provider": "openai", "_submitted": time.time(),
+                }
+                return self._send(200, self._public(batches[batch_id]))
+            if path == "/v1/messages/batches":
+                req = json.loads(self._body())
+                batch_id = f"msgbatch_{uuid.uuid4().hex[:12]}"
+                now = time.time()
+                batches[batch_id] = {
+                    "id": batch_id, "type": "message_batch", "processing_status": "in_progress",
+                    "request_counts": {"processing": len(req["requests"]), "succeeded": 0, "errored": 0, "canceled": 0, "expired": 0},
+                    "created_at": _iso(now), "expires_at": _iso(now + 86400), "ended_at": None,
+                    "archived_at": None, "cancel_initiated_at": None, "results_url": None,
+                    "_provider": "anthropic", "_submitted": now, "_requests": req["requests"],
+                }
+                return self._send(200, self._public(batches[batch_id]))
+        self._send(404, {"error": {"message": f"Unknown endpoint {path}"}})
+
+    def do_GET(self):
+        parts = self.path.split("?")[0].strip("/").split("/")
+        with lock:
+            # /v1/files/{id}/content
+            if parts[:2] == ["v1", "files"] and len(parts) == 4 and parts[3] == "content" and parts[2] in files:
+                return self._send(200, files[parts[2]], "application/jsonl")
+            # /v1/batches/{id}  and  /v1/messages/batches/{id}[/results]
+            batch_id = parts[2] if parts[:2] == ["v1", "batches"] else (parts[3] if parts[:3] == ["v1", "messages", "batches"] and len(parts) > 3 else None)
+            batch = batches.get(batch_id)
+            if batch:
+                self._refresh(batch)
+                if parts[-1] == "results":
+                    body = "".join(json.dumps(_anthropic_answer(r)) + "\n" for r in batch["_requests"])
+                    return self._send(200, body.encode(), "application/binary")
+                return self._send(200, self._public(batch))
+        self._send(404, {"error": {"message": f"Not found: {self.path}"}})
+
+    def log_message(self, fmt, *args):
+        print(f"   🧪 fake batch API: {fmt % args}")
+
+
+if __name__ == "__main__":
+    print(f"🧪 Fake batch API on http://localhost:{FAKE_BATCH_PORT} (batches complete after {FAKE_BATCH_DELAY}s)")
+    ThreadingHTTPServer(("0.0.0.0", FAKE_BATCH_PORT), Handler).serve_forever()
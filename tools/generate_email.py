@@ -1,14 +1,13 @@
 import os
 import json
 import re
-import requests
 from pathlib import Path
 from dotenv import load_dotenv
 from supabase import create_client, Client
-from bs4 import BeautifulSoup
 import anthropic
 import locale
 from datetime import datetime
+from site_crawler import crawl_site, snapshot_text
 
 load_dotenv(Path(__file__).parent / '.env')
 
@@ -20,81 +19,33 @@ supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
 client = anthropic.Anthropic(api_key=ANTHROPIC_API_KEY)
 
 
-def scrape_website_deep(url, max_chars=5000):
+def scrape_website_deep(url, max_chars=5000, snapshot=None, product=None):
     """
-    Scrapes the website homepage + key pages for deeper context.
+    Scrapes the website homepage + key pages for deeper context,
+    distilled towards the product's keywords when given.
+    Reuses an existing site snapshot when given, otherwise crawls the site.
     """
-    if not url.startswith("http"):
-        url = "https://" + url
+    if snapshot is None:
+        snapshot = crawl_site(url)
+    return snapshot_text(snapshot, max_chars, product)
 
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
-    }
 
-    all_text = []
-    visited = set()
-    from urllib.parse import urljoin, urlparse
+EMAIL_MODEL = "claude-sonnet-4-5-20250929"
+EMAIL_MAX_TOKENS = 1024
 
-    base_domain = urlparse(url).netloc
-    pages = [url]
 
-    # Add common pages for more context
-    for path in ["/chi-siamo", "/about", "/about-us", "/servizi", "/services", "/prodotti", "/products"]:
-        pages.append(urljoin(url, path))
-
-    for page_url in pages:
-        if page_url in visited or len(visited) >= 4:
-            break
-        visited.add(page_url)
-
-        try:
-            resp = requests.get(page_url, headers=headers, timeout=5)
-            if resp.status_code != 200:
-                continue
-            if urlparse(resp.url).netloc != base_domain:
-                continue
-
-            soup = BeautifulSoup(resp.text, 'html.parser')
-            for tag in soup(["script", "style", "nav", "footer", "header"]):
-                tag.decompose()
-
-            text = soup.get_text()
-            lines = (line.strip() for line in text.splitlines())
-            chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-            clean = '\n'.join(chunk for chunk in chunks if chunk)
-            all_text.append(clean)
-        except Exception:
-            pass
-
-    combined = '\n---\n'.join(all_text)
-    return combined[:max_chars]
-
-
-def generate_email_for_lead(lead_id):
+def build_email_request(lead):
     """
-    Analyzes the lead's website and generates a personalized cold email
-    proposing our product/service, aiming for a discovery call.
+    Builds the Claude request for a lead fetched with its product (select("*, products(*)")).
+    Returns (system, prompt), or (None, error message) when the lead has no website.
+    Also used by bulk_jobs.py to generate emails through the Message Batches API.
     """
-    # Fetch lead with product
-    response = supabase.table("leads").select("*, products(*)").eq("id", lead_id).execute()
-    if not response.data:
-        print(f"Lead {lead_id} not found.")
-        return None
-
-    lead = response.data[0]
     company_name = lead.get("company_name")
     website = lead.get("website")
     location = lead.get("location", "")
 
     if not website:
-        return {"error": "Nessun sito web disponibile per questo contatto."}
-
-    # Scrape website for context
-    print(f"Analyzing website: {website}")
-    website_content = scrape_website_deep(website)
-
-    if not website_content or len(website_content) < 50:
-        website_content = f"Azienda: {company_name}, Luogo: {location}, Settore: {lead.get('industry_vertical', 'N/A')}"
+        return None, "Nessun sito web disponibile per questo contatto."
 
     # Get product info
     product = lead.get("products")
@@ -110,12 +61,20 @@ def generate_email_for_lead(lead_id):
     elif lead.get("interested_product_id"):
         p_res = supabase.table("products").select("*").eq("id", lead.get("interested_product_id")).execute()
         if p_res.data:
+            product = p_res.data[0]
             product_name = p_res.data[0]['name']
             product_desc = p_res.data[0]['description']
             ai_desc = p_res.data[0].get('ai_description')
             if ai_desc:
                 product_desc = f"{product_desc}\n\nDettagli prodotto (da analisi AI): {ai_desc}"
 
+    # Scrape website for context
+    print(f"Analyzing website: {website}")
+    website_content = scrape_website_deep(website, product=product)
+
+    if not website_content or len(website_content) < 50:
+        website_content = f"Azienda: {company_name}, Luogo: {location}, Settore: {lead.get('industry_vertical', 'N/A')}"
+
     # Get current date in Italian for concrete date references
     try:
         locale.setlocale(locale.LC_TIME, 'it_IT.UTF-8')
@@ -168,11 +127,49 @@ OUTPUT JSON:
 }}
 """
 
+    system = f"Sei un copywriter B2B esperto che scrive per conto di Laser Services, azienda di Cesena specializzata in tecnologia laser dal 1991. {date_context}. Quando proponi date per call, usa date concrete e realistiche a partire da domani (es. 'giovedi' 20 febbraio'). Non inserire MAI firma, saluti finali o nome del mittente nel body. Rispondi ESCLUSIVAMENTE con JSON valido, senza testo aggiuntivo prima o dopo."
+    return system, prompt
+
+
+def parse_email_response(content):
+    """Extracts the email JSON from Claude's answer (tolerates code fences and extra text)."""
+    # Robust JSON extraction: handle markdown code fences
+    json_str = content.strip()
+    # Remove ```json ... ``` wrapping if present
+    fence_match = re.search(r'```(?:json)?\s*\n?(.*?)\n?```', json_str, re.DOTALL)
+    if fence_match:
+        json_str = fence_match.group(1).strip()
+
+    # Try to find JSON object if there's extra text
+    if not json_str.startswith('{'):
+        brace_match = re.search(r'\{.*\}', json_str, re.DOTALL)
+        if brace_match:
+            json_str = brace_match.group(0)
+
+    return json.loads(json_str)
+
+
+def generate_email_for_lead(lead_id):
+    """
+    Analyzes the lead's website and generates a personalized cold email
+    proposing our product/service, aiming for a discovery call.
+    """
+    # Fetch lead with product
+    response = supabase.table("leads").select("*, products(*)").eq("id", lead_id).execute()
+    if not response.data:
+        print(f"Lead {lead_id} not found.")
+        return None
+
+    lead = response.data[0]
+    system, prompt = build_email_request(lead)
+    if system is None:
+        return {"error": prompt}
+
     try:
         message = client.messages.create(
-            model="claude-sonnet-4-5-20250929",
-            max_tokens=1024,
-            system=f"Sei un copywriter B2B esperto che scrive per conto di Laser Services, azienda di Cesena specializzata in tecnologia laser dal 1991. {date_context}. Quando proponi date per call, usa date concrete e realistiche a partire da domani (es. 'giovedi' 20 febbraio'). Non inserire MAI firma, saluti finali o nome del mittente nel body. Rispondi ESCLUSIVAMENTE con JSON valido, senza testo aggiuntivo prima o dopo.",
+            model=EMAIL_MODEL,
+            max_tokens=EMAIL_MAX_TOKENS,
+            system=system,
             messages=[
                 {"role": "user", "content": prompt}
             ]
@@ -181,27 +178,14 @@ OUTPUT JSON:
         content = message.content[0].text
         print(f"Raw API response: {content[:500]}")
 
-        # Robust JSON extraction: handle markdown code fences
-        json_str = content.strip()
-        # Remove ```json ... ``` wrapping if present
-        fence_match = re.search(r'```(?:json)?\s*\n?(.*?)\n?```', json_str, re.DOTALL)
-        if fence_match:
-            json_str = fence_match.group(1).strip()
-
-        # Try to find JSON object if there's extra text
-        if not json_str.startswith('{'):
-            brace_match = re.search(r'\{.*\}', json_str, re.DOTALL)
-            if brace_match:
-                json_str = brace_match.group(0)
-
-        email_data = json.loads(json_str)
+        email_data = parse_email_response(content)
 
         # Save to lead
         supabase.table("leads").update({
             "generated_email": json.dumps(email_data, ensure_ascii=False)
         }).eq("id", lead_id).execute()
 
-        print(f"✅ Email generated for {company_name}")
+        print(f"✅ Email generated for {lead.get('company_name')}")
         return email_data
 
     except Exception as e:
@@ -0,0 +1,81 @@
+import os
+from bs4 import BeautifulSoup
+
+# HTML -> text for the crawler hot loop. Every crawled page goes through here,
+# so the parser matters: selectolax (lexbor, C) and lxml (libxml2, C) are several
+# times faster than BeautifulSoup's pure-Python html.parser and release the GIL
+# while parsing. All backends drop the same tags and produce the same line format.
+# "auto" picks the fastest one installed; benchmark with bench_html_text.py.
+HTML_TEXT_BACKEND = os.environ.get("HTML_TEXT_BACKEND", "auto")
+
+STRIP_TAGS = ["script", "style", "nav", "footer", "header"]
+
+
+def _clean_lines(text):
+    """One phrase per line, no blank lines (double spaces split phrases too)."""
+    lines = (line.strip() for line in text.splitlines())
+    chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
+    return '\n'.join(chunk for chunk in chunks if chunk)
+
+
+def _selectolax_text(html):
+    tree = LexborHTMLParser(html)
+    tree.strip_tags(STRIP_TAGS)
+    return tree.root.text(separator="") if tree.root else ""
+
+
+def _lxml_text(html):
+    if not html.strip():
+        return ""
+    try:
+        tree = lxml_html.fromstring(html)
+    except (lxml_etree.ParserError, ValueError):
+        # Empty document, or a str with an XML encoding declaration
+        tree = lxml_html.fromstring(html.encode("utf-8", "replace"))
+    for el in list(tree.iter(*STRIP_TAGS)):
+        el.drop_tree()  # Keeps the tail text, like BeautifulSoup's decompose()
+    return tree.text_content()
+
+
+def _html_parser_text(html):
+    soup = BeautifulSoup(html, 'html.parser')
+    for tag in soup(STRIP_TAGS):
+        tag.decompose()
+    return soup.get_text()
+
+
+BACKENDS = {}
+try:
+    from selectolax.lexbor import LexborHTMLParser
+    BACKENDS["selectolax"] = _selectolax_text
+except ImportError:
+    pass
+try:
+    from lxml import html as lxml_html, etree as lxml_etree
+    BACKENDS["lxml"] = _lxml_text
+except ImportError:
+    pass
+BACKENDS["html.parser"] = _html_parser_text
+
+
+def resolve_backend(name=None):
+    name = name or HTML_TEXT_BACKEND
+    if name == "auto":
+        return next(iter(BACKENDS))
+    if name not in BACKENDS:
+        print(f"⚠️ HTML backend '{name}' not installed — using {next(iter(BACKENDS))}")
+        return next(iter(BACKENDS))
+    return name
+
+
+_backend = resolve_backend()
+
+
+def html_to_text(html, backend=None):
+    """Strips scripts, styles and page chrome from HTML and returns clean text lines."""
+    extract = BACKENDS[resolve_backend(backend)] if backend else BACKENDS[_backend]
+    try:
+        return _clean_lines(extract(html))
+    except Exception:
+        # Broken markup the fast parsers reject: the lenient pure-Python parser always copes
+        return _clean_lines(_html_parser_text(html))
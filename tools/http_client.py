@@ -0,0 +1,41 @@
+import os
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+
+# Number of per-host pools kept alive, and max open connections per host
+HTTP_POOL_CONNECTIONS = int(os.environ.get("HTTP_POOL_CONNECTIONS", "50"))
+HTTP_POOL_MAXSIZE = int(os.environ.get("HTTP_POOL_MAXSIZE", "10"))
+HTTP_TIMEOUT = float(os.environ.get("HTTP_TIMEOUT", "5"))
+
+# One adapter (= one urllib3 PoolManager) shared by every thread, so consecutive
+# pages of the same site reuse a single keep-alive connection.
+# Retries stay with the callers, which already back off on their own.
+_adapter = HTTPAdapter(
+    pool_connections=HTTP_POOL_CONNECTIONS,
+    pool_maxsize=HTTP_POOL_MAXSIZE,
+    max_retries=0,
+)
+_local = threading.local()
+
+
+def get_session():
+    """
+    Returns this thread's Session. Sessions are per-thread (cookies and headers are
+    not thread-safe) but all of them share the same connection pools.
+    """
+    session = getattr(_local, "session", None)
+    if session is None:
+        session = requests.Session()
+        session.headers["User-Agent"] = USER_AGENT
+        session.mount("http://", _adapter)
+        session.mount("https://", _adapter)
+        _local.session = session
+    return session
+
+
+def get(url, timeout=None, **kwargs):
+    """Drop-in for requests.get() over the shared keep-alive pools."""
+    return get_session().get(url, timeout=timeout or HTTP_TIMEOUT, **kwargs)
@@ -0,0 +1,284 @@
+import os
+import re
+import csv
+import bisect
+import unicodedata
+from pathlib import Path
+
+# In-memory index of Italian places for the search location filter:
+#   province code -> (province, region), capoluoghi, regions, comune -> province, CAP -> provinces.
+# data/comuni.csv is the ISTAT list of comuni (December 2024) trimmed to name, name in the
+# other language and province code; ITALIAN_COMUNI_CSV can point to a newer ISTAT
+# "Elenco-comuni-italiani.csv" instead. data/cap_province.csv holds the CAP ranges of every
+# province (Garda Informatica CAP list, January 2026; Sardinian CAPs list both the 2025
+# provinces and the older codes still found in addresses).
+DATA_DIR = Path(__file__).parent / "data"
+ITALIAN_COMUNI_CSV = os.environ.get("ITALIAN_COMUNI_CSV")
+
+PROVINCES = {
+    # Piemonte
+    "TO": ("Torino", "Piemonte"), "VC": ("Vercelli", "Piemonte"), "NO": ("Novara", "Piemonte"),
+    "CN": ("Cuneo", "Piemonte"), "AT": ("Asti", "Piemonte"), "AL": ("Alessandria", "Piemonte"),
+    "BI": ("Biella", "Piemonte"), "VB": ("Verbano-Cusio-Ossola", "Piemonte"),
+    "AO": ("Aosta", "Valle d'Aosta"),
+    # Lombardia
+    "VA": ("Varese", "Lombardia"), "CO": ("Como", "Lombardia"), "SO": ("Sondrio", "Lombardia"),
+    "MI": ("Milano", "Lombardia"), "BG": ("Bergamo", "Lombardia"), "BS": ("Brescia", "Lombardia"),
+    "PV": ("Pavia", "Lombardia"), "CR": ("Cremona", "Lombardia"), "MN": ("Mantova", "Lombardia"),
+    "LC": ("Lecco", "Lombardia"), "LO": ("Lodi", "Lombardia"), "MB": ("Monza e della Brianza", "Lombardia"),
+    "BZ": ("Bolzano", "Trentino-Alto Adige"), "TN": ("Trento", "Trentino-Alto Adige"),
+    # Veneto
+    "VR": ("Verona", "Veneto"), "VI": ("Vicenza", "Veneto"), "BL": ("Belluno", "Veneto"),
+    "TV": ("Treviso", "Veneto"), "VE": ("Venezia", "Veneto"), "PD": ("Padova", "Veneto"),
+    "RO": ("Rovigo", "Veneto"),
+    "UD": ("Udine", "Friuli-Venezia Giulia"), "GO": ("Gorizia", "Friuli-Venezia Giulia"),
+    "TS": ("Trieste", "Friuli-Venezia Giulia"), "PN": ("Pordenone", "Friuli-Venezia Giulia"),
+    "IM": ("Imperia", "Liguria"), "SV": ("Savona", "Liguria"), "GE": ("Genova", "Liguria"),
+    "SP": ("La Spezia", "Liguria"),
+    # Emilia-Romagna
+    "PC": ("Piacenza", "Emilia-Romagna"), "PR": ("Parma", "Emilia-Romagna"), "RE": ("Reggio Emilia", "Emilia-Romagna"),
+    "MO": ("Modena", "Emilia-Romagna"), "BO": ("Bologna", "Emilia-Romagna"), "FE": ("Ferrara", "Emilia-Romagna"),
+    "RA": ("Ravenna", "Emilia-Romagna"), "FC": ("Forlì-Cesena", "Emilia-Romagna"), "RN": ("Rimini", "Emilia-Romagna"),
+    # Toscana
+    "MS": ("Massa-Carrara", "Toscana"), "LU": ("Lucca", "Toscana"), "PT": ("Pistoia", "Toscana"),
+    "FI": ("Firenze", "Toscana"), "LI": ("Livorno", "Toscana"), "PI": ("Pisa", "Toscana"),
+    "AR": ("Arezzo", "Toscana"), "SI": ("Siena", "Toscana"), "GR": ("Grosseto", "Toscana"),
+    "PO": ("Prato", "Toscana"),
+    "PG": ("Perugia", "Umbria"), "TR": ("Terni", "Umbria"),
+    "PU": ("Pesaro e Urbino", "Marche"), "AN": ("Ancona", "Marche"), "MC": ("Macerata", "Marche"),
+    "AP": ("Ascoli Piceno", "Marche"), "FM": ("Fermo", "Marche"),
+    "VT": ("Viterbo", "Lazio"), "RI": ("Rieti", "Lazio"), "RM": ("Roma", "Lazio"),
+    "LT": ("Latina", "Lazio"), "FR": ("Frosinone", "Lazio"),
+    "AQ": ("L'Aquila", "Abruzzo"), "TE": ("Teramo", "Abruzzo"), "PE": ("Pescara", "Abruzzo"),
+    "CH": ("Chieti", "Abruzzo"),
+    "CB": ("Campobasso", "Molise"), "IS": ("Isernia", "Molise"),
+    "CE": ("Caserta", "Campania"), "BN": ("Benevento", "Campania"), "NA": ("Napoli", "Campania"),
+    "AV": ("Avellino", "Campania"), "SA": ("Salerno", "Campania"),
+    "FG": ("Foggia", "Puglia"), "BA": ("Bari", "Puglia"), "TA": ("Taranto", "Puglia"),
+    "BR": ("Brindisi", "Puglia"), "LE": ("Lecce", "Puglia"), "BT": ("Barletta-Andria-Trani", "Puglia"),
+    "PZ": ("Potenza", "Basilicata"), "MT": ("Matera", "Basilicata"),
+    "CS": ("Cosenza", "Calabria"), "CZ": ("Catanzaro", "Calabria"), "RC": ("Reggio Calabria", "Calabria"),
+    "KR": ("Crotone", "Calabria"), "VV": ("Vibo Valentia", "Calabria"),
+    # Sicilia
+    "TP": ("Trapani", "Sicilia"), "PA": ("Palermo", "Sicilia"), "ME": ("Messina", "Sicilia"),
+    "AG": ("Agrigento", "Sicilia"), "CL": ("Caltanissetta", "Sicilia"), "EN": ("Enna", "Sicilia"),
+    "CT": ("Catania", "Sicilia"), "RG": ("Ragusa", "Sicilia"), "SR": ("Siracusa", "Sicilia"),
+    # Sardegna (older codes still appear in addresses)
+    "SS": ("Sassari", "Sardegna"), "NU": ("Nuoro", "Sardegna"), "CA": ("Cagliari", "Sardegna"),
+    "OR": ("Oristano", "Sardegna"), "SU": ("Sud Sardegna", "Sardegna"), "OT": ("Olbia-Tempio", "Sardegna"),
+    "OG": ("Ogliastra", "Sardegna"), "VS": ("Medio Campidano", "Sardegna"), "CI": ("Carbonia-Iglesias", "Sardegna"),
+}
+
+# Capoluoghi whose name differs from the province's, plus common alternative names
+EXTRA_CAPOLUOGHI = {
+    "forli": "FC", "cesena": "FC", "pesaro": "PU", "urbino": "PU", "barletta": "BT", "andria": "BT",
+    "trani": "BT", "massa": "MS", "carrara": "MS", "verbania": "VB", "monza": "MB", "carbonia": "SU",
+    "olbia": "OT", "tempio pausania": "OT", "tortoli": "OG", "lanusei": "OG", "villacidro": "VS",
+    "sanluri": "VS", "iglesias": "CI",
+}
+
+# Provinces named after several comuni or an area: not a comune themselves
+COMPOUND_PROVINCES = ("VB", "MB", "FC", "MS", "PU", "BT", "SU", "OT", "OG", "VS", "CI")
+
+# Official or second-language names of a comune -> the name used in the index
+COMUNE_ALIASES = {
+    "bozen": "bolzano", "meran": "merano", "brixen": "bressanone", "bruneck": "brunico",
+    "sterzing": "vipiteno", "aoste": "aosta", "reggio nell emilia": "reggio emilia",
+    "reggio di calabria": "reggio calabria",
+}
+
+REGION_ALIASES = {
+    "valle d aosta": "Valle d'Aosta", "val d aosta": "Valle d'Aosta", "trentino": "Trentino-Alto Adige",
+    "alto adige": "Trentino-Alto Adige", "sudtirol": "Trentino-Alto Adige", "friuli": "Friuli-Venezia Giulia",
+    "emilia": "Emilia-Romagna", "romagna": "Emilia-Romagna",
+}
+
+# "..., 47521 Cesena FC" / "47521 Cesena (FC)" / "..., Cesena FC, Italia"
+ADDRESS_RE = re.compile(r"(?:\b(\d{5})\s+)?([^,\d()]+?)\s+\(?([A-Z]{2})\)?\s*(?:,|$)")
+CAP_RE = re.compile(r"\b(\d{5})\b")
+LOCATION_SUFFIX_RE = re.compile(r"^(.+?)\s*(?:\s([A-Z]{2})|\(([A-Za-z]{2})\))$")
+PROVINCE_PREFIX_RE = re.compile(r"^(?:provincia|prov|citta metropolitana|area metropolitana)(?: di)? ")
+
+
+LEVEL_SPECIFICITY = {"country": 0, "unknown": 1, "region": 2, "province": 3, "comune": 4}
+
+
+def normalize_place(text):
+    """Lowercase, no accents, apostrophes/hyphens as spaces: "Forlì-Cesena" -> "forli cesena"."""
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(c for c in text if not unicodedata.combining(c)).lower()
+    return " ".join(re.findall(r"[a-z0-9]+", text))
+
+
+CAPOLUOGHI = {normalize_place(name): code for code, (name, _) in PROVINCES.items() if code not in COMPOUND_PROVINCES}
+CAPOLUOGHI.update(EXTRA_CAPOLUOGHI)
+
+PROVINCE_NAMES = {normalize_place(name): code for code, (name, _) in PROVINCES.items()}
+REGIONS = {normalize_place(region): region for _, region in PROVINCES.values()}
+REGIONS.update(REGION_ALIASES)
+
+# Comune -> province code: capoluoghi and their alternative names, then the ISTAT list
+COMUNI = dict(CAPOLUOGHI)
+# Sorted CAP range starts, and (last CAP, provinces) of each range
+CAP_STARTS = []
+CAP_RANGES = []
+
+
+def load_comuni_csv(path, encoding="latin-1"):
+    """
+    Loads the ISTAT list of comuni (semicolon-separated, latin-1 as published).
+    Columns used: "Denominazione in italiano", "Denominazione altra lingua" and "Sigla automobilistica".
+    """
+    loaded = 0
+    with open(path, encoding=encoding, newline="") as f:
+        for row in csv.DictReader(f, delimiter=";"):
+            name = row.get("Denominazione in italiano") or row.get("Denominazione (Italiana e straniera)")
+            code = (row.get("Sigla automobilistica") or "").strip().upper()
+            if name and code in PROVINCES:
+                COMUNI[normalize_place(name)] = code
+                other = normalize_place(row.get("Denominazione altra lingua"))
+                if other and other != normalize_place(name):
+                    COMUNE_ALIASES[other] = normalize_place(name)
+                loaded += 1
+    return loaded
+
+
+def load_cap_ranges(path):
+    """Loads "cap_da;cap_a;province" rows (inclusive CAP ranges, space-separated province codes)."""
+    with open(path, encoding="utf-8", newline="") as f:
+        rows = sorted((row["cap_da"], row["cap_a"], row["province"].split()) for row in csv.DictReader(f, delimiter=";"))
+    CAP_STARTS[:] = [start for start, _, _ in rows]
+    CAP_RANGES[:] = [(end, provinces) for _, end, provinces in rows]
+
+
+def cap_provinces(cap):
+    """Provinces a CAP belongs to ("47521" -> ["FC"]), [] if it is in no known range."""
+    i = bisect.bisect_right(CAP_STARTS, cap) - 1
+    if i < 0 or cap > CAP_RANGES[i][0]:
+        return []
+    return CAP_RANGES[i][1]
+
+
+if ITALIAN_COMUNI_CSV:
+    try:
+        print(f"🗺️  Loaded {load_comuni_csv(ITALIAN_COMUNI_CSV)} comuni from {ITALIAN_COMUNI_CSV}")
+    except (OSError, csv.Error) as e:
+        print(f"⚠️ Could not load comuni from {ITALIAN_COMUNI_CSV}: {e}")
+        ITALIAN_COMUNI_CSV = None
+if not ITALIAN_COMUNI_CSV:
+    load_comuni_csv(DATA_DIR / "comuni.csv", encoding="utf-8")
+load_cap_ranges(DATA_DIR / "cap_province.csv")
+
+
+def canonical_comune(name):
+    """Index name of a comune: "Bozen" -> "bolzano", "Reggio nell'Emilia" -> "reggio emilia"."""
+    name = normalize_place(name)
+    return COMUNE_ALIASES.get(name, name)
+
+
+def parse_address(address):
+    """
+    CAP, comune and province of a Google Maps address, or None if it has none of them.
+    """
+    if not address:
+        return None
+    cap = comune = province = None
+    for match in ADDRESS_RE.finditer(address):
+        if match.group(3) in PROVINCES:
+            cap, comune, province = match.group(1), canonical_comune(match.group(2)), match.group(3)
+    if province is None:
+        caps = CAP_RE.findall(address)
+        if not caps:
+            return None
+        cap = caps[-1]
+    return {
+        "cap": cap,
+        "comune": comune,
+        "province": province,
+        "region": PROVINCES[province][1] if province else None,
+        "cap_provinces": cap_provinces(cap) if cap else [],
+    }
+
+
+def resolve_location(location):
+    """
+    What a search location refers to: {"level": country|region|province|comune|unknown, ...}.
+    "Milano" is the comune (its province is used with include_province),
+    "provincia di Milano" / "MI" / "Forlì-Cesena" the province, "Lombardia" the region.
+    """
+    raw = (location or "").strip()
+    name = normalize_place(raw)
+    if name in ("", "italia", "italy"):
+        return {"level": "country"}
+    if raw.upper() in PROVINCES:
+        return {"level": "province", "province": raw.upper()}
+    stripped = PROVINCE_PREFIX_RE.sub("", name)
+    if stripped != name and (stripped in PROVINCE_NAMES or stripped in CAPOLUOGHI):
+        return {"level": "province", "province": PROVINCE_NAMES.get(stripped) or CAPOLUOGHI[stripped]}
+    if name in REGIONS:
+        return {"level": "region", "region": REGIONS[name]}
+    # "Cesena FC" / "Cesena (FC)"
+    suffix = LOCATION_SUFFIX_RE.match(raw)
+    code = suffix and (suffix.group(2) or suffix.group(3)).upper()
+    if code in PROVINCES:
+        return {"level": "comune", "comune": canonical_comune(suffix.group(1)), "province": code}
+    # Province names that are not also a capoluogo ("Forlì-Cesena", "Monza e della Brianza")
+    if name in PROVINCE_NAMES and name not in CAPOLUOGHI:
+        return {"level": "province", "province": PROVINCE_NAMES[name]}
+    name = COMUNE_ALIASES.get(name, name)
+    if name in COMUNI:
+        return {"level": "comune", "comune": name, "province": COMUNI[name]}
+    return {"level": "unknown"}
+
+
+def _words_match(address, location):
+    """
+    Fallback: the location as a whole phrase of the address, street excluded
+    ("Via Milano 3, Monza" is not in Milano, "Via San Marco" does not match "San").
+    """
+    phrase = normalize_place(location)
+    parts = (address or "").split(",")
+    place = ",".join(parts[1:]) if len(parts) > 1 else parts[0]
+    return bool(phrase) and f" {phrase} " in f" {normalize_place(place)} "
+
+
+def location_matches(address, location, include_province=False):
+    """
+    Whether a place's address is in the searched location. Returns (matched, how).
+    Unknown locations and unparseable addresses fall back to phrase matching.
+    Comma-separated locations match on their most specific part ("Milano, Italia" is
+    Milano); unknown parts may also match as phrases ("Franciacorta, Brescia").
+    """
+    if "," in (location or ""):
+        parts = [part.strip() for part in location.split(",") if part.strip()]
+        levels = {part: resolve_location(part)["level"] for part in parts}
+        parts = [part for part in parts if levels[part] != "country"] or parts[:1]
+        if not parts:
+            return True, "country"
+        best = max(parts, key=lambda part: LEVEL_SPECIFICITY[levels[part]])
+        matched = location_matches(address, best, include_province)
+        if not matched[0] and any(levels[p] == "unknown" and _words_match(address, p) for p in parts):
+            return True, "words"
+        return matched
+    target = resolve_location(location)
+    if target["level"] == "country":
+        return True, "country"
+    parsed = parse_address(address)
+    if parsed is None:
+        return _words_match(address, location), "words"
+
+    province = parsed["province"]
+    candidates = [province] if province else parsed["cap_provinces"]
+    if target["level"] == "region":
+        return any(PROVINCES[p][1] == target["region"] for p in candidates), "region"
+    if target["level"] == "province":
+        return target["province"] in candidates, "province"
+    if target["level"] == "comune":
+        if parsed["comune"] == target["comune"]:
+            return True, "comune"
+        if parsed["comune"] is None and _words_match(address, target["comune"]):
+            return True, "words"
+        if include_province:
+            return target["province"] in candidates, "province"
+        return False, "comune"
+    return _words_match(address, location), "words"
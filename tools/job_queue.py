@@ -0,0 +1,184 @@
+import os
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from dotenv import load_dotenv
+from supabase import create_client, Client
+from postgrest.exceptions import APIError
+
+load_dotenv(Path(__file__).parent / '.env')
+
+SUPABASE_URL = os.environ.get("SUPABASE_URL")
+SUPABASE_KEY = os.environ.get("SUPABASE_KEY")
+
+supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+
+# When enabled, /search enqueues jobs for worker.py instead of running them in the web process
+SEARCH_QUEUE_ENABLED = os.environ.get("SEARCH_QUEUE_ENABLED", "").lower() in ("1", "true", "yes")
+JOB_LEASE_SECONDS = int(os.environ.get("JOB_LEASE_SECONDS", "60"))
+JOB_MAX_ATTEMPTS = int(os.environ.get("JOB_MAX_ATTEMPTS", "3"))
+
+TABLE = "search_job_queue"
+UNIQUE_VIOLATION = "23505"
+
+
+def _now_iso():
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _epoch(ts):
+    """Postgres timestamp string -> unix time (the in-memory jobs use time.time())."""
+    if not ts:
+        return None
+    return datetime.fromisoformat(ts.replace("Z", "+00:00")).timestamp()
+
+
+def enqueue_search(job_id, product_id, location, limit, min_score, include_province):
+    """
+    Persists a new search job; a worker will pick it up. Returns job_id, or the id of
+    the product's queued/running job if it already has one: the unique index on active
+    jobs (patch_search_job_queue_active.sql) makes check and insert atomic.
+    """
+    try:
+        _insert_job(job_id, product_id, location, limit, min_score, include_province)
+    except APIError as e:
+        active = find_active_job(product_id) if e.code == UNIQUE_VIOLATION else None
+        if active is None:
+            raise
+        return active
+    return job_id
+
+
+def _insert_job(job_id, product_id, location, limit, min_score, include_province):
+    supabase.table(TABLE).insert({
+        "id": job_id,
+        "product_id": product_id,
+        "params": {
+            "location": location,
+            "limit": limit,
+            "min_score": min_score,
+            "include_province": include_province,
+        },
+        "status": "queued",
+        "progress": "In coda...",
+    }).execute()
+
+
+def find_active_job(product_id):
+    """Returns the id of a queued/running job for this product, if any."""
+    res = supabase.table(TABLE).select("id") \
+        .eq("product_id", product_id) \
+        .in_("status", ["queued", "running"]) \
+        .limit(1) \
+        .execute()
+    return res.data[0]["id"] if res.data else None
+
+
+def claim_next(worker_id):
+    """Leases the oldest runnable job to this worker. Returns the row or None."""
+    res = supabase.rpc("claim_search_job", {
+        "p_worker_id": worker_id,
+        "p_lease_seconds": JOB_LEASE_SECONDS,
+        "p_max_attempts": JOB_MAX_ATTEMPTS,
+    }).execute()
+    return res.data[0] if res.data else None
+
+
+class LeaseLost(Exception):
+    """The job's lease expired and another worker claimed it: this worker must stop running it."""
+
+
+def heartbeat(job_id, worker_id, job=None, checkpoint=None):
+    """
+    Renews the lease and persists progress + checkpoint.
+    Returns the row's stop_requested flag (set by /stop-search from any web process).
+    Only the worker holding the job updates it; raises LeaseLost when no row was updated.
+    """
+    update = {
+        "lease_expires_at": datetime.fromtimestamp(time.time() + JOB_LEASE_SECONDS, timezone.utc).isoformat(),
+        "updated_at": _now_iso(),
+    }
+    if job:
+        update["progress"] = job.get("progress")
+        update["result"] = _result_of(job)
+    if checkpoint:
+        update["checkpoint"] = checkpoint
+
+    res = supabase.table(TABLE).update(update) \
+        .eq("id", job_id) \
+        .eq("worker_id", worker_id) \
+        .execute()
+    if not res.data:
+        raise LeaseLost(f"job {job_id} is no longer leased to {worker_id}")
+    return bool(res.data[0].get("stop_requested"))
+
+
+def finish(job_id, worker_id, job):
+    """Stores the final outcome of a job and releases it."""
+    supabase.table(TABLE).update({
+        "status": job.get("status", "completed"),
+        "progress": job.get("progress"),
+        "result": _result_of(job),
+        "checkpoint": None,
+        "lease_expires_at": None,
+        "completed_at": _now_iso(),
+        "updated_at": _now_iso(),
+    }).eq("id", job_id).eq("worker_id", worker_id).execute()
+
+
+def release(job_id, worker_id, job=None, checkpoint=None):
+    """Hands a running job back to the queue (worker shutdown) so it is resumed from its checkpoint."""
+    update = {
+        "status": "queued",
+        "worker_id": None,
+        "lease_expires_at": None,
+        "updated_at": _now_iso(),
+    }
+    if job:
+        update["progress"] = job.get("progress")
+        update["result"] = _result_of(job)
+    if checkpoint:
+        update["checkpoint"] = checkpoint
+    supabase.table(TABLE).update(update).eq("id", job_id).eq("worker_id", worker_id).execute()
+
+
+def request_stop(job_id):
+    """Flags a job for graceful stop. Returns False if it is unknown or already finished."""
+    res = supabase.table(TABLE).update({"stop_requested": True, "updated_at": _now_iso()}) \
+        .eq("id", job_id) \
+        .in_("status", ["queued", "running"]) \
+        .execute()
+    return bool(res.data)
+
+
+def load_job(job_id):
+    """Returns a queued job in the same shape as search_leads.search_jobs entries, or None."""
+    res = supabase.table(TABLE).select("*").eq("id", job_id).execute()
+    if not res.data:
+        return None
+    row = res.data[0]
+    result = row.get("result") or {}
+    return {
+        # Not started yet: show it as running so clients keep waiting
+        "status": "running" if row["status"] == "queued" else row["status"],
+        "progress": row.get("progress"),
+        "product_id": row.get("product_id"),
+        "accepted": result.get("accepted", []),
+        "discarded": result.get("discarded", []),
+        "below_threshold": result.get("below_threshold", []),
+        "stats": result.get("stats", {}),
+        "stopped_reason": result.get("stopped_reason"),
+        "created_at": _epoch(row.get("created_at")),
+        "completed_at": _epoch(row.get("completed_at")),
+        "stop_requested": row.get("stop_requested", False),
+    }
+
+
+def _result_of(job):
+    return {
+        "accepted": job.get("accepted", []),
+        "discarded": job.get("discarded", []),
+        "below_threshold": job.get("below_threshold", []),
+        "stats": job.get("stats", {}),
+        "stopped_reason": job.get("stopped_reason"),
+    }
@@ -0,0 +1,220 @@
+import os
+import json
+import time
+import zlib
+import sqlite3
+import hashlib
+import threading
+from collections import Counter
+import numpy as np
+from disk_cache import CACHE_DIR
+from prescore import tokenize
+from url_utils import normalize_domain
+
+# Nearest-neighbour score prediction from leads already scored by the LLM.
+# Site texts are embedded offline with a signed hashed bag-of-words (no model download);
+# vectors live in a memory-mapped float32 matrix, labels in a SQLite sidecar.
+LEAD_INDEX_ENABLED = os.environ.get("LEAD_INDEX_ENABLED", "true").lower() in ("1", "true", "yes")
+LEAD_INDEX_DIM = 1024
+# Neighbours consulted, and how close/consistent they must be to skip the LLM
+LEAD_INDEX_K = int(os.environ.get("LEAD_INDEX_K", "5"))
+LEAD_INDEX_MIN_SIMILARITY = float(os.environ.get("LEAD_INDEX_MIN_SIMILARITY", "0.8"))
+LEAD_INDEX_MAX_SPREAD = int(os.environ.get("LEAD_INDEX_MAX_SPREAD", "10"))
+
+SUBSCORES = ("sector_match", "purchase_potential", "complementarity", "web_quality")
+
+
+def embed(text):
+    """L2-normalized signed hashed bag of stems (stable across processes, unlike hash())."""
+    vec = np.zeros(LEAD_INDEX_DIM, dtype=np.float32)
+    for term, freq in Counter(tokenize(text)).items():
+        h = zlib.crc32(term.encode("utf-8"))
+        vec[h % LEAD_INDEX_DIM] += (1.0 if h & 0x80000000 else -1.0) * (1.0 + np.log(freq))
+    norm = np.linalg.norm(vec)
+    return vec / norm if norm else vec
+
+
+def product_key(product, version=""):
+    """Neighbours only count for the same product content and scoring prompt/model."""
+    payload = json.dumps(
+        [product.get(k) for k in ("name", "description", "ai_description", "target_keywords")] + [version],
+        ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+class LeadIndex:
+    """
+    Append-only vector index shared by every process on the machine.
+    Row i of <name>.f32 is the embedding of items.row = i; SQLite serializes writers.
+    """
+
+    def __init__(self, name="lead_index"):
+        self.vectors_path = CACHE_DIR / f"{name}.f32"
+        self.db_path = CACHE_DIR / f"{name}.sqlite3"
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _db(self):
+        if self._conn is None:
+            CACHE_DIR.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS items (
+                    row INTEGER PRIMARY KEY,
+                    product_key TEXT NOT NULL,
+                    domain TEXT NOT NULL,
+                    score INTEGER NOT NULL,
+                    evaluation TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    UNIQUE (product_key, domain)
+                )
+            """)
+            self._conn = conn
+        return self._conn
+
+    def add(self, key, website, vector, evaluation):
+        """Stores (or relabels) the LLM evaluation of a site for a product."""
+        domain = normalize_domain(website)
+        if not domain:
+            return
+        try:
+            with self._lock:
+                db = self._db()
+                db.execute("BEGIN IMMEDIATE")  # Also locks out writers in other processes
+                existing = db.execute(
+                    "SELECT row FROM items WHERE product_key = ? AND domain = ?", (key, domain)
+                ).fetchone()
+                if existing:
+                    row = existing[0]
+                else:
+                    row = db.execute("SELECT COALESCE(MAX(row) + 1, 0) FROM items").fetchone()[0]
+                db.execute(
+                    "INSERT OR REPLACE INTO items (row, product_key, domain, score, evaluation, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                    (row, key, domain, int(evaluation["score"]), json.dumps(evaluation, ensure_ascii=False), time.time())
+                )
+                mode = "r+b" if self.vectors_path.exists() else "w+b"
+                with open(self.vectors_path, mode) as f:
+                    f.seek(row * LEAD_INDEX_DIM * 4)
+                    f.write(np.asarray(vector, dtype=np.float32).tobytes())
+                db.commit()
+        except Exception as e:
+            print(f"   ⚠️ Lead index write error: {e}")
+            try:
+                self._conn.rollback()
+            except Exception:
+                pass
+
+    def neighbours(self, key, vector, k):
+        """The k most similar labelled sites for this product: [(similarity, domain, evaluation)]."""
+        with self._lock:
+            rows = self._db().execute(
+                "SELECT row, domain, evaluation FROM items WHERE product_key = ?", (key,)
+            ).fetchall()
+        if not rows or not self.vectors_path.exists():
+            return []
+        n_rows = self.vectors_path.stat().st_size // (LEAD_INDEX_DIM * 4)
+        rows = [r for r in rows if r[0] < n_rows]
+        if not rows:
+            return []
+        matrix = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(n_rows, LEAD_INDEX_DIM))
+        sims = matrix[[r[0] for r in rows]] @ vector
+        top = np.argsort(-sims)[:k]
+        return [(float(sims[i]), rows[i][1], json.loads(rows[i][2])) for i in top]
+
+    def stats(self):
+        with self._lock:
+            entries, products = self._db().execute(
+                "SELECT COUNT(*), COUNT(DISTINCT product_key) FROM items"
+            ).fetchone()
+        size = self.vectors_path.stat().st_size if self.vectors_path.exists() else 0
+        return {"enabled": LEAD_INDEX_ENABLED, "entries": entries, "products": products, "bytes": size}
+
+
+lead_index = LeadIndex()
+
+
+def predict_score(key, vector, website=None):
+    """
+    Predicts the LLM score from the nearest already-scored sites of the same product.
+    Returns an evaluation dict only when all k neighbours are very similar and agree
+    within LEAD_INDEX_MAX_SPREAD points; otherwise None (ask the LLM).
+    """
+    if not LEAD_INDEX_ENABLED or not vector.any():
+        return None
+    try:
+        found = lead_index.neighbours(key, vector, LEAD_INDEX_K + 1)
+    except Exception as e:
+        print(f"   ⚠️ Lead index read error: {e}")
+        return None
+    # A site is not its own neighbour (e.g. re-scoring after a content change)
+    domain = normalize_domain(website)
+    found = [n for n in found if n[1] != domain][:LEAD_INDEX_K]
+    if len(found) < LEAD_INDEX_K or found[-1][0] < LEAD_INDEX_MIN_SIMILARITY:
+        return None
+    scores = [n[2]["score"] for n in found]
+    if max(scores) - min(scores) > LEAD_INDEX_MAX_SPREAD:
+        return None
+
+    weights = np.array([n[0] for n in found])
+    def weighted(field):
+        return int(round(float(np.average([n[2].get(field, 0) for n in found], weights=weights))))
+
+    nearest = found[0]
+    evaluation = {
+        "score": weighted("score"),
+        "reason": f"Stimato da {len(found)} lead simili già valutati (es. {nearest[1]}: {nearest[2].get('reason', '')})",
+        "accepted": True,
+        "neighbours": [n[1] for n in found],
+        "similarity": round(found[-1][0], 3),
+    }
+    for field in SUBSCORES:
+        evaluation[field] = weighted(field)
+    return evaluation
+
+
+def backfill(product_id=None, limit=1000):
+    """
+    Seeds the index with leads already scored in Supabase (site text from the crawl cache),
+    in the partition lead searches read first (search_prompt_version()).
+    """
+    from evaluate_lead import supabase, scrape_text_content, index_key, search_prompt_version
+
+    query = supabase.table("leads") \
+        .select("website, match_score, match_reason, interested_product_id") \
+        .gt("match_score", 0) \
+        .not_.is_("website", "null") \
+        .not_.is_("interested_product_id", "null")
+    if product_id:
+        query = query.eq("interested_product_id", product_id)
+    leads = query.limit(limit).execute().data
+
+    products = {}
+    added = 0
+    for lead in leads:
+        pid = lead["interested_product_id"]
+        if pid not in products:
+            res = supabase.table("products").select("*").eq("id", pid).execute()
+            products[pid] = res.data[0] if res.data else None
+        if not products[pid]:
+            continue
+        content = scrape_text_content(lead["website"], product=products[pid])
+        if not content or len(content) < 50:
+            continue
+        lead_index.add(index_key(products[pid], search_prompt_version()), lead["website"], embed(content), {
+            "score": lead["match_score"],
+            "reason": lead.get("match_reason") or "",
+        })
+        added += 1
+    print(f"📇 Lead index: added {added}/{len(leads)} scored leads")
+    return added
+
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) > 1 and sys.argv[1] == "backfill":
+        backfill(sys.argv[2] if len(sys.argv) > 2 else None)
+    else:
+        print(json.dumps(lead_index.stats(), indent=2))
+        print("Usage: python lead_index.py backfill [product_uuid]")
@@ -0,0 +1,118 @@
+import os
+import re
+import unicodedata
+from collections import Counter
+from functools import lru_cache
+
+# Sites whose relevance to the product is below this are rejected without calling the LLM.
+# 0 disables the pre-filter. Relevance is in [0, 1] (see relevance()).
+PRESCORE_MIN_RELEVANCE = float(os.environ.get("PRESCORE_MIN_RELEVANCE", "0.03"))
+# Score assigned to rejected candidates: below any sensible min_score, but not 0 (= unreachable)
+PRESCORE_REJECT_SCORE = 5
+
+# BM25 parameters. No corpus is available at scoring time, so document length is
+# normalized against a typical homepage + about page (~600 tokens after stopwords).
+BM25_K1 = 1.2
+BM25_B = 0.75
+AVG_DOC_TOKENS = 600
+
+# Weight of each product field in the query
+FIELD_WEIGHTS = {"target_keywords": 3.0, "name": 2.0, "description": 1.0, "ai_description": 1.0}
+# Relevance is normalized by the best score of the product's top terms only (the target
+# keywords, when given): a long description must not make core-keyword matches look weak
+RELEVANCE_CORE_TERMS = 5
+
+STOPWORDS = set("""
+il lo la i gli le un uno una di da in con su per tra fra del dello della dei degli delle al allo alla ai agli alle
+dal dallo dalla dai dagli dalle nel nello nella nei negli nelle sul sullo sulla sui sugli sulle che chi cui non come
+dove quando anche piu più molto ogni tutto tutti tutte sono essere siamo stato stati questo questa questi queste quello
+quella nostro nostra nostri nostre vostro vostra suo sua loro the and for with from your our are you this that
+prodotto prodotti servizio servizi azienda aziende cliente clienti qualita qualità alta elevata soluzione soluzioni
+offre offriamo realizza realizziamo settore settori tipo tipi ideale adatto adatta utile vari varie diversi diverse
+scopri contatti contattaci home chi siamo privacy cookie policy copyright riservati diritti partita iva
+""".split())
+
+
+def _fold(text):
+    """Lowercase and strip accents (città -> citta)."""
+    text = unicodedata.normalize("NFKD", text.lower())
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+
+def _stem(word):
+    """
+    Very light Italian stemmer: drops the inflection vowels and truncates,
+    so ristorante/ristoranti, targa/targhe and albergo/alberghi collide.
+    """
+    word = re.sub(r"[aeiouh]+$", "", word) or word
+    return word[:7]
+
+
+def tokenize(text):
+    return [
+        _stem(w) for w in re.findall(r"[a-z0-9]+", _fold(text or ""))
+        if len(w) > 2 and w not in STOPWORDS and not w.isdigit()
+    ]
+
+
+@lru_cache(maxsize=256)
+def _query_terms(name, description, ai_description, target_keywords):
+    fields = {
+        "name": name, "description": description,
+        "ai_description": ai_description, "target_keywords": target_keywords,
+    }
+    weights = Counter()
+    for field, text in fields.items():
+        for term in set(tokenize(text)):
+            weights[term] = max(weights[term], FIELD_WEIGHTS[field])
+    return dict(weights)
+
+
+def product_terms(product):
+    """Weighted query terms of a product (cached per product content)."""
+    return _query_terms(*(product.get(k) or "" for k in ("name", "description", "ai_description", "target_keywords")))
+
+
+def relevance(website_content, product):
+    """
+    BM25-style relevance of the site text to the product, normalized to [0, 1]
+    by the best score a document could reach on the product's RELEVANCE_CORE_TERMS top terms.
+    """
+    terms = product_terms(product)
+    if not terms:
+        return 1.0  # Nothing to compare against: never reject
+    tokens = tokenize(website_content)
+    tf = Counter(tokens)
+    length_norm = 1 - BM25_B + BM25_B * (len(tokens) / AVG_DOC_TOKENS)
+
+    score = 0.0
+    for term, weight in terms.items():
+        f = tf.get(term, 0)
+        if f:
+            score += weight * f * (BM25_K1 + 1) / (f + BM25_K1 * length_norm)
+    core = sorted(terms.values(), reverse=True)[:RELEVANCE_CORE_TERMS]
+    best = sum(weight * (BM25_K1 + 1) for weight in core)
+    return round(min(1.0, score / best), 4) if best else 0.0
+
+
+def prescore(website_content, product):
+    """
+    Cheap first-stage filter run before the LLM.
+    Returns a rejection result (same shape as evaluate_lead_prefilter) for clear
+    mismatches, or None if the candidate should go on to the LLM.
+    """
+    if PRESCORE_MIN_RELEVANCE <= 0:
+        return None
+    rel = relevance(website_content, product)
+    if rel >= PRESCORE_MIN_RELEVANCE:
+        return None
+    return {
+        "score": PRESCORE_REJECT_SCORE,
+        "reason": f"Scartato dal pre-filtro: il sito non contiene termini affini al prodotto (rilevanza {rel:.2f}).",
+        "sector_match": 0,
+        "purchase_potential": 0,
+        "complementarity": 0,
+        "web_quality": 0,
+        "relevance": rel,
+        "accepted": False,
+    }
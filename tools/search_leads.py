@@ -2,12 +2,21 @@ import os
 import json
 import time
 import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from pathlib import Path
 from dotenv import load_dotenv
 from serpapi import GoogleSearch
 from supabase import create_client, Client
 from extract_emails import extract_contacts_from_url
-from evaluate_lead import evaluate_lead_prefilter
+from evaluate_lead import LeadBatchScorer, LLM_FREE_SOURCES
+from site_crawler import crawl_site
+from url_utils import normalize_domain
+from disk_cache import DiskCache
+from crawl_scheduler import TokenBucket
+from candidate_frontier import CandidateFrontier
+from candidate_pipeline import StagePipeline
+from italian_locations import location_matches
 
 load_dotenv(Path(__file__).parent / '.env')
 
@@ -22,10 +31,51 @@ supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
 # Stores results for each search job so the API can poll them
 search_jobs = {}
 search_jobs_lock = threading.Lock()
+# Resumable state of each running job (query offsets, visited websites, partial results),
+# refreshed after every SerpAPI page. Persisted by the queue worker (see worker.py).
+job_checkpoints = {}
+# Incremental progress events of each job, streamed by GET /search-events (SSE)
+job_events = {}
 
 DEFAULT_MIN_SCORE = 50
 SEARCH_TIMEOUT_SECONDS = 300  # 5 minutes
 
+# Max candidates of a SerpAPI page evaluated in parallel (scrape + AI + enrichment)
+SEARCH_CONCURRENCY = int(os.environ.get("SEARCH_CONCURRENCY", "4"))
+# How often the page loop wakes up to check stop/timeout while workers run
+STOP_POLL_SECONDS = 0.5
+# Candidates kept queued in the frontier (at least; 2 x concurrency when higher): more pages
+# are fetched below this, so the best of a wider pool is evaluated first
+FRONTIER_MIN_QUEUED = int(os.environ.get("FRONTIER_MIN_QUEUED", "20"))
+# Accepted leads are written in batches of up to this size (one round trip per batch)
+LEAD_INSERT_BATCH_SIZE = int(os.environ.get("LEAD_INSERT_BATCH_SIZE", "10"))
+# ...or once the oldest buffered lead has waited this long (seconds), so it shows up promptly
+LEAD_INSERT_MAX_WAIT = float(os.environ.get("LEAD_INSERT_MAX_WAIT", "2"))
+# Website domains never evaluated (subdomains included): Maps places whose "website" is a
+# social profile or a directory listing cannot be crawled nor become leads
+SEARCH_DOMAIN_BLACKLIST = tuple(
+    d.strip().lower() for d in os.environ.get(
+        "SEARCH_DOMAIN_BLACKLIST",
+        "facebook.com,instagram.com,linkedin.com,tiktok.com,twitter.com,x.com,youtube.com,wa.me,paginegialle.it,tripadvisor.it",
+    ).split(",") if d.strip()
+)
+
+# SerpAPI pages keyed by (engine, q, hl, gl, start): re-runs and retried jobs cost no credits.
+# SERPAPI_CACHE_MODE: "readwrite" (default), "only" (replay: never call SerpAPI, a miss is an
+# empty page, recorded pages are served whatever their age and the TTL) or "off".
+SERPAPI_CACHE_TTL_HOURS = float(os.environ.get("SERPAPI_CACHE_TTL_HOURS", "24"))  # 0 = disabled
+SERPAPI_CACHE_MODE = os.environ.get("SERPAPI_CACHE_MODE", "readwrite").lower()
+# SerpAPI calls per second across all jobs of the process (cache hits are free),
+# and upcoming pages per keyword fetched in the background while a page is evaluated (0 = off)
+SERPAPI_RPS = float(os.environ.get("SERPAPI_RPS", "1.5"))
+SERPAPI_PREFETCH_PAGES = int(os.environ.get("SERPAPI_PREFETCH_PAGES", "1"))
+serpapi_bucket = TokenBucket(SERPAPI_RPS, burst=2)
+serpapi_cache = DiskCache(
+    "serpapi_pages",
+    ttl_seconds=SERPAPI_CACHE_TTL_HOURS * 3600 if SERPAPI_CACHE_MODE != "off" else 0,
+    max_bytes=int(float(os.environ.get("SERPAPI_CACHE_MAX_MB", "50")) * 1024 * 1024),
+)
+
 def is_stop_requested(job_id):
     """Check if this job has been flagged for stopping (manual or timeout)."""
     with search_jobs_lock:
@@ -34,35 +84,43 @@ def is_stop_requested(job_id):
             return True
         return job.get("stop_requested", False)
 
-# Province abbreviation mapping for common Italian cities
-CITY_TO_PROVINCE = {
-    "milano": "MI", "roma": "RM", "torino": "TO", "napoli": "NA",
-    "bologna": "BO", "firenze": "FI", "genova": "GE", "venezia": "VE",
-    "palermo": "PA", "bari": "BA", "catania": "CT", "verona": "VR",
-    "padova": "PD", "brescia": "BS", "bergamo": "BG", "modena": "MO",
-    "parma": "PR", "reggio emilia": "RE", "perugia": "PG", "livorno": "LI",
-    "cagliari": "CA", "trieste": "TS", "ancona": "AN", "lecce": "LE",
-    "como": "CO", "varese": "VA", "monza": "MB", "pavia": "PV",
-    "cremona": "CR", "mantova": "MN", "lodi": "LO", "sondrio": "SO",
-    "lecco": "LC", "rimini": "RN", "pesaro": "PU", "ravenna": "RA",
-    "piacenza": "PC", "ferrara": "FE", "forlì": "FC", "cesena": "FC",
-    "trento": "TN", "bolzano": "BZ", "udine": "UD", "pordenone": "PN",
-    "vicenza": "VI", "treviso": "TV", "belluno": "BL", "rovigo": "RO",
-    "alessandria": "AL", "asti": "AT", "cuneo": "CN", "novara": "NO",
-    "vercelli": "VC", "biella": "BI", "savona": "SV", "imperia": "IM",
-    "la spezia": "SP", "lucca": "LU", "pisa": "PI", "arezzo": "AR",
-    "siena": "SI", "grosseto": "GR", "pistoia": "PT", "prato": "PO",
-    "massa": "MS", "terni": "TR", "macerata": "MC", "ascoli piceno": "AP",
-    "teramo": "TE", "pescara": "PE", "chieti": "CH", "l'aquila": "AQ",
-    "campobasso": "CB", "isernia": "IS", "caserta": "CE", "salerno": "SA",
-    "avellino": "AV", "benevento": "BN", "foggia": "FG", "taranto": "TA",
-    "brindisi": "BR", "potenza": "PZ", "matera": "MT", "cosenza": "CS",
-    "catanzaro": "CZ", "reggio calabria": "RC", "crotone": "KR", "vibo valentia": "VV",
-    "messina": "ME", "siracusa": "SR", "ragusa": "RG", "agrigento": "AG",
-    "caltanissetta": "CL", "enna": "EN", "trapani": "TP",
-    "sassari": "SS", "nuoro": "NU", "oristano": "OR",
-}
+# Lead events and the job's lead list they extend
+LEAD_EVENT_LISTS = {"lead_accepted": "accepted", "lead_discarded": "discarded", "lead_below_threshold": "below_threshold"}
 
+def emit_event(job_id, event_type, data):
+    """
+    Appends an event to the job's stream. Event ids are 1-based positions in the stream.
+    Lead events also extend the job's lead list under the same lock, so a snapshot
+    (get_job_snapshot) always holds exactly the leads of the events up to its cursor.
+    """
+    if not job_id:
+        return
+    with search_jobs_lock:
+        events = job_events.setdefault(job_id, [])
+        events.append({"id": len(events) + 1, "type": event_type, "data": data})
+        job = search_jobs.get(job_id)
+        key = LEAD_EVENT_LISTS.get(event_type)
+        if key and job is not None:
+            # A new list, not append(): snapshots taken earlier share the old one
+            job[key] = job.get(key, []) + [data]
+
+def get_events(job_id, after_id=0):
+    """
+    Returns (events newer than after_id, finished).
+    A job's stream is finished once its final "status" event has been emitted.
+    """
+    with search_jobs_lock:
+        events = job_events.get(job_id)
+        if events is None:
+            return [], job_id not in search_jobs
+        finished = bool(events) and events[-1]["type"] == "status"
+        return events[after_id:], finished
+
+def get_job_snapshot(job_id):
+    """Returns (copy of the job, id of its latest event), read atomically."""
+    with search_jobs_lock:
+        job = search_jobs.get(job_id)
+        return (dict(job) if job else None), len(job_events.get(job_id, []))
 
 # ═══════════════════════════════════════════
 # 🛑 Custom Exception Hierarchy
@@ -111,29 +169,34 @@ def retry(max_attempts=3, backoff_factor=2.0, exceptions=(Exception,)):
 
 
 # ═══════════════════════════════════════════
-# 🔎 SerpAPI Fetch with Retry
+# 🔎 SerpAPI Fetch with Retry (+ page cache)
 # ═══════════════════════════════════════════
-@retry(max_attempts=2, backoff_factor=2.0, exceptions=(Exception,))
-def fetch_serpapi_results(query, offset=0):
-    """Fetch a page of Google Maps results via SerpAPI, with retry on failure."""
-    params = {
+def serpapi_params(query, offset=0):
+    return {
         "engine": "google_maps",
         "q": query,
         "type": "search",
-        "api_key": SERPAPI_KEY,
         "hl": "it",
         "gl": "it",
         "start": offset,
     }
 
-    search = GoogleSearch(params)
+
+def serpapi_cache_key(params):
+    """Everything that changes the result page; never the API key."""
+    return json.dumps([params[k] for k in ("engine", "type", "q", "hl", "gl", "start")], ensure_ascii=False)
+
+
+@retry(max_attempts=2, backoff_factor=2.0, exceptions=(Exception,))
+def _fetch_serpapi_page(params):
+    search = GoogleSearch(dict(params, api_key=SERPAPI_KEY))
     results = search.get_dict()
 
     if "error" in results:
         raise SerpAPIError(
             f"SerpAPI returned error: {results['error']}",
             code="SERPAPI_ERROR",
-            details={"query": query, "offset": offset}
+            details={"query": params["q"], "offset": params["start"]}
         )
 
     local_results = results.get("local_results", [])
@@ -143,34 +206,108 @@ def fetch_serpapi_results(query, offset=0):
     return local_results
 
 
-def search_leads(product_id, location="Italia", limit=10, min_score=DEFAULT_MIN_SCORE, job_id=None, include_province=False):
+def fetch_serpapi_results(query, offset=0):
+    """
+    Fetch a page of Google Maps results via SerpAPI, with retry on failure.
+    Pages are served from the on-disk SerpAPI cache while fresh (errors are never cached),
+    or at any age in cache-only mode.
+    """
+    params = serpapi_params(query, offset)
+    key = serpapi_cache_key(params)
+
+    cached = serpapi_cache.get(key, fresh=SERPAPI_CACHE_MODE != "only")
+    if cached is not None:
+        print(f"   💾 SerpAPI cache hit: '{query}' @ {offset}")
+        return cached
+    if SERPAPI_CACHE_MODE == "only":
+        print(f"   📼 SerpAPI cache-only mode: no cached page for '{query}' @ {offset}")
+        return []
+
+    wait = serpapi_bucket.reserve() - time.monotonic()
+    if wait > 0:
+        time.sleep(wait)
+    local_results = _fetch_serpapi_page(params)
+    serpapi_cache.set(key, local_results)
+    return local_results
+
+
+class SerpPrefetcher:
+    """
+    Keeps the upcoming SerpAPI pages of every keyword in flight on a small pool,
+    so the round-robin loop finds each page ready instead of waiting for the API.
+    Requests still go through serpapi_bucket; pages fetched but never used stay
+    in the SerpAPI cache for the next search.
+    """
+
+    def __init__(self, depth=SERPAPI_PREFETCH_PAGES, max_pages=None):
+        self.depth = depth
+        self.max_pages = max_pages
+        self.pool = ThreadPoolExecutor(max_workers=max(1, depth) * 2, thread_name_prefix="serp-prefetch")
+        self.futures = {}  # (query, offset) -> Future
+
+    def schedule(self, query_states):
+        """Queues the next `depth` pages of every keyword that is not exhausted."""
+        for qs in query_states:
+            if qs["exhausted"]:
+                continue
+            for ahead in range(self.depth):
+                if self.max_pages is not None and qs["page"] + ahead >= self.max_pages:
+                    break
+                key = (qs["full_query"], qs["offset"] + 20 * ahead)
+                if key not in self.futures:
+                    self.futures[key] = self.pool.submit(fetch_serpapi_results, *key)
+
+    def get(self, query, offset):
+        """The page, from the prefetched future when there is one (raises like fetch_serpapi_results)."""
+        future = self.futures.pop((query, offset), None)
+        if future is None:
+            return fetch_serpapi_results(query, offset=offset)
+        return future.result()
+
+    def close(self):
+        for future in self.futures.values():
+            future.cancel()
+        self.futures.clear()
+        self.pool.shutdown(wait=False)
+
+
+def search_leads(product_id, location="Italia", limit=10, min_score=DEFAULT_MIN_SCORE, job_id=None, include_province=False, concurrency=None, resume=None):
     """
     Executes Google Maps search based on a Product's target keywords.
     PRE-FILTERS leads by AI score before inserting into DB.
     Uses SerpAPI PAGINATION to ensure we find enough leads.
     Only counts leads with score >= min_score toward the requested limit.
+    The results of each SerpAPI page are evaluated by a bounded worker pool.
     
     Args:
         include_province: If True, matches results in the entire province (e.g. Milano matches all MI)
+        concurrency: Max candidates evaluated in parallel (default: SEARCH_CONCURRENCY)
+        resume: Checkpoint from job_checkpoints of an interrupted run of the same job.
+                Query offsets, visited websites and partial results are restored.
 
     Returns { accepted: [...], discarded: [...], below_threshold: [...], stats: {...} }
     """
+    concurrency = max(1, concurrency or SEARCH_CONCURRENCY)
+    resume = resume or {}
+
     # Initialize job tracking
     if job_id:
         with search_jobs_lock:
             search_jobs[job_id] = {
                 "status": "running",
-                "progress": "Avvio ricerca...",
+                "progress": "Ripresa ricerca..." if resume else "Avvio ricerca...",
                 "product_id": product_id,
-                "accepted": [],
-                "discarded": [],
-                "below_threshold": [],
+                "accepted": list(resume.get("accepted", [])),
+                "discarded": list(resume.get("discarded", [])),
+                "below_threshold": list(resume.get("below_threshold", [])),
                 "stats": {"analyzed": 0, "accepted": 0, "discarded": 0, "below_threshold": 0, "avg_score": 0},
                 "created_at": time.time(),
                 "stop_requested": False
             }
+            job_events[job_id] = []
 
-    search_start_time = time.time()
+    # A resumed job keeps the time it already spent towards the timeout
+    search_start_time = time.time() - resume.get("elapsed", 0)
 
     def update_job(progress=None, **kwargs):
         if job_id:
@@ -179,6 +316,17 @@ def search_leads(product_id, location="Italia", limit=10, min_score=DEFAULT_MIN_
                     search_jobs[job_id]["progress"] = progress
                 for k, v in kwargs.items():
                     search_jobs[job_id][k] = v
+            if progress:
+                emit_event(job_id, "progress", {"progress": progress})
+            if "stats" in kwargs:
+                emit_event(job_id, "stats", kwargs["stats"])
+            if "status" in kwargs:
+                emit_event(job_id, "status", {
+                    "status": kwargs["status"],
+                    "progress": progress,
+                    "stopped_reason": kwargs.get("stopped_reason"),
+                    "stats": kwargs.get("stats", {}),
+                })
 
     # 1. Fetch Product Details
     print(f"📦 Fetching Product {product_id}...")
@@ -191,6 +339,8 @@ def search_leads(product_id, location="Italia", limit=10, min_score=DEFAULT_MIN_
         return {"accepted": [], "discarded": [], "stats": {}}
 
     product = product_res.data[0]
+    # Leads that need GPT-4o are scored several per request (LLM_BATCH_SIZE)
+    scorer = LeadBatchScorer(product)
 
     # Smart Query Construction — build list of queries from target_keywords
     raw_keywords = product.get("target_keywords")
@@ -216,24 +366,263 @@ def search_leads(product_id, location="Italia", limit=10, min_score=DEFAULT_MIN_
     # 🔄 ROUND-ROBIN MULTI-QUERY SEARCH
     # Cycles through keywords one page at a time:
     #   Page 1 of KW1 → Page 1 of KW2 → ... → Page 2 of KW1 → ...
-    # Ensures variety across sectors and no duplicates.
+    # Results of all keywords are merged into one frontier (candidate_frontier.py),
+    # deduplicated by place/domain and evaluated best first; more pages are
+    # fetched only when the frontier runs low.
     # ══════════════════════════════════════════════════════════
 
     MAX_PAGES_PER_QUERY = 10
-    visited_websites = set()
+    visited_domains = set(resume.get("visited_domains", []))
+
+    accepted = list(resume.get("accepted", []))
+    discarded = list(resume.get("discarded", []))
+    below_threshold = list(resume.get("below_threshold", []))
+    all_scores = list(resume.get("all_scores", []))
+    accepted_count = len(accepted)
+    analyzed_count = resume.get("analyzed", 0)
+    total_pages = resume.get("pages_searched", 0)
+    # How each candidate's score was obtained: llm / cache / prescore / knn / unreachable / blocked / fallback
+    scoring_sources = Counter(resume.get("scoring_sources", {}))
+
+    # ── Worker pool state ──
+    # Workers record their outcome directly; state_cond guards the counters and lists.
+    # reserved_slots counts leads currently being enriched/inserted, so that
+    # accepted_count + reserved_slots never exceeds the requested limit.
+    state_cond = threading.Condition()
+    reserved_slots = 0
+    pending_inserts = []  # (lead_data, lead_summary, keyword) awaiting the next bulk insert
+    pending_since = None  # When the oldest of them was buffered
+    halt = threading.Event()  # Set on stop/timeout/limit: workers drop any further work
+
+    def should_stop():
+        if job_id and is_stop_requested(job_id):
+            return True
+        if job_id and (time.time() - search_start_time) > SEARCH_TIMEOUT_SECONDS:
+            with search_jobs_lock:
+                search_jobs[job_id]["stop_requested"] = True
+            return True
+        return False
+
+    def record(bucket, lead_summary, event=None):
+        with state_cond:
+            if halt.is_set():
+                return
+            bucket.append(lead_summary)
+        if event:
+            emit_event(job_id, event, lead_summary)
+
+    def process_candidate(item, keyword):
+        """Evaluates a single SerpAPI result. Runs inside the worker pool."""
+        nonlocal analyzed_count, reserved_slots, pending_since
+
+        if halt.is_set():
+            return
+
+        company_name = item.get("title")
+        website = item.get("website")
+        phone = item.get("phone")
+        address = item.get("address")
+
+        with state_cond:
+            if halt.is_set() or accepted_count >= limit:
+                return
+            analyzed_count += 1
+        update_job(progress=f"\"{keyword}\" — Analisi AI: {company_name}...")
+
+        # Single-pass crawl: the same snapshot feeds scoring and contact enrichment
+        snapshot = crawl_site(website)
+
+        # AI Pre-filter
+        eval_result = scorer.evaluate(
+            company_name=company_name,
+            website=website,
+            location=address or location,
+            snapshot=snapshot
+        )
 
-    accepted = []
-    discarded = []
-    below_threshold = []
-    all_scores = []
-    accepted_count = 0
-    analyzed_count = 0
-    total_pages = 0
+        score = eval_result["score"]
+        reason = eval_result["reason"]
+        source = eval_result.get("source", "llm")
+        with state_cond:
+            scoring_sources[source] += 1
+        if source in ("unreachable", "blocked"):
+            pipeline.record("scrape", dropped=1)
+        else:
+            pipeline.record("scrape")
+            pipeline.record("score", dropped=int(score < min_score))
+
+        lead_summary = {
+            "company_name": company_name,
+            "website": website,
+            "location": address or location,
+            "phone": phone,
+            "score": score,
+            "reason": reason,
+            "sector_match": eval_result.get("sector_match", 0),
+            "purchase_potential": eval_result.get("purchase_potential", 0),
+            "complementarity": eval_result.get("complementarity", 0),
+            "web_quality": eval_result.get("web_quality", 0)
+        }
+
+        # Score 0 = unreachable (or blocking) site
+        if score == 0:
+            print(f"   🚫 SKIP (score 0): {company_name} — {reason}")
+            record(discarded, lead_summary, "lead_discarded")
+            return
+
+        record(all_scores, score)
+
+        quality_label = "🟢 TOP" if score >= min_score else "🟡 BELOW"
+        print(f"   {quality_label}: {company_name} (Score: {score})")
+
+        # Below threshold
+        if score < min_score:
+            print(f"   ⏭️  Below {min_score}%: {company_name} (Score: {score})")
+            record(below_threshold, lead_summary, "lead_below_threshold")
+            return
+
+        # GUARD: reserve a slot before expensive enrichment + insert.
+        # If every remaining slot is held by another worker, wait until one frees up.
+        with state_cond:
+            state_cond.wait_for(lambda: halt.is_set() or accepted_count + reserved_slots < limit)
+            if halt.is_set() or accepted_count >= limit:
+                return
+            reserved_slots += 1
+
+        try:
+            # Enrich with email/phone
+            contacts = extract_contacts_from_url(website, snapshot=snapshot)
+            best_email = contacts['emails'][0] if contacts['emails'] else None
+            scraped_phone = contacts['phones'][0] if contacts['phones'] else None
+            source = "Website Scraper" if best_email else "None"
+            final_phone = phone or scraped_phone
+
+            lead_data = {
+                "company_name": company_name,
+                "website": website,
+                "location": address or location,
+                "phone": final_phone,
+                "industry_vertical": keyword,
+                "status": "New",
+                "email": best_email,
+                "best_email_source": source,
+                "interested_product_id": product_id,
+                "match_score": score,
+                "match_reason": reason,
+                "notes": f"AI Score: {score}/100 for {product['name']}"
+            }
+            lead_summary["email"] = best_email
+        except Exception:
+            with state_cond:
+                reserved_slots -= 1
+                state_cond.notify_all()
+            raise
+
+        # The slot stays reserved until the main thread writes the batch (flush_inserts)
+        with state_cond:
+            if not pending_inserts:
+                pending_since = time.time()
+            pending_inserts.append((lead_data, lead_summary, keyword))
+            state_cond.notify_all()
+
+    def flush_inserts():
+        """Writes buffered accepted leads in one bulk upsert and releases their slots."""
+        nonlocal accepted_count, reserved_slots, pending_since
+        with state_cond:
+            batch = pending_inserts[:]
+            pending_inserts.clear()
+            pending_since = None
+        if not batch:
+            return
+
+        rows = [lead_data for lead_data, _, _ in batch]
+        try:
+            # Rows whose domain already exists (e.g. inserted by a concurrent job) are skipped
+            data = supabase.table("leads").upsert(rows, on_conflict="website_domain", ignore_duplicates=True).execute()
+            inserted = {normalize_domain(row["website"]): row for row in (data.data or [])}
+        except Exception as insert_error:
+            print(f"   ❌ Bulk insert error ({len(rows)} leads): {insert_error} — retrying one by one")
+            inserted = {}
+            for row in rows:
+                try:
+                    data = supabase.table("leads").insert(row).execute()
+                    if data.data:
+                        inserted[normalize_domain(row["website"])] = data.data[0]
+                except Exception as row_error:
+                    print(f"   ❌ Insert error: {row_error}")
+
+        with state_cond:
+            for lead_data, lead_summary, keyword in batch:
+                row = inserted.get(normalize_domain(lead_data["website"]))
+                if row is None:
+                    print(f"   ⏩ Not inserted (duplicate or error): {lead_data['company_name']}")
+                    continue
+                lead_summary["id"] = row.get("id")
+                accepted.append(lead_summary)
+                accepted_count += 1
+                emit_event(job_id, "lead_accepted", lead_summary)
+                print(f"   ✅ ACCEPTED [{keyword}]: {lead_data['company_name']} (Score: {lead_data['match_score']}) — {accepted_count}/{limit}")
+            reserved_slots -= len(batch)
+            state_cond.notify_all()
+
+    def filter_known_domains(candidates):
+        """DB duplicate check for a whole page: one `in` query on the indexed website_domain."""
+        domains = [normalize_domain(item["website"]) for item in candidates]
+        if not domains:
+            return candidates
+        try:
+            existing = supabase.table("leads").select("website_domain").in_("website_domain", domains).execute()
+        except Exception as db_err:
+            print(f"   ⚠️ DB check error: {db_err}")
+            return candidates
+        known = {row["website_domain"] for row in existing.data or []}
+        fresh = []
+        for item, domain in zip(candidates, domains):
+            if domain in known:
+                print(f"⏩ Skip duplicate (DB): {item.get('title')}")
+            else:
+                fresh.append(item)
+        return fresh
+
+    def halt_workers():
+        with state_cond:
+            halt.set()
+            state_cond.notify_all()
+
+    def save_checkpoint():
+        """
+        Snapshot of everything needed to resume this job after a crash/redeploy.
+        Buffered accepted leads are written first: a checkpoint never loses them.
+        """
+        flush_inserts()
+        if not job_id:
+            return
+        # Candidates being evaluated are saved as still queued: a resumed job re-evaluates them
+        evaluating = list(in_flight.values())
+        evaluating_domains = {normalize_domain(item.get("website")) for item, _ in evaluating}
+        with state_cond:
+            checkpoint = {
+                "query_states": [dict(qs) for qs in query_states],
+                "visited_domains": sorted(visited_domains - evaluating_domains),
+                "frontier": frontier.pending() + [(item, kw, [kw]) for item, kw in evaluating],
+                "accepted": list(accepted),
+                "discarded": list(discarded),
+                "below_threshold": list(below_threshold),
+                "all_scores": list(all_scores),
+                "analyzed": analyzed_count,
+                "scoring_sources": dict(scoring_sources),
+                "pipeline": pipeline.stats(),
+                "pages_searched": total_pages,
+                "elapsed": time.time() - search_start_time,
+            }
+        with search_jobs_lock:
+            job_checkpoints[job_id] = checkpoint
 
     # Track per-query state: current page number and whether exhausted
+    resumed_states = {qs["keyword"]: qs for qs in resume.get("query_states", [])}
     query_states = []
     for qkw in query_list:
-        query_states.append({
+        query_states.append(resumed_states.get(qkw) or {
             "keyword": qkw,
             "full_query": f"{qkw} a {location}",
             "page": 0,           # next page to fetch (0-indexed, will increment before use)
@@ -241,14 +630,149 @@ def search_leads(product_id, location="Italia", limit=10, min_score=DEFAULT_MIN_
             "exhausted": False,  # True when no more results
         })
 
-    print(f"\n🚀 Round-robin search: {len(query_list)} keywords, cycling 1 page each...")
+    # Candidates of every keyword/page, deduplicated and evaluated best first
+    frontier = CandidateFrontier(product, n_keywords=len(query_list))
+    for item, keyword, keywords in resume.get("frontier", []):
+        for kw in keywords:
+            frontier.add(item, kw)
+    in_flight = {}  # future -> (item, keyword) being evaluated
+    # Pages are fetched whenever fewer candidates than this are waiting
+    frontier_low_water = max(FRONTIER_MIN_QUEUED, 2 * concurrency)
+    next_keyword = 0
+
+    # ── Cheap stages (candidate_pipeline.py) ──
+    # Run on each SerpAPI page before a candidate is queued: nothing here scrapes or calls the LLM.
+    def has_website(items, keyword):
+        return [item for item in items if normalize_domain(item.get("website"))]
+
+    def not_duplicate(items, keyword):
+        """Drops websites visited in this job; places already queued only raise their priority."""
+        fresh = []
+        for item in items:
+            if normalize_domain(item.get("website")) in visited_domains:
+                continue
+            if frontier.seen(item):
+                frontier.add(item, keyword)
+                continue
+            fresh.append(item)
+        return fresh
+
+    def in_location(items, keyword):
+        """Location filter. Mismatches are recorded as discarded and never revisited."""
+        nonlocal analyzed_count
+        kept = []
+        for item in items:
+            address = item.get("address")
+            if not address or not location:
+                kept.append(item)
+                continue
+            matched, how = location_matches(address, location, include_province)
+            if matched:
+                if how == "province":
+                    print(f"   📍 Province match: {item.get('title')} — '{address}'")
+                kept.append(item)
+                continue
+            print(f"   📍 SKIP (location mismatch): {item.get('title')} — '{address}' vs '{location}'")
+            visited_domains.add(normalize_domain(item.get("website")))
+            with state_cond:
+                analyzed_count += 1
+            record(discarded, {
+                "company_name": item.get("title"),
+                "website": item.get("website"),
+                "location": address,
+                "phone": item.get("phone"),
+                "score": 0,
+                "reason": f"Località non corrispondente: {address} vs {location}",
+            }, "lead_discarded")
+        return kept
+
+    def not_blacklisted(items, keyword):
+        kept = []
+        for item in items:
+            domain = normalize_domain(item.get("website"))
+            if any(domain == b or domain.endswith("." + b) for b in SEARCH_DOMAIN_BLACKLIST):
+                print(f"   ⛔ Skip blacklisted website: {item.get('title')} ({domain})")
+                visited_domains.add(domain)
+            else:
+                kept.append(item)
+        return kept
+
+    pipeline = StagePipeline({
+        "website": has_website,
+        "duplicate": not_duplicate,
+        "location": in_location,
+        "blacklist": not_blacklisted,
+        "known": lambda items, keyword: filter_known_domains(items),
+    }, counts=resume.get("pipeline"))
+
+    def fetch_next_page():
+        """
+        Round-robin: the next page of the next keyword that is not exhausted,
+        merged into the frontier. Returns False once every keyword is exhausted.
+        """
+        nonlocal total_pages, next_keyword
+        for _ in range(len(query_states)):
+            qs = query_states[next_keyword % len(query_states)]
+            next_keyword += 1
+            if qs["exhausted"]:
+                continue
+            if qs["page"] >= MAX_PAGES_PER_QUERY:
+                qs["exhausted"] = True
+                print(f"   🔚 Max pages reached for '{qs['keyword']}'")
+                continue
+
+            qs["page"] += 1
+            total_pages += 1
+            keyword = qs["keyword"]
+
+            print(f"\n📄 [{keyword}] Pagina {qs['page']} (offset: {qs['offset']})...")
+            update_job(progress=f"🔍 \"{keyword}\" — pagina {qs['page']}... ({accepted_count}/{limit} trovati)")
+
+            try:
+                page_results = prefetcher.get(qs["full_query"], qs["offset"])
+            except SerpAPIError as e:
+                print(f"❌ SerpAPI Error for '{keyword}': {e}")
+                qs["exhausted"] = True
+                continue
+
+            if not page_results:
+                print(f"⚠️  No results on page {qs['page']} for '{keyword}'. Query exhausted.")
+                qs["exhausted"] = True
+                continue
+
+            qs["offset"] += 20
+
+            # Next pages of every keyword load while the frontier is being evaluated
+            if prefetcher.depth:
+                prefetcher.schedule(query_states)
+
+            # Only candidates passing every cheap stage are queued for scraping and scoring
+            fresh = pipeline.screen(page_results, keyword)
+            for item in fresh:
+                frontier.add(item, keyword)
+            print(f"   📊 Got {len(page_results)} results, {len(fresh)} new — {len(frontier)} queued")
+            save_checkpoint()
+            return True
+        return False
+
+    print(f"\n🚀 Round-robin search: {len(query_list)} keywords, cycling 1 page each ({concurrency} parallel workers)...")
     print(f"   Keywords: {query_list}")
     update_job(progress=f"Avvio ricerca round-robin con {len(query_list)} keyword...")
 
+    pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="lead-eval")
+    prefetcher = SerpPrefetcher(max_pages=MAX_PAGES_PER_QUERY)
+    if prefetcher.depth:
+        prefetcher.schedule(query_states)
+
     try:
-        search_done = False
+        # First round: one page of every keyword, so priorities compare across keywords
+        for _ in range(len(query_states)):
+            if should_stop() or not fetch_next_page():
+                break
+        pages_left = any(not qs["exhausted"] for qs in query_states)
+        last_report = 0
 
-        while not search_done:
+        while True:
             # Check for stop request or timeout
             if job_id and is_stop_requested(job_id):
                 print(f"🛑 Job {job_id} stop requested — exiting gracefully.")
@@ -258,209 +782,70 @@ def search_leads(product_id, location="Italia", limit=10, min_score=DEFAULT_MIN_
                 with search_jobs_lock:
                     search_jobs[job_id]["stop_requested"] = True
                 break
-
-            # Check if ALL queries are exhausted
-            all_exhausted = all(qs["exhausted"] for qs in query_states)
-            if all_exhausted:
-                print("⚠️  All queries exhausted — no more results available.")
+            if accepted_count >= limit:
                 break
 
-            # Cycle through each keyword, one page each
-            for qs in query_states:
-                # Check stop between keywords
-                if job_id and (is_stop_requested(job_id) or (time.time() - search_start_time) > SEARCH_TIMEOUT_SECONDS):
-                    search_done = True
-                    break
-
-                if accepted_count >= limit:
-                    search_done = True
-                    break
+            # Keep candidate supply ahead of the workers
+            while pages_left and len(frontier) < frontier_low_water and not should_stop():
+                pages_left = fetch_next_page()
 
-                if qs["exhausted"]:
-                    continue
-
-                if qs["page"] >= MAX_PAGES_PER_QUERY:
-                    qs["exhausted"] = True
-                    print(f"   🔚 Max pages reached for '{qs['keyword']}'")
-                    continue
+            # Best candidates first, never more queued in the pool than there are workers
+            while len(in_flight) < concurrency and len(frontier):
+                item, keyword = frontier.pop()
+                visited_domains.add(normalize_domain(item.get("website")))
+                in_flight[pool.submit(process_candidate, item, keyword)] = (item, keyword)
 
-                qs["page"] += 1
-                total_pages += 1
-                keyword = qs["keyword"]
-
-                print(f"\n📄 [{keyword}] Pagina {qs['page']} (offset: {qs['offset']})...")
-                update_job(progress=f"🔍 \"{keyword}\" — pagina {qs['page']}... ({accepted_count}/{limit} trovati)")
-
-                try:
-                    page_results = fetch_serpapi_results(qs["full_query"], offset=qs["offset"])
-                except SerpAPIError as e:
-                    print(f"❌ SerpAPI Error for '{keyword}': {e}")
-                    qs["exhausted"] = True
-                    continue
-
-                if not page_results:
-                    print(f"⚠️  No results on page {qs['page']} for '{keyword}'. Query exhausted.")
-                    qs["exhausted"] = True
-                    continue
+            if not in_flight:
+                print("⚠️  All queries exhausted — no more results available.")
+                break
 
-                print(f"   📊 Got {len(page_results)} results")
-                qs["offset"] += 20
-
-                for item in page_results:
-                    # Check stop between individual leads
-                    if job_id and is_stop_requested(job_id):
-                        search_done = True
-                        break
-
-                    if accepted_count >= limit:
-                        break
-
-                    company_name = item.get("title")
-                    website = item.get("website")
-                    phone = item.get("phone")
-                    address = item.get("address")
-
-                    if not website:
-                        continue
-
-                    # Deduplication (in-memory)
-                    if website in visited_websites:
-                        continue
-                    visited_websites.add(website)
-
-                    # DB duplicate check
-                    try:
-                        existing_web = supabase.table("leads").select("id").eq("website", website).execute()
-                        if existing_web.data:
-                            print(f"⏩ Skip duplicate (DB): {company_name}")
-                            continue
-                    except Exception as db_err:
-                        print(f"   ⚠️ DB check error for {company_name}: {db_err}")
-
-                    analyzed_count += 1
-                    update_job(progress=f"\"{keyword}\" — Analisi AI: {company_name}...")
-
-                    # AI Pre-filter
-                    eval_result = evaluate_lead_prefilter(
-                        company_name=company_name,
-                        website=website,
-                        location=address or location,
-                        product=product
+            done, _ = wait(set(in_flight), timeout=STOP_POLL_SECONDS, return_when=FIRST_COMPLETED)
+            for future in done:
+                in_flight.pop(future)
+                if future.exception():
+                    print(f"   ⚠️ Worker error: {future.exception()}")
+
+            # Write a batch when it is full, when its oldest lead waited LEAD_INSERT_MAX_WAIT,
+            # or when every remaining slot is reserved (workers would otherwise wait for more
+            # candidates to finish)
+            with state_cond:
+                buffered = len(pending_inserts)
+                slots_full = accepted_count + reserved_slots >= limit
+                overdue = buffered and time.time() - pending_since >= LEAD_INSERT_MAX_WAIT
+            if buffered >= LEAD_INSERT_BATCH_SIZE or (buffered and slots_full) or overdue:
+                flush_inserts()
+
+            # Progress for the UI/SSE at most once per second
+            if done and time.time() - last_report >= 1:
+                last_report = time.time()
+                with state_cond:
+                    avg_so_far = round(sum(all_scores) / len(all_scores)) if all_scores else 0
+                    update_job(
+                        progress=f"Trovati {accepted_count}/{limit}... {analyzed_count} analizzati, {len(frontier)} in coda",
+                        stats={
+                            "analyzed": analyzed_count,
+                            "accepted": accepted_count,
+                            "discarded": len(discarded),
+                            "below_threshold": len(below_threshold),
+                            "avg_score": avg_so_far,
+                            "llm_calls_avoided": sum(scoring_sources[s] for s in LLM_FREE_SOURCES),
+                            "pipeline": pipeline.stats(),
+                        },
                     )
+                save_checkpoint()
 
-                    score = eval_result["score"]
-                    reason = eval_result["reason"]
-
-                    lead_summary = {
-                        "company_name": company_name,
-                        "website": website,
-                        "location": address or location,
-                        "phone": phone,
-                        "score": score,
-                        "reason": reason,
-                        "sector_match": eval_result.get("sector_match", 0),
-                        "purchase_potential": eval_result.get("purchase_potential", 0),
-                        "complementarity": eval_result.get("complementarity", 0),
-                        "web_quality": eval_result.get("web_quality", 0)
-                    }
-
-                    # Score 0 = unreachable site
-                    if score == 0:
-                        print(f"   🚫 SKIP (score 0): {company_name} — {reason}")
-                        discarded.append(lead_summary)
-                        continue
-
-                    all_scores.append(score)
-
-                    # Location check
-                    if address and location and location.lower() != "italia":
-                        loc_lower = location.lower().strip()
-                        addr_lower = (address or "").lower()
-                        loc_words = [w for w in loc_lower.split() if len(w) > 2]
-                        location_match = any(w in addr_lower for w in loc_words)
-
-                        if not location_match and include_province:
-                            province_code = CITY_TO_PROVINCE.get(loc_lower)
-                            if province_code:
-                                addr_upper = (address or "").upper()
-                                location_match = (
-                                    addr_upper.endswith(f" {province_code}") or
-                                    f" {province_code} " in addr_upper or
-                                    f"({province_code})" in addr_upper or
-                                    f" {province_code}," in addr_upper
-                                )
-                                if location_match:
-                                    print(f"   📍 Province match: {company_name} — '{address}' in {province_code}")
-
-                        if not location_match:
-                            print(f"   📍 SKIP (location mismatch): {company_name} — '{address}' vs '{location}'")
-                            lead_summary["reason"] = f"Località non corrispondente: {address} vs {location}"
-                            discarded.append(lead_summary)
-                            continue
-
-                    quality_label = "🟢 TOP" if score >= min_score else "🟡 BELOW"
-                    print(f"   {quality_label}: {company_name} (Score: {score})")
-
-                    # Below threshold
-                    if score < min_score:
-                        print(f"   ⏭️  Below {min_score}%: {company_name} (Score: {score})")
-                        below_threshold.append(lead_summary)
-                        continue
-
-                    # GUARD: re-check limit before expensive enrichment + insert
-                    if accepted_count >= limit:
-                        break
-
-                    # Enrich with email/phone
-                    contacts = extract_contacts_from_url(website)
-                    best_email = contacts['emails'][0] if contacts['emails'] else None
-                    scraped_phone = contacts['phones'][0] if contacts['phones'] else None
-                    source = "Website Scraper" if best_email else "None"
-                    final_phone = phone or scraped_phone
-
-                    lead_data = {
-                        "company_name": company_name,
-                        "website": website,
-                        "location": address or location,
-                        "phone": final_phone,
-                        "industry_vertical": keyword,
-                        "status": "New",
-                        "email": best_email,
-                        "best_email_source": source,
-                        "interested_product_id": product_id,
-                        "match_score": score,
-                        "match_reason": reason,
-                        "notes": f"AI Score: {score}/100 for {product['name']}"
-                    }
-
-                    try:
-                        data = supabase.table("leads").insert(lead_data).execute()
-                        lead_summary["id"] = data.data[0]["id"] if data.data else None
-                        lead_summary["email"] = best_email
-                        accepted.append(lead_summary)
-                        accepted_count += 1
-                        print(f"   ✅ ACCEPTED [{keyword}]: {company_name} (Score: {score}) — {accepted_count}/{limit}")
-                    except Exception as insert_error:
-                        print(f"   ❌ Insert error: {insert_error}")
-
-                # Update job after each keyword page
-                avg_so_far = round(sum(all_scores) / len(all_scores)) if all_scores else 0
-                update_job(
-                    progress=f"Trovati {accepted_count}/{limit}... Round-robin pagina {qs['page']} di \"{keyword}\"",
-                    stats={
-                        "analyzed": analyzed_count,
-                        "accepted": accepted_count,
-                        "discarded": len(discarded),
-                        "below_threshold": len(below_threshold),
-                        "avg_score": avg_so_far
-                    },
-                    accepted=accepted,
-                    discarded=discarded,
-                    below_threshold=below_threshold
-                )
-
-                # Rate-limit between SerpAPI calls
-                time.sleep(0.7)
+        if in_flight:
+            # Stop or limit reached: drop candidates not started yet
+            for future in in_flight:
+                future.cancel()
+            halt_workers()
+
+        # Wait for in-flight enrichments, write the last batch, then freeze the result lists
+        with state_cond:
+            halt.set()
+            state_cond.notify_all()
+            state_cond.wait_for(lambda: reserved_slots == len(pending_inserts))
+        flush_inserts()
 
         # ── Final stats ──
         valid_scores = [s for s in all_scores if s > 0]
@@ -480,6 +865,9 @@ def search_leads(product_id, location="Italia", limit=10, min_score=DEFAULT_MIN_
             "product_name": product["name"],
             "location": location,
             "pages_searched": total_pages,
+            "scoring_sources": dict(scoring_sources),
+            "llm_calls_avoided": sum(scoring_sources[s] for s in LLM_FREE_SOURCES),
+            "pipeline": pipeline.stats(),
             "warning": warning
         }
 
@@ -491,6 +879,11 @@ def search_leads(product_id, location="Italia", limit=10, min_score=DEFAULT_MIN_
         print(f"   🟡 Below threshold: {len(below_threshold)} (score < {min_score})")
         print(f"   ❌ Discarded: {len(discarded)} (score 0 or location mismatch)")
         print(f"   📈 Average Score: {avg_score}")
+        print(f"   🧠 Scoring: {dict(scoring_sources)} ({stats['llm_calls_avoided']} LLM calls avoided)")
+        print("   🧹 Pipeline: " + ", ".join(
+            f"{stage} -{count['dropped']}/{count['checked']}"
+            for stage, count in stats["pipeline"].items() if isinstance(count, dict)
+        ) + f" ({stats['pipeline']['crawls_avoided']} crawls avoided)")
         if warning:
             print(f"   ⚠️  {warning}")
         print(f"{'='*60}\n")
@@ -517,9 +910,17 @@ def search_leads(product_id, location="Italia", limit=10, min_score=DEFAULT_MIN_
 
     except Exception as e:
         print(f"❌ Critical Error in search_leads: {e}")
+        halt_workers()
         update_job(status="error", progress=f"Errore critico: {str(e)}", completed_at=time.time())
         return {"accepted": [], "discarded": [], "stats": {}}
 
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+        prefetcher.close()
+        if job_id:
+            with search_jobs_lock:
+                job_checkpoints.pop(job_id, None)
+
 
 if __name__ == "__main__":
     import sys
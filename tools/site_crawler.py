@@ -0,0 +1,307 @@
+import os
+import re
+import time
+import threading
+import requests
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin, urlparse
+import http_client
+from html_text import html_to_text
+from contact_extractor import extract_contacts, rank_emails, email_rank
+from disk_cache import DiskCache
+from url_utils import normalize_url, normalize_domain
+from content_distill import distill
+from crawl_scheduler import scheduler, THROTTLE_STATUSES
+
+# Pages whose text is used as context for AI scoring and email generation,
+# tried blindly only when the homepage nav has no about link
+TEXT_PATHS = ["/chi-siamo", "/about", "/about-us"]
+
+# Contact pages guessed blindly when the homepage nav has no contact link
+CONTACT_PATHS = ["/contatti", "/contacts", "/contact", "/info", "/dove-siamo"]
+
+# Homepage links are matched on href + anchor text
+ABOUT_LINK_HINTS = ("chi-siamo", "chi siamo", "about", "azienda", "company", "storia")
+CONTACT_LINK_HINTS = ("contatt", "contact", "dove-siamo", "dove siamo")
+ANCHOR_RE = re.compile(r"""<a\b[^>]*?\bhref\s*=\s*["']([^"'#]+)["'][^>]*>(.*?)</a>""", re.IGNORECASE | re.DOTALL)
+TAG_RE = re.compile(r"<[^>]+>")
+
+# Homepage answers meaning "go away / slow down", not "no website"
+BLOCKED_STATUSES = (403,) + THROTTLE_STATUSES
+
+# Upper bound on pages fetched per site (homepage included)
+CRAWL_MAX_PAGES = int(os.environ.get("CRAWL_MAX_PAGES", "6"))
+# Pages of one site fetched in parallel, and the wall-clock budget of a whole site crawl
+SITE_FETCH_CONCURRENCY = int(os.environ.get("SITE_FETCH_CONCURRENCY", "3"))
+SITE_CRAWL_DEADLINE = float(os.environ.get("SITE_CRAWL_DEADLINE", "15"))
+# Fetch threads shared by all concurrent crawls (SEARCH_CONCURRENCY sites x SITE_FETCH_CONCURRENCY)
+CRAWL_FETCH_WORKERS = int(os.environ.get("CRAWL_FETCH_WORKERS", "16"))
+
+# Snapshots are reused across searches and by email generation days later
+SITE_CACHE_TTL_HOURS = float(os.environ.get("SITE_CACHE_TTL_HOURS", "168"))  # 0 = disabled
+SITE_CACHE_MAX_MB = float(os.environ.get("SITE_CACHE_MAX_MB", "200"))
+# Which page gave a site's contacts, remembered well past the snapshot itself
+CONTACT_PATH_TTL_DAYS = float(os.environ.get("CONTACT_PATH_TTL_DAYS", "90"))
+
+site_cache = DiskCache(
+    "site_snapshots",
+    ttl_seconds=SITE_CACHE_TTL_HOURS * 3600,
+    max_bytes=int(SITE_CACHE_MAX_MB * 1024 * 1024),
+)
+contact_path_cache = DiskCache(
+    "contact_paths",
+    ttl_seconds=CONTACT_PATH_TTL_DAYS * 86400,
+    max_bytes=10 * 1024 * 1024,
+)
+
+_fetch_pool = ThreadPoolExecutor(max_workers=CRAWL_FETCH_WORKERS, thread_name_prefix="crawl-fetch")
+
+# Crawl counters since startup (GET /crawl-stats)
+crawl_stats = Counter()
+crawl_stats_lock = threading.Lock()
+
+
+def _count(**increments):
+    with crawl_stats_lock:
+        crawl_stats.update(increments)
+
+
+def get_crawl_stats():
+    with crawl_stats_lock:
+        stats = dict(crawl_stats)
+    sites = stats.get("sites", 0)
+    stats["pages_per_site"] = round(stats.get("pages_fetched", 0) / sites, 2) if sites else 0
+    stats["scheduler"] = scheduler.get_stats()
+    return stats
+
+
+def fetch_page(url, headers=None, max_attempts=2, backoff_factor=1.0, deadline=None):
+    """
+    Fetch a single page with retry + exponential backoff. Returns None if unreachable.
+    Goes through the crawl scheduler (per-domain/global rate limits, robots.txt);
+    429/503 answers are retried after their Retry-After when it fits.
+    deadline (time.monotonic()) shortens the timeout and skips retries that would not fit.
+    """
+    for attempt in range(max_attempts):
+        if not scheduler.acquire(url, deadline):
+            return None
+        timeout = None
+        if deadline is not None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            timeout = min(http_client.HTTP_TIMEOUT, remaining)
+        try:
+            response = http_client.get(url, headers=headers, timeout=timeout)
+            scheduler.observe(url, response)
+            if response.status_code in THROTTLE_STATUSES and attempt < max_attempts - 1:
+                continue  # The next acquire() waits out Retry-After, or gives up
+            return response
+        except requests.RequestException:
+            if attempt < max_attempts - 1:
+                if deadline is not None and time.monotonic() + backoff_factor ** attempt >= deadline:
+                    return None
+                time.sleep(backoff_factor ** attempt)
+    return None  # Graceful degradation: return None instead of crashing
+
+
+def fetch_pages(urls, deadline):
+    """
+    Fetches pages of one site concurrently, at most SITE_FETCH_CONCURRENCY in flight.
+    Returns {url: response or None}; pages still pending at the deadline are None.
+    """
+    slots = threading.Semaphore(SITE_FETCH_CONCURRENCY)
+
+    def fetch(url):
+        try:
+            return fetch_page(url, deadline=deadline)
+        finally:
+            slots.release()
+
+    futures = {}
+    for url in urls:
+        if not slots.acquire(timeout=max(0, deadline - time.monotonic())):
+            break
+        futures[url] = _fetch_pool.submit(fetch, url)
+
+    results = dict.fromkeys(urls)
+    for url, future in futures.items():
+        try:
+            # Small grace period: an in-flight read can overrun its timeout slightly
+            results[url] = future.result(timeout=max(0, deadline - time.monotonic()) + 1)
+        except Exception:
+            pass
+    return results
+
+
+def nav_links(html, base_url):
+    """
+    Same-site links of the homepage that look like about/contact pages, in page order.
+    Returns (about_paths, contact_paths).
+    """
+    host = normalize_domain(base_url)
+    about, contact = [], []
+    for href, label in ANCHOR_RE.findall(html):
+        target = urlparse(urljoin(base_url, href.strip()))
+        if target.scheme not in ("http", "https") or normalize_domain(target.netloc) != host:
+            continue
+        path = target.path.rstrip("/") or "/"
+        if path == "/":
+            continue
+        haystack = f"{path} {TAG_RE.sub(' ', label)}".lower()
+        if any(hint in haystack for hint in CONTACT_LINK_HINTS):
+            contact.append(path)
+        elif any(hint in haystack for hint in ABOUT_LINK_HINTS):
+            about.append(path)
+    return list(dict.fromkeys(about)), list(dict.fromkeys(contact))
+
+
+def contacts_complete(emails, phones, site_domain):
+    """Good enough to stop crawling: an address on the company's own domain and a phone."""
+    domain = re.sub(r"^www\.", "", site_domain.lower())
+    return bool(phones) and any(email_rank(e, domain) <= 1 for e in emails)
+
+
+def crawl_site(url, use_cache=True):
+    """
+    Adaptive crawl of a company website, returning a site snapshot:
+    { url, pages: [{ path, url, kind, html, text }], emails: [...], phones: [...], fetched_at }
+    plus "blocked": <HTTP status> when the site refused or rate-limited the homepage.
+    Order: homepage, the contact page that worked last time, contact links of the
+    homepage nav, one about page (scoring text), then blind contact guesses. Contact
+    pages stop as soon as an own-domain email and a phone are found; at most
+    CRAWL_MAX_PAGES pages are fetched.
+    Pages after the homepage are fetched SITE_FETCH_CONCURRENCY at a time, and the
+    whole crawl shares one SITE_CRAWL_DEADLINE: a slow site costs about its slowest
+    pages, not the sum of all of them.
+    Emails are ranked best first (contact_extractor.rank_emails), phones are E.164.
+    Scoring, contact extraction and email generation all read from the same snapshot.
+    Snapshots are served from the on-disk site cache while fresh.
+    """
+    if not url.startswith("http"):
+        url = "https://" + url
+
+    cache_key = normalize_url(url)
+    if use_cache:
+        cached = site_cache.get(cache_key)
+        if cached:
+            print(f"💾 Site cache hit: {cache_key}")
+            return cached
+
+    base_domain = urlparse(url).netloc
+    site_key = normalize_domain(url)
+
+    pages = []
+    emails = {}
+    phones = {}
+    tried = set()
+    deadline = time.monotonic() + SITE_CRAWL_DEADLINE
+    found_on = None
+    blocked = None
+
+    def page_url(path):
+        return url if path == "/" else urljoin(url, path)
+
+    def collect(path, kind, response):
+        """Stores one fetched page and its contacts."""
+        nonlocal found_on, blocked
+        try:
+            if response is not None and response.status_code in BLOCKED_STATUSES and kind == "home":
+                blocked = response.status_code
+            if response is None or response.status_code != 200:
+                return
+            # Allow redirects, but check domain
+            if urlparse(response.url).netloc != base_domain:
+                return
+
+            html = response.text
+            pages.append({"path": path, "url": page_url(path), "kind": kind, "html": html, "text": html_to_text(html)})
+
+            before = (len(emails), len(phones))
+            page_emails, page_phones = extract_contacts(html)
+            emails.update(dict.fromkeys(page_emails))
+            phones.update(dict.fromkeys(page_phones))
+            if kind == "contact" and (len(emails), len(phones)) != before:
+                found_on = found_on or path
+        except Exception as e:
+            # Never crash the pipeline for a single page
+            print(f"      ⚠️  Unexpected error on {page_url(path)}: {e}")
+
+    def wanted(kind):
+        if blocked:
+            return False  # The homepage already said no: more guesses only make it worse
+        if kind == "contact":
+            return not contacts_complete(emails, phones, base_domain)
+        if kind == "about":
+            return not any(page["kind"] == "about" for page in pages)
+        return True
+
+    def visit(candidates):
+        """
+        Fetches [(path, kind)] in priority order, in waves of SITE_FETCH_CONCURRENCY
+        parallel requests. Between waves, drops what is no longer needed.
+        """
+        queue = list(candidates)
+        while queue and len(tried) < CRAWL_MAX_PAGES and time.monotonic() < deadline:
+            wave = {}
+            while queue and len(wave) < SITE_FETCH_CONCURRENCY and len(tried) + len(wave) < CRAWL_MAX_PAGES:
+                path, kind = queue.pop(0)
+                if path not in tried and path not in wave and wanted(kind):
+                    wave[path] = kind
+            if not wave:
+                return
+            tried.update(wave)
+            responses = fetch_pages([page_url(path) for path in wave], deadline)
+            for path, kind in wave.items():
+                collect(path, kind, responses[page_url(path)])
+
+    visit([("/", "home")])
+    home = next((page for page in pages if page["kind"] == "home"), None)
+    about_links, contact_links = nav_links(home["html"], url) if home else ([], [])
+    remembered = contact_path_cache.get(site_key) if site_key else None
+
+    # Pages the site itself points to (or that worked last time) before any guess,
+    # together with the about page for the scoring text
+    priority = [remembered["path"]] if remembered else []
+    visit([(path, "contact") for path in priority + contact_links] +
+          [(path, "about") for path in about_links[:1] or TEXT_PATHS])
+    visit([(path, "contact") for path in CONTACT_PATHS])
+
+    complete = contacts_complete(emails, phones, base_domain)
+    if found_on and site_key:
+        contact_path_cache.set(site_key, {"path": found_on})
+    _count(
+        sites=1, pages_fetched=len(tried), pages_ok=len(pages),
+        deadline_hit=1 if time.monotonic() >= deadline else 0,
+        nav_links_found=1 if contact_links else 0, remembered_path_used=1 if remembered else 0,
+        complete=1 if complete else 0, blocked=1 if blocked and not pages else 0,
+    )
+
+    print(f"🕸️  Crawled {url}: {len(pages)}/{len(tried)} pages, {len(emails)} emails, {len(phones)} phones"
+          f"{' (complete)' if complete else ''}")
+    snapshot = {
+        "url": url,
+        "pages": pages,
+        "emails": rank_emails(emails, base_domain),
+        "phones": list(phones),
+        "fetched_at": time.time(),
+    }
+    if blocked and not pages:
+        snapshot["blocked"] = blocked
+
+    # Unreachable sites are not cached: they may be back online next time
+    if use_cache and pages:
+        site_cache.set(cache_key, snapshot)
+    return snapshot
+
+
+def snapshot_text(snapshot, max_chars=5000, product=None):
+    """
+    Text of homepage + about pages for the LLM prompts, distilled into the
+    CONTENT_TOKEN_BUDGET (see content_distill.distill). Passing the product ranks
+    paragraphs by its keywords. max_chars stays as a hard cap.
+    """
+    all_text = [page["text"] for page in snapshot.get("pages", [])
+                if page["kind"] in ("home", "about") and page["text"]]
+    return distill(all_text, product)[:max_chars]
@@ -0,0 +1,46 @@
+import re
+from urllib.parse import urlparse, urlencode, parse_qsl
+
+# Query parameters that never change page content
+TRACKING_PARAMS = ("utm_", "fbclid", "gclid", "mc_cid", "mc_eid", "_ga")
+
+
+def normalize_url(url):
+    """
+    Canonical form of a website URL, used as cache key.
+    https://WWW.Example.it/chi-siamo/?utm_source=x#top -> https://example.it/chi-siamo
+    """
+    url = (url or "").strip()
+    if not url:
+        return ""
+    if "://" not in url:
+        url = "https://" + url
+
+    parsed = urlparse(url)
+    scheme = "https" if parsed.scheme in ("http", "https") else parsed.scheme
+    host = (parsed.hostname or "").lower()
+    if host.startswith("www."):
+        host = host[4:]
+    if parsed.port and parsed.port not in (80, 443):
+        host = f"{host}:{parsed.port}"
+
+    path = parsed.path.rstrip("/")
+    query = sorted(
+        (k, v) for k, v in parse_qsl(parsed.query, keep_blank_values=True)
+        if not k.lower().startswith(TRACKING_PARAMS)
+    )
+    normalized = f"{scheme}://{host}{path}"
+    if query:
+        normalized += "?" + urlencode(query)
+    return normalized
+
+
+def normalize_domain(url):
+    """
+    Canonical domain used to deduplicate leads:
+    http://x.it, https://www.X.it/ and x.it/?utm=... -> x.it
+    Mirrors the leads.website_domain generated column (architecture/patch_leads_website_domain.sql).
+    """
+    domain = re.sub(r'^[a-z]+://', '', (url or "").strip(), flags=re.IGNORECASE)
+    domain = re.sub(r'^www\.|[:/?#].*$', '', domain, flags=re.IGNORECASE)
+    return domain.lower() or None
@@ -0,0 +1,149 @@
+import os
+import sys
+import time
+import signal
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Add current directory to path so we can import tools
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import job_queue
+from search_leads import search_leads, search_jobs, search_jobs_lock, job_checkpoints, DEFAULT_MIN_SCORE
+
+WORKER_ID = f"{socket.gethostname()}-{os.getpid()}"
+WORKER_CONCURRENT_JOBS = int(os.environ.get("WORKER_CONCURRENT_JOBS", "2"))
+WORKER_POLL_SECONDS = 3
+JOB_HEARTBEAT_SECONDS = 5
+
+shutting_down = threading.Event()
+active_jobs = set()
+active_jobs_lock = threading.Lock()
+
+
+def _snapshot(job_id):
+    with search_jobs_lock:
+        job = search_jobs.get(job_id)
+        return (dict(job) if job else None), job_checkpoints.get(job_id)
+
+
+def _request_stop(job_id):
+    with search_jobs_lock:
+        if job_id in search_jobs:
+            search_jobs[job_id]["stop_requested"] = True
+
+
+def _heartbeat_loop(job_id, done, lease_lost):
+    """
+    Renews the lease, persists progress/checkpoint and relays stop requests.
+    Stops the job when its lease was lost (another worker now runs it).
+    """
+    while not done.wait(JOB_HEARTBEAT_SECONDS):
+        job, checkpoint = _snapshot(job_id)
+        try:
+            if job_queue.heartbeat(job_id, WORKER_ID, job, checkpoint):
+                _request_stop(job_id)
+        except job_queue.LeaseLost as e:
+            print(f"   ⛔ Lease lost, stopping: {e}")
+            lease_lost.set()
+            _request_stop(job_id)
+            return
+        except Exception as e:
+            print(f"   ⚠️ Heartbeat failed for job {job_id}: {e}")
+
+
+def run_job(row):
+    job_id = row["id"]
+    params = row.get("params") or {}
+    resumed = bool(row.get("checkpoint"))
+    print(f"🛠️  Worker {WORKER_ID}: {'resuming' if resumed else 'starting'} job {job_id} (attempt {row.get('attempts')})")
+
+    if row.get("stop_requested"):
+        job_queue.finish(job_id, WORKER_ID, {"status": "completed", "progress": "Ricerca interrotta prima dell'avvio", "stopped_reason": "manual"})
+        return
+
+    with active_jobs_lock:
+        active_jobs.add(job_id)
+    done = threading.Event()
+    lease_lost = threading.Event()
+    hb = threading.Thread(target=_heartbeat_loop, args=(job_id, done, lease_lost), daemon=True)
+    hb.start()
+    try:
+        search_leads(
+            row["product_id"],
+            params.get("location", "Italia"),
+            params.get("limit", 10),
+            params.get("min_score", DEFAULT_MIN_SCORE),
+            job_id,
+            params.get("include_province", False),
+            resume=row.get("checkpoint"),
+        )
+    finally:
+        done.set()
+        hb.join()
+        with active_jobs_lock:
+            active_jobs.discard(job_id)
+
+    if shutting_down.is_set():
+        return  # Released in handle_shutdown; another worker resumes it
+    if lease_lost.is_set():
+        with search_jobs_lock:
+            search_jobs.pop(job_id, None)
+        print(f"⛔ Worker {WORKER_ID}: job {job_id} dropped, now run by another worker")
+        return
+
+    with search_jobs_lock:
+        job = search_jobs.pop(job_id, None)
+    job = job or {"status": "error", "progress": "Stato della ricerca perso"}
+    try:
+        job_queue.finish(job_id, WORKER_ID, job)
+        print(f"✅ Worker {WORKER_ID}: job {job_id} {job.get('status')}")
+    except Exception as e:
+        # Lease expires and the job is retried: at-least-once
+        print(f"❌ Could not store result of job {job_id}: {e}")
+
+
+def handle_shutdown(signum, frame):
+    """
+    On SIGTERM (deploy/scale-down) hand running jobs back to the queue with their
+    latest checkpoint, so another worker resumes them right away instead of
+    waiting for the lease to expire.
+    """
+    print(f"🛑 Worker {WORKER_ID}: shutting down, releasing jobs...")
+    shutting_down.set()
+    with active_jobs_lock:
+        job_ids = list(active_jobs)
+    for job_id in job_ids:
+        job, checkpoint = _snapshot(job_id)
+        try:
+            job_queue.release(job_id, WORKER_ID, job, checkpoint)
+        except Exception as e:
+            print(f"   ⚠️ Could not release job {job_id}: {e}")
+    os._exit(0)
+
+
+def main():
+    signal.signal(signal.SIGTERM, handle_shutdown)
+    signal.signal(signal.SIGINT, handle_shutdown)
+    print(f"🚀 Search worker {WORKER_ID} started ({WORKER_CONCURRENT_JOBS} concurrent jobs)")
+
+    pool = ThreadPoolExecutor(max_workers=WORKER_CONCURRENT_JOBS, thread_name_prefix="search-job")
+    running = set()
+
+    while not shutting_down.is_set():
+        running = {f for f in running if not f.done()}
+        if len(running) < WORKER_CONCURRENT_JOBS:
+            try:
+                row = job_queue.claim_next(WORKER_ID)
+            except Exception as e:
+                print(f"   ⚠️ Claim failed: {e}")
+                row = None
+            if row:
+                running.add(pool.submit(run_job, row))
+                continue
+        time.sleep(WORKER_POLL_SECONDS)
+
+
+if __name__ == "__main__":
+    main()